@@ -0,0 +1,44 @@
+"""add meal suggestions
+
+Revision ID: 0c8a971bf49c
+Revises: 26b4c1e189b4
+Create Date: 2026-10-18 13:39:33.633730-07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0c8a971bf49c'
+down_revision = '26b4c1e189b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "meal_suggestion",
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("diet_mask", sa.Integer(), nullable=False),
+        sa.Column(
+            "ingredient_ids", postgresql.ARRAY(sa.Integer()), nullable=False
+        ),
+        sa.Column(
+            "suggestions",
+            postgresql.JSONB(astext_type=sa.Text()),
+            nullable=False,
+        ),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("key"),
+    )
+
+
+def downgrade():
+    op.drop_table("meal_suggestion")
@@ -0,0 +1,32 @@
+"""unique meal names per user
+
+Revision ID: 26b4c1e189b4
+Revises: a7797b96deea
+Create Date: 2026-10-18 13:30:29.776758-07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '26b4c1e189b4'
+down_revision = 'a7797b96deea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_unique_constraint(
+        "uq_meal_user_id_name", "meal", ["user_id", "name"]
+    )
+    # lookups by user, and by name within a user, are served by the
+    # constraint's index
+    op.drop_index("ix_meal_user_id", table_name="meal")
+    op.drop_index("ix_meal_name", table_name="meal")
+
+
+def downgrade():
+    op.create_index("ix_meal_name", "meal", ["name"], unique=False)
+    op.create_index("ix_meal_user_id", "meal", ["user_id"], unique=False)
+    op.drop_constraint("uq_meal_user_id_name", "meal", type_="unique")
@@ -0,0 +1,130 @@
+"""add diet masks
+
+Revision ID: a1b0ffa32cbd
+Revises: c3c0a5a35b0b
+Create Date: 2026-10-18 13:16:34.589022-07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1b0ffa32cbd'
+down_revision = 'c3c0a5a35b0b'
+branch_labels = None
+depends_on = None
+
+
+# meal.diet_mask is the bitwise AND of its ingredients' masks, 127 (every
+# diet) for a meal without ingredients. Statement-level triggers keep it in
+# step with meal_ingredient and ingredient.diet_mask.
+TRIGGERS = (
+    """
+    CREATE OR REPLACE FUNCTION refresh_meal_diet_masks(meal_ids integer[])
+    RETURNS void AS $$
+        UPDATE meal SET diet_mask = coalesce(
+            (
+                SELECT bit_and(ingredient.diet_mask)
+                FROM meal_ingredient
+                JOIN ingredient
+                ON ingredient.id = meal_ingredient.ingredient_id
+                WHERE meal_ingredient.meal_id = meal.id
+            ),
+            127
+        )
+        WHERE meal.id = ANY(meal_ids)
+    $$ LANGUAGE sql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION meal_ingredient_changed()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            PERFORM refresh_meal_diet_masks(
+                ARRAY(SELECT DISTINCT meal_id FROM new_rows)
+            );
+        END IF;
+        IF TG_OP IN ('DELETE', 'UPDATE') THEN
+            PERFORM refresh_meal_diet_masks(
+                ARRAY(SELECT DISTINCT meal_id FROM old_rows)
+            );
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER meal_ingredient_inserted AFTER INSERT ON meal_ingredient
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION meal_ingredient_changed()
+    """,
+    """
+    CREATE TRIGGER meal_ingredient_updated AFTER UPDATE ON meal_ingredient
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION meal_ingredient_changed()
+    """,
+    """
+    CREATE TRIGGER meal_ingredient_deleted AFTER DELETE ON meal_ingredient
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION meal_ingredient_changed()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION ingredient_diet_mask_changed()
+    RETURNS trigger AS $$
+    BEGIN
+        PERFORM refresh_meal_diet_masks(ARRAY(
+            SELECT DISTINCT meal_ingredient.meal_id
+            FROM new_rows
+            JOIN old_rows USING (id)
+            JOIN meal_ingredient
+            ON meal_ingredient.ingredient_id = new_rows.id
+            WHERE new_rows.diet_mask <> old_rows.diet_mask
+        ));
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER ingredient_diet_mask_updated AFTER UPDATE ON ingredient
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION ingredient_diet_mask_changed()
+    """,
+)
+
+
+def upgrade():
+    op.add_column(
+        "ingredient",
+        sa.Column(
+            "diet_mask", sa.Integer(), nullable=False, server_default="0"
+        ),
+    )
+    op.add_column(
+        "meal",
+        sa.Column(
+            "diet_mask", sa.Integer(), nullable=False, server_default="127"
+        ),
+    )
+    for statement in TRIGGERS:
+        op.execute(statement)
+    # no ingredient has a diet yet, so only meals without ingredients keep
+    # the default
+    op.execute(
+        "UPDATE meal SET diet_mask = 0 WHERE EXISTS ("
+        "SELECT 1 FROM meal_ingredient WHERE meal_ingredient.meal_id = meal.id"
+        ")"
+    )
+    op.create_index("ix_meal_diet_mask", "meal", ["diet_mask"])
+
+
+def downgrade():
+    op.drop_index("ix_meal_diet_mask", table_name="meal")
+    op.execute("DROP TRIGGER ingredient_diet_mask_updated ON ingredient")
+    op.execute("DROP FUNCTION ingredient_diet_mask_changed()")
+    for event in ("inserted", "updated", "deleted"):
+        op.execute(f"DROP TRIGGER meal_ingredient_{event} ON meal_ingredient")
+    op.execute("DROP FUNCTION meal_ingredient_changed()")
+    op.execute("DROP FUNCTION refresh_meal_diet_masks(integer[])")
+    op.drop_column("meal", "diet_mask")
+    op.drop_column("ingredient", "diet_mask")
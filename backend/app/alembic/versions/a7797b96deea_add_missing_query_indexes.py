@@ -0,0 +1,63 @@
+"""add missing query indexes
+
+Revision ID: a7797b96deea
+Revises: eef68c13dc6d
+Create Date: 2026-10-18 13:28:00.101165-07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7797b96deea'
+down_revision = 'eef68c13dc6d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f("ix_meal_name"), "meal", ["name"], unique=False)
+    op.create_index(op.f("ix_meal_user_id"), "meal", ["user_id"], unique=False)
+    op.create_index(
+        op.f("ix_user_diet_requirements_user_id"),
+        "user_diet_requirements",
+        ["user_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_meal_ingredient_meal_id_ingredient_id",
+        "meal_ingredient",
+        ["meal_id", "ingredient_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_meal_ingredient_ingredient_id",
+        "meal_ingredient",
+        ["ingredient_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_user_superuser",
+        "user",
+        ["id"],
+        unique=False,
+        postgresql_where=sa.text("is_superuser"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_user_superuser", table_name="user")
+    op.drop_index(
+        "ix_meal_ingredient_ingredient_id", table_name="meal_ingredient"
+    )
+    op.drop_index(
+        "ix_meal_ingredient_meal_id_ingredient_id",
+        table_name="meal_ingredient",
+    )
+    op.drop_index(
+        op.f("ix_user_diet_requirements_user_id"),
+        table_name="user_diet_requirements",
+    )
+    op.drop_index(op.f("ix_meal_user_id"), table_name="meal")
+    op.drop_index(op.f("ix_meal_name"), table_name="meal")
@@ -0,0 +1,40 @@
+"""add meal plans
+
+Revision ID: be36f057a525
+Revises: 0c8a971bf49c
+Create Date: 2026-10-18 14:02:17.418205-07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'be36f057a525'
+down_revision = '0c8a971bf49c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "meal_plan",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "days", postgresql.JSONB(astext_type=sa.Text()), nullable=False
+        ),
+        sa.Column("ingredients", sa.Integer(), nullable=False),
+        sa.Column(
+            "generated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+
+def downgrade():
+    op.drop_table("meal_plan")
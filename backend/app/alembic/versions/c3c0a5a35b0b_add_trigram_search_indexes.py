@@ -0,0 +1,41 @@
+"""add trigram search indexes
+
+Revision ID: c3c0a5a35b0b
+Revises: 3e83ac60d48b
+Create Date: 2026-10-18 12:38:55.376159-07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3c0a5a35b0b'
+down_revision = '3e83ac60d48b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # gin_trgm_ops indexes serve case-insensitive substring (ILIKE) and
+    # similarity (%) matches without scanning the whole table
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        "ix_ingredient_name_trgm",
+        "ingredient",
+        ["name"],
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+    op.create_index(
+        "ix_meal_name_trgm",
+        "meal",
+        ["name"],
+        postgresql_using="gin",
+        postgresql_ops={"name": "gin_trgm_ops"},
+    )
+
+
+def downgrade():
+    op.drop_index("ix_meal_name_trgm", table_name="meal")
+    op.drop_index("ix_ingredient_name_trgm", table_name="ingredient")
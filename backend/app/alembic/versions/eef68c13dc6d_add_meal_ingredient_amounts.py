@@ -0,0 +1,30 @@
+"""add meal ingredient amounts
+
+Revision ID: eef68c13dc6d
+Revises: a1b0ffa32cbd
+Create Date: 2026-10-18 13:23:11.286728-07:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'eef68c13dc6d'
+down_revision = 'a1b0ffa32cbd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "meal_ingredient", sa.Column("quantity", sa.Float(), nullable=True)
+    )
+    op.add_column(
+        "meal_ingredient", sa.Column("unit", sa.String(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("meal_ingredient", "unit")
+    op.drop_column("meal_ingredient", "quantity")
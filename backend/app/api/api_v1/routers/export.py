@@ -0,0 +1,58 @@
+import json
+import typing as t
+
+from app.core.auth import get_current_active_superuser
+from app.db.crud import export_ingredients, export_meals, export_users
+from app.db.session import get_db
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+export_router = r = APIRouter()
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def ndjson(
+    chunks: t.AsyncIterator[t.List[t.Dict[str, t.Any]]]
+) -> t.AsyncIterator[bytes]:
+    async for rows in chunks:
+        yield "".join(json.dumps(row) + "\n" for row in rows).encode()
+
+
+@r.get("/export/ingredients", response_class=StreamingResponse)
+async def ingredients_export(
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Stream every ingredient as newline-delimited JSON
+    """
+    return StreamingResponse(
+        ndjson(export_ingredients(db)), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+@r.get("/export/meals", response_class=StreamingResponse)
+async def meals_export(
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Stream every meal with its ingredient ids as newline-delimited JSON
+    """
+    return StreamingResponse(
+        ndjson(export_meals(db)), media_type=NDJSON_MEDIA_TYPE
+    )
+
+
+@r.get("/export/users", response_class=StreamingResponse)
+async def users_export(
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Stream every user as newline-delimited JSON
+    """
+    return StreamingResponse(
+        ndjson(export_users(db)), media_type=NDJSON_MEDIA_TYPE
+    )
@@ -2,16 +2,37 @@ import typing as t
 
 from app.core import security
 from app.core.auth import get_current_active_superuser, get_current_active_user
-from app.db.crud import (create_ingredient, delete_ingredient, edit_ingredient,
-                         get_all_ingredients, get_ingredient,
-                         get_ingredients_like_name, object_as_dict)
+from app.core.shared_cache import INGREDIENTS_SCOPE, shared_cache
+from app.db.crud import (INGREDIENT_ROW, autocomplete_ingredients,
+                         create_ingredient, delete_ingredient,
+                         edit_ingredient, get_all_ingredients,
+                         get_ingredient, get_ingredients_like_name,
+                         import_ingredients)
+from app.db.pagination import NEXT_CURSOR_HEADER
+from app.db.projection import json_response
 from app.db.schemas import (Ingredient, IngredientCreate, IngredientEdit,
-                            IngredientOut)
+                            IngredientImportReport, IngredientOut)
 from app.db.session import get_db
-from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi import APIRouter, Depends, Query, Request, Response, status
 
 ingredients_router = r = APIRouter()
 
+# clients may keep the catalog but must revalidate it on every use
+CATALOG_CACHE_CONTROL = "private, no-cache"
+
+
+def etag_matches(if_none_match: t.Optional[str], etag: str) -> bool:
+    """
+    Weak comparison of an If-None-Match header against an ETag, as
+    RFC 9110 prescribes for it.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
 
 @r.get(
     "/ingredients",
@@ -19,25 +40,61 @@ ingredients_router = r = APIRouter()
     response_model_exclude_none=True,
 )
 async def ingredients_list(
-    response: Response,
+    request: Request,
     db=Depends(get_db),
     current_user=Depends(get_current_active_user),
     name: t.Annotated[str | None, Query(max_length=50)] = None,
+    cursor: t.Optional[str] = None,
+    limit: t.Annotated[int, Query(ge=1, le=100)] = 100,
 ):
     """
-    Get all ingredients
+    Get all ingredients, a page at a time. Send back the ETag of a previous
+    response in If-None-Match to get a 304 if the catalog hasn't changed
     """
+    # read before querying: a write that lands meanwhile, in any process,
+    # moves the generation past this ETag, so the next request refetches.
+    # Without Redis the catalog can't be validated, and is always sent.
+    generation = await shared_cache.generation(INGREDIENTS_SCOPE)
+    cache_headers = {"Cache-Control": CATALOG_CACHE_CONTROL}
+    if generation is not None:
+        cache_headers["ETag"] = etag = f'"{generation}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers=cache_headers,
+            )
+
     if name:
-        ingredients = get_ingredients_like_name(db, name)
+        page = await get_ingredients_like_name(
+            db, name, cursor, limit, INGREDIENT_ROW
+        )
     else:
-        ingredients = get_all_ingredients(db)
-
-    # prevent errors from converting orm to ingredient schema
-    ingredients = [object_as_dict(ingredient) for ingredient in ingredients]
+        page = await get_all_ingredients(db, cursor, limit, INGREDIENT_ROW)
+    ingredients = INGREDIENT_ROW.dicts(page.items)
 
     # This is necessary for react-admin to work
-    response.headers["Content-Range"] = f"0-9/{len(ingredients)}"
-    return ingredients
+    headers = {"Content-Range": f"0-9/{len(ingredients)}", **cache_headers}
+    if page.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return json_response(ingredients, headers)
+
+
+@r.get(
+    "/ingredients/autocomplete",
+    response_model=t.List[Ingredient],
+    response_model_exclude_none=True,
+)
+async def ingredients_autocomplete(
+    q: t.Annotated[str, Query(min_length=1, max_length=50)],
+    limit: t.Annotated[int, Query(ge=1, le=50)] = 10,
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Get the top ingredients with a name or alias word starting with q,
+    served from memory
+    """
+    return await autocomplete_ingredients(db, q, limit)
 
 
 @r.get(
@@ -54,7 +111,7 @@ async def ingredient_by_id(
     """
     Get any ingredient by id
     """
-    return get_ingredient(db, ingredient_id)
+    return await get_ingredient(db, ingredient_id)
 
 
 @r.post(
@@ -71,7 +128,26 @@ async def ingredient_create(
     """
     Create a new ingredient
     """
-    return create_ingredient(db, ingredient)
+    return await create_ingredient(db, ingredient)
+
+
+@r.post(
+    "/ingredients/import",
+    response_model=IngredientImportReport,
+)
+async def ingredients_import(
+    request: Request,
+    format: t.Literal["csv", "jsonl"] = "csv",
+    on_conflict: t.Literal["skip", "update"] = "skip",
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Bulk import ingredients from a CSV (name,alias with a header row) or
+    JSON lines request body, streamed straight into the database. Existing
+    names are skipped, or get their alias updated
+    """
+    return await import_ingredients(db, request.stream(), format, on_conflict)
 
 
 @r.put(
@@ -89,7 +165,7 @@ async def ingredient_edit(
     """
     Edit an ingredient
     """
-    return edit_ingredient(db, ingredient_id, ingredient)
+    return await edit_ingredient(db, ingredient_id, ingredient)
 
 
 @r.delete(
@@ -106,4 +182,4 @@ async def ingredient_delete(
     """
     Delete an ingredient
     """
-    return delete_ingredient(db, ingredient_id)
+    return await delete_ingredient(db, ingredient_id)
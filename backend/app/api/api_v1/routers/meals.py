@@ -1,12 +1,25 @@
 import typing as t
 
-from app.core import security
+from app.core import config, security, suggestions
 from app.core.auth import get_current_active_superuser, get_current_active_user
-from app.db.crud import (create_meal, delete_meal, edit_meal, get_all_meals,
-                         get_meal, get_meals_like_name, object_as_dict)
-from app.db.schemas import Meal, MealCreate, MealEdit, MealOut
+from app.core.celery_app import celery_app
+from app.core.shared_cache import INGREDIENTS_SCOPE, shared_cache, user_scope
+from app.db.crud import (MEAL_ROW, create_meal, create_meals, delete_meal,
+                         edit_meal, get_all_meals, get_meal,
+                         get_meal_ingredient_rows, get_meal_plan,
+                         get_meal_suggestion, get_meals_like_name,
+                         get_shopping_list, get_user_diet_requirements,
+                         object_as_dict, resolve_ingredients)
+from app.db.diet import requirements_mask
+from app.db.pagination import NEXT_CURSOR_HEADER
+from app.db.projection import json_response
+from app.db.schemas import (Meal, MealCreate, MealEdit, MealOut, MealPlan,
+                            MealSuggestions, MealSuggestionsCreate,
+                            ShoppingListCreate, ShoppingListItem)
 from app.db.session import get_db
-from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi import (APIRouter, Body, Depends, HTTPException, Query, Request,
+                     Response, status)
+from redis.exceptions import RedisError
 
 meals_router = r = APIRouter()
 
@@ -17,22 +30,181 @@ meals_router = r = APIRouter()
     response_model_exclude_none=True,
 )
 async def meals_list(
-    response: Response,
     db=Depends(get_db),
     current_user=Depends(get_current_active_user),
     name: t.Annotated[str | None, Query(max_length=50)] = None,
+    cursor: t.Optional[str] = None,
+    limit: t.Annotated[int, Query(ge=1, le=100)] = 100,
+    compatible: bool = False,
 ):
     """
-    Get all current user's meals
+    Get all current user's meals, a page at a time, cached for every worker
+    until the user's meals, diet requirements or any ingredient change.
+    With compatible, only the meals that suit the user's diet requirements.
     """
-    if name:
-        meals = get_meals_like_name(db, name, user_id=current_user.id)
-    else:
-        meals = get_all_meals(db, user_id=current_user.id)
+    async def load():
+        required = 0
+        if compatible:
+            required = requirements_mask(
+                await get_user_diet_requirements(db, current_user.id)
+            )
+        if name:
+            page = await get_meals_like_name(
+                db,
+                name,
+                user_id=current_user.id,
+                cursor=cursor,
+                limit=limit,
+                projection=MEAL_ROW,
+                compatible_with=required,
+            )
+        else:
+            page = await get_all_meals(
+                db,
+                user_id=current_user.id,
+                cursor=cursor,
+                limit=limit,
+                projection=MEAL_ROW,
+                compatible_with=required,
+            )
+        meals = MEAL_ROW.dicts(page.items)
+        ingredients = await get_meal_ingredient_rows(
+            db, [meal["id"] for meal in meals]
+        )
+        for meal in meals:
+            meal["ingredients"] = ingredients[meal["id"]]
+        return {"meals": meals, "next_cursor": page.next_cursor}
+
+    page = await shared_cache.get_or_load(
+        "meals_me",
+        f"{name}|{cursor}|{limit}|{compatible}",
+        [user_scope(current_user.id), INGREDIENTS_SCOPE],
+        config.MEALS_CACHE_TTL,
+        load,
+    )
+    meals = page["meals"]
 
     # This is necessary for react-admin to work
-    response.headers["Content-Range"] = f"0-9/{len(meals)}"
-    return meals
+    headers = {"Content-Range": f"0-9/{len(meals)}"}
+    if page["next_cursor"]:
+        headers[NEXT_CURSOR_HEADER] = page["next_cursor"]
+    return json_response(meals, headers)
+
+
+@r.post(
+    "/meals/shopping_list",
+    response_model=t.List[ShoppingListItem],
+    response_model_exclude_none=True,
+)
+async def meals_shopping_list(
+    shopping_list: ShoppingListCreate,
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Total the ingredients of some of the user's or public meals, given by id
+    or as a generated meal plan's days
+    """
+    meal_ids = shopping_list.meals + [
+        meal_id for day in shopping_list.days for meal_id in day
+    ]
+    return json_response(await get_shopping_list(db, meal_ids, current_user))
+
+
+@r.get("/meals/plan", response_model=MealPlan)
+async def meal_plan(
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Get the current user's meal plan for the week, as generated for every
+    active user overnight
+    """
+    return await get_meal_plan(db, current_user.id)
+
+
+@r.post(
+    "/meals/suggestions",
+    response_model=MealSuggestions,
+    response_model_exclude_none=True,
+    responses={status.HTTP_202_ACCEPTED: {"model": MealSuggestions}},
+)
+async def meal_suggestions_create(
+    suggestion_request: MealSuggestionsCreate,
+    response: Response,
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Suggest meals with some ingredients that suit the user's diet
+    requirements. Suggestions already generated for the same diets and
+    ingredients, for any user, are returned at once. Otherwise they are
+    generated in the background: the response is a 202 with a key to poll
+    for them, shared with everyone asking for the same in the meantime.
+    """
+    required = requirements_mask(
+        await get_user_diet_requirements(db, current_user.id)
+    )
+    ingredients = sorted(
+        set(await resolve_ingredients(db, suggestion_request.ingredients)),
+        key=lambda ingredient: ingredient.id,
+    )
+    key = suggestions.suggestion_key(
+        required, [ingredient.id for ingredient in ingredients]
+    )
+
+    stored = await get_meal_suggestion(db, key)
+    if stored:
+        return {"key": key, "status": "done", "suggestions": stored.suggestions}
+
+    job = suggestions.SuggestionJob(
+        key=key,
+        diet_mask=required,
+        ingredient_ids=[ingredient.id for ingredient in ingredients],
+        ingredients=[ingredient.name for ingredient in ingredients],
+    )
+    try:
+        queued = await suggestions.enqueue(shared_cache.redis, job)
+    except RedisError:
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Meal suggestions are unavailable",
+        )
+    if queued:
+        # prompts queued within the window share the task's request
+        celery_app.send_task(
+            "app.tasks.suggest_meals", countdown=config.LLM_BATCH_WINDOW
+        )
+    response.status_code = status.HTTP_202_ACCEPTED
+    return {"key": key, "status": "pending"}
+
+
+@r.get(
+    "/meals/suggestions/{key}",
+    response_model=MealSuggestions,
+    response_model_exclude_none=True,
+)
+async def meal_suggestions_get(
+    key: str,
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Get the suggestions of a key returned by a suggestion request, or
+    whether they are still being generated
+    """
+    stored = await get_meal_suggestion(db, key)
+    if stored:
+        return {"key": key, "status": "done", "suggestions": stored.suggestions}
+    try:
+        pending = await suggestions.is_pending(shared_cache.redis, key)
+    except RedisError:
+        pending = False
+    if not pending:
+        raise HTTPException(
+            status.HTTP_404_NOT_FOUND, detail="Suggestions not found"
+        )
+    return {"key": key, "status": "pending"}
 
 
 @r.get(
@@ -49,7 +221,7 @@ async def meal_by_id(
     """
     Get any meal by id
     """
-    return get_meal(db, meal_id)
+    return await get_meal(db, meal_id)
 
 
 @r.post(
@@ -66,7 +238,26 @@ async def meal_create(
     """
     Create new meal
     """
-    return create_meal(db, meal_create, current_user.id)
+    return await create_meal(db, meal_create, current_user.id)
+
+
+@r.post(
+    "/meals/bulk",
+    response_model=t.List[Meal],
+    response_model_exclude_none=True,
+)
+async def meals_bulk_create(
+    request: Request,
+    meals_create: t.Annotated[
+        t.List[MealCreate], Body(min_items=1, max_items=500)
+    ],
+    db=Depends(get_db),
+    current_user=Depends(get_current_active_user),
+):
+    """
+    Create many meals at once, all or nothing
+    """
+    return await create_meals(db, meals_create, current_user.id)
 
 
 @r.put(
@@ -84,7 +275,7 @@ async def meal_edit(
     """
     Edit meal
     """
-    return edit_meal(db, meal_id, meal_edit, current_user.id)
+    return await edit_meal(db, meal_id, meal_edit, current_user.id)
 
 
 @r.delete(
@@ -101,4 +292,4 @@ async def meal_delete(
     """
     Delete existing meal
     """
-    return delete_meal(db, meal_id, current_user.id)
+    return await delete_meal(db, meal_id, current_user.id)
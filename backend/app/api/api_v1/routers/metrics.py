@@ -0,0 +1,60 @@
+from app.core import security
+from app.core.auth import get_current_active_superuser
+from app.core.cache import principal_cache
+from app.core.deliverability import deliverability_checker
+from app.core.shared_cache import shared_cache
+from app.db.pool import pool_status
+from app.db.session import async_engine
+from fastapi import APIRouter, Depends
+
+metrics_router = r = APIRouter()
+
+
+@r.get("/metrics/db_pool")
+async def db_pool_metrics(
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Get connection pool occupancy, checkout wait times and failures
+    """
+    return pool_status(async_engine.pool)
+
+
+@r.get("/metrics/auth_cache")
+async def auth_cache_metrics(
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Get authenticated-principal cache size and hit/miss counters
+    """
+    return principal_cache.stats()
+
+
+@r.get("/metrics/shared_cache")
+async def shared_cache_metrics(
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Get this worker's shared cache hit/miss counters and Redis errors
+    """
+    return shared_cache.stats()
+
+
+@r.get("/metrics/password_hasher")
+async def password_hasher_metrics(
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Get password hashing concurrency, queue and run times
+    """
+    return security.password_hasher.stats()
+
+
+@r.get("/metrics/email_deliverability")
+async def email_deliverability_metrics(
+    current_user=Depends(get_current_active_superuser),
+):
+    """
+    Get email domain deliverability cache counters and failed DNS lookups
+    """
+    return deliverability_checker.stats()
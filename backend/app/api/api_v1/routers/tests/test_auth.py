@@ -1,4 +1,6 @@
 from app.core import security
+from app.db import models
+from sqlalchemy import select
 
 
 # Monkey patch function we can use to shave a second off our tests by skipping the password hashing check
@@ -30,6 +32,29 @@ def test_signup(client, test_db, monkeypatch):
     assert response.status_code == 200
 
 
+def test_signup_query_count(client, test_db, monkeypatch, db_statements):
+    async def hash_password_mock(password: str) -> str:
+        return "supersecrethash"
+
+    monkeypatch.setattr(security, "hash_password", hash_password_mock)
+
+    response = client.post(
+        "/api/signup",
+        data={"username": "some@email.com", "password": "randompassword"},
+    )
+    assert response.status_code == 200
+    # the user and their diet requirements, inserted in one transaction
+    assert [statement.split()[:3] for statement in db_statements] == [
+        ["INSERT", "INTO", '"user"'],
+        ["INSERT", "INTO", "user_diet_requirements"],
+    ]
+
+    user = test_db.scalars(
+        select(models.User).filter(models.User.email == "some@email.com")
+    ).one()
+    assert user.diet_requirements.is_vegan is False
+
+
 def test_resignup(client, test_user, monkeypatch):
     # Patch the test to skip password hashing check for speed
     monkeypatch.setattr(security, "verify_password", verify_password_mock)
@@ -0,0 +1,94 @@
+import json
+
+from app.db import crud
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_export_ingredients(
+    client, test_ingredients, superuser_token_headers, monkeypatch
+):
+    # smaller chunks than rows, so the export spans several fetches
+    monkeypatch.setattr(crud, "EXPORT_CHUNK_SIZE", 1)
+
+    response = client.get(
+        "/api/v1/export/ingredients", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert read_ndjson(response) == [
+        {
+            "id": ingredient.id,
+            "name": ingredient.name,
+            "alias": None,
+            "diet_mask": 0,
+        }
+        for ingredient in test_ingredients
+    ]
+
+
+def test_export_meals(
+    client, test_meals, test_ingredients, superuser_token_headers, monkeypatch
+):
+    monkeypatch.setattr(crud, "EXPORT_CHUNK_SIZE", 2)
+
+    response = client.get(
+        "/api/v1/export/meals", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert read_ndjson(response) == [
+        {
+            "id": meal.id,
+            "name": meal.name,
+            "description": meal.description,
+            "user_id": meal.user_id,
+            "ingredients": [ingredient.id for ingredient in meal.ingredients],
+        }
+        for meal in test_meals
+    ]
+
+
+def test_export_users(
+    client, test_user, test_superuser, superuser_token_headers
+):
+    response = client.get(
+        "/api/v1/export/users", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    users = read_ndjson(response)
+    assert [user["email"] for user in users] == [
+        test_user.email,
+        test_superuser.email,
+    ]
+    assert users[0] == {
+        "id": test_user.id,
+        "email": test_user.email,
+        "name": None,
+        "is_active": True,
+        "is_superuser": False,
+        "is_verified": True,
+    }
+
+
+def test_export_empty(client, superuser_token_headers):
+    response = client.get(
+        "/api/v1/export/meals", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.text == ""
+
+
+def test_unauthenticated_routes(client):
+    for table in ("ingredients", "meals", "users"):
+        response = client.get(f"/api/v1/export/{table}")
+        assert response.status_code == 401
+
+
+def test_unauthorized_routes(client, user_token_headers):
+    for table in ("ingredients", "meals", "users"):
+        response = client.get(
+            f"/api/v1/export/{table}", headers=user_token_headers
+        )
+        assert response.status_code == 403
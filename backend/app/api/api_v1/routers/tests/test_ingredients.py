@@ -1,4 +1,12 @@
-from app.db import models
+import asyncio
+import weakref
+
+import redis.asyncio
+from app import import_ingredients
+from app.core.shared_cache import INGREDIENTS_SCOPE, shared_cache
+from app.db import crud, models
+from app.db.autocomplete import ingredient_index
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 
 def test_get_ingredients_list(client, test_ingredients, user_token_headers):
@@ -39,6 +47,275 @@ def test_get_ingredients_by_name(client, test_ingredients, user_token_headers):
     ]
 
 
+def test_get_ingredients_by_name_ranked(
+    client, test_db, test_ingredients, user_token_headers
+):
+    test_db.add(models.Ingredient(name="Cherry tomatoes"))
+    test_db.add(models.Ingredient(name="Tomato"))
+    test_db.add(models.Ingredient(name="Sun-dried tomato paste"))
+    test_db.commit()
+
+    response = client.get(
+        "/api/v1/ingredients?name=TOMATO",
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert [i["name"] for i in response.json()] == [
+        "Tomato",
+        "Cherry tomatoes",
+        "Sun-dried tomato paste",
+    ]
+
+
+def test_get_ingredients_paginated(
+    client, test_db, test_ingredients, user_token_headers
+):
+    test_db.add(models.Ingredient(name="Test Ingredient 3"))
+    test_db.commit()
+
+    response = client.get(
+        "/api/v1/ingredients?limit=2", headers=user_token_headers
+    )
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 2
+    cursor = response.headers["X-Next-Cursor"]
+
+    response = client.get(
+        f"/api/v1/ingredients?limit=2&cursor={cursor}",
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert "X-Next-Cursor" not in response.headers
+    assert [i["name"] for i in first_page + response.json()] == [
+        "Test Ingredient",
+        "Test Ingredient 2",
+        "Test Ingredient 3",
+    ]
+
+
+def test_get_ingredients_by_name_paginated(
+    client, test_db, test_ingredients, user_token_headers
+):
+    test_db.add(models.Ingredient(name="Tomato"))
+    test_db.add(models.Ingredient(name="Cherry tomatoes"))
+    test_db.add(models.Ingredient(name="Tomato paste"))
+    test_db.commit()
+
+    names = []
+    cursor = ""
+    for _ in range(3):
+        response = client.get(
+            f"/api/v1/ingredients?name=tomato&limit=1&cursor={cursor}",
+            headers=user_token_headers,
+        )
+        names += [i["name"] for i in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+    assert cursor is None
+    assert names == ["Tomato", "Tomato paste", "Cherry tomatoes"]
+
+
+def test_get_ingredients_invalid_cursor(client, user_token_headers):
+    response = client.get(
+        "/api/v1/ingredients?cursor=garbage", headers=user_token_headers
+    )
+    assert response.status_code == 400
+
+
+def test_get_ingredients_not_modified(
+    client,
+    test_ingredients,
+    user_token_headers,
+    superuser_token_headers,
+    db_statements,
+):
+    response = client.get("/api/v1/ingredients", headers=user_token_headers)
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    db_statements.clear()
+    for if_none_match in (etag, f'"stale", W/{etag}', "*"):
+        response = client.get(
+            "/api/v1/ingredients",
+            headers={**user_token_headers, "If-None-Match": if_none_match},
+        )
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+        assert response.content == b""
+    assert db_statements == []
+
+    # any ingredient write moves the catalog to a new version
+    client.post(
+        "/api/v1/ingredients",
+        json={"name": "Basil"},
+        headers=superuser_token_headers,
+    )
+    response = client.get(
+        "/api/v1/ingredients",
+        headers={**user_token_headers, "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert "Basil" in [ingredient["name"] for ingredient in response.json()]
+
+
+def test_get_ingredients_changed_elsewhere(
+    client, test_ingredients, user_token_headers, shared_cache_redis
+):
+    response = client.get("/api/v1/ingredients", headers=user_token_headers)
+    etag = response.headers["etag"]
+
+    # another process, such as the import CLI, writes to the catalog
+    shared_cache_redis.incr(shared_cache._generation_key(INGREDIENTS_SCOPE))
+
+    response = client.get(
+        "/api/v1/ingredients",
+        headers={**user_token_headers, "If-None-Match": etag},
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.json()) == 2
+
+
+def test_get_ingredients_redis_down(
+    client, test_ingredients, user_token_headers, monkeypatch
+):
+    monkeypatch.setattr(
+        shared_cache,
+        "_connect",
+        lambda: redis.asyncio.Redis.from_url("redis://localhost:1"),
+    )
+    monkeypatch.setattr(shared_cache, "_clients", weakref.WeakKeyDictionary())
+
+    # the catalog can't be validated, so it is always sent
+    response = client.get(
+        "/api/v1/ingredients",
+        headers={**user_token_headers, "If-None-Match": "*"},
+    )
+    assert response.status_code == 200
+    assert "etag" not in response.headers
+    assert len(response.json()) == 2
+
+
+def test_autocomplete_ingredients(
+    client, test_db, test_ingredients, user_token_headers
+):
+    ingredient_index.rebuild(
+        (i.id, i.name, i.alias) for i in test_db.query(models.Ingredient)
+    )
+    response = client.get(
+        "/api/v1/ingredients/autocomplete?q=test&limit=1",
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": test_ingredients[0].id, "name": test_ingredients[0].name}
+    ]
+
+
+def test_autocomplete_follows_writes_elsewhere(
+    client, test_db, test_ingredients, user_token_headers, shared_cache_redis
+):
+    def autocomplete(q):
+        response = client.get(
+            f"/api/v1/ingredients/autocomplete?q={q}",
+            headers=user_token_headers,
+        )
+        return [ingredient["name"] for ingredient in response.json()]
+
+    assert autocomplete("test") == ["Test Ingredient", "Test Ingredient 2"]
+
+    # another process, such as the import CLI, writes to the catalog
+    test_db.add(models.Ingredient(name="Saffron"))
+    test_db.commit()
+    # served from memory until the catalog moves to a new generation
+    assert autocomplete("saf") == []
+    shared_cache_redis.incr(shared_cache._generation_key(INGREDIENTS_SCOPE))
+    assert autocomplete("saf") == ["Saffron"]
+
+
+def test_autocomplete_follows_writes(client, superuser_token_headers):
+    response = client.post(
+        "/api/v1/ingredients",
+        json={"name": "Aubergine", "alias": "Eggplant"},
+        headers=superuser_token_headers,
+    )
+    ingredient_id = response.json()["id"]
+    response = client.get(
+        "/api/v1/ingredients/autocomplete?q=egg",
+        headers=superuser_token_headers,
+    )
+    assert [i["id"] for i in response.json()] == [ingredient_id]
+
+    client.put(
+        f"/api/v1/ingredients/{ingredient_id}",
+        json={"alias": "Brinjal"},
+        headers=superuser_token_headers,
+    )
+    response = client.get(
+        "/api/v1/ingredients/autocomplete?q=egg",
+        headers=superuser_token_headers,
+    )
+    assert response.json() == []
+
+    client.delete(
+        f"/api/v1/ingredients/{ingredient_id}",
+        headers=superuser_token_headers,
+    )
+    response = client.get(
+        "/api/v1/ingredients/autocomplete?q=aub",
+        headers=superuser_token_headers,
+    )
+    assert response.json() == []
+
+
+def test_autocomplete_writer_keeps_its_index(
+    client, test_ingredients, superuser_token_headers, db_statements
+):
+    def autocomplete(q):
+        response = client.get(
+            f"/api/v1/ingredients/autocomplete?q={q}",
+            headers=superuser_token_headers,
+        )
+        return [ingredient["name"] for ingredient in response.json()]
+
+    assert autocomplete("test") == ["Test Ingredient", "Test Ingredient 2"]
+    response = client.post(
+        "/api/v1/ingredients",
+        json={"name": "Saffron"},
+        headers=superuser_token_headers,
+    )
+    client.delete(
+        f"/api/v1/ingredients/{test_ingredients[0].id}",
+        headers=superuser_token_headers,
+    )
+    db_statements.clear()
+
+    # patched in place and moved to the new generation, not rebuilt
+    assert autocomplete("saf") == ["Saffron"]
+    assert autocomplete("test") == ["Test Ingredient 2"]
+    assert db_statements == []
+
+
+def test_concurrent_autocomplete_rebuilds_once(
+    test_async_engine, test_ingredients, db_statements
+):
+    sessions = async_sessionmaker(
+        bind=test_async_engine, expire_on_commit=False
+    )
+
+    async def autocomplete():
+        async with sessions() as db:
+            return await crud.autocomplete_ingredients(db, "test")
+
+    async def autocomplete_concurrently():
+        return await asyncio.gather(*(autocomplete() for _ in range(5)))
+
+    results = asyncio.run(autocomplete_concurrently())
+    assert [len(result) for result in results] == [2] * 5
+    assert len(db_statements) == 1
+
+
 def test_get_ingredient(client, test_ingredients, superuser_token_headers):
     response = client.get(
         f"/api/v1/ingredients/{test_ingredients[0].id}",
@@ -78,6 +355,61 @@ def test_create_ingredient(client, superuser_token_headers):
     }
 
 
+def test_write_ingredient_query_count(
+    client, superuser_token_headers, db_statements
+):
+    client.get("/api/v1/ingredients", headers=superuser_token_headers)
+    db_statements.clear()
+
+    response = client.post(
+        "/api/v1/ingredients/",
+        json={"name": "Tofu"},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    # the id comes back with the INSERT, nothing is read back after it
+    assert [statement.split()[0] for statement in db_statements] == [
+        "INSERT"
+    ]
+
+    db_statements.clear()
+    response = client.put(
+        f"/api/v1/ingredients/{response.json()['id']}",
+        json={"alias": "Bean curd", "diets": ["vegan"]},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["diets"] == ["vegan"]
+    assert [statement.split()[0] for statement in db_statements] == [
+        "SELECT",
+        "UPDATE",
+    ]
+
+
+def test_create_ingredient_with_diets(client, superuser_token_headers):
+    response = client.post(
+        "/api/v1/ingredients/",
+        json={"name": "Tofu", "diets": ["vegan", "vegetarian"]},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["diets"] == ["vegetarian", "vegan"]
+
+    response = client.get(
+        "/api/v1/ingredients", headers=superuser_token_headers
+    )
+    assert response.json() == [
+        {"id": 1, "name": "Tofu", "diets": ["vegetarian", "vegan"]}
+    ]
+
+    response = client.post(
+        "/api/v1/ingredients/",
+        json={"name": "Beef", "diets": ["carnivore"]},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 422
+
+
 def test_create_ingredient_duplicate(
     client, test_ingredients, superuser_token_headers
 ):
@@ -112,6 +444,30 @@ def test_edit_ingredient(client, test_ingredients, superuser_token_headers):
     assert response.json() == new_ingredient
 
 
+def test_edit_ingredient_diets(
+    client, test_ingredients, superuser_token_headers
+):
+    response = client.put(
+        f"/api/v1/ingredients/{test_ingredients[0].id}",
+        json={"diets": ["gluten_free"]},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": test_ingredients[0].id,
+        "name": test_ingredients[0].name,
+        "diets": ["gluten_free"],
+    }
+
+    response = client.put(
+        f"/api/v1/ingredients/{test_ingredients[0].id}",
+        json={"diets": []},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert "diets" not in response.json()
+
+
 def test_edit_ingredient_not_found(
     client, test_ingredients, superuser_token_headers
 ):
@@ -159,7 +515,12 @@ def test_delete_ingredient(
         "id": test_ingredients[0].id,
         "name": test_ingredients[0].name,
     }
-    assert test_db.get(models.Ingredient, test_ingredients[0].id) is None
+    assert (
+        test_db.get(
+            models.Ingredient, test_ingredients[0].id, populate_existing=True
+        )
+        is None
+    )
 
 
 def test_delete_ingredient_not_found(
@@ -172,6 +533,123 @@ def test_delete_ingredient_not_found(
     assert response.status_code == 404
 
 
+def test_import_ingredients_csv(
+    client, test_ingredients, user_token_headers, superuser_token_headers
+):
+    catalog = (
+        "name,alias\n"
+        "Basil,\n"
+        '"Chickpea, dried",Garbanzo\n'
+        f"{test_ingredients[0].name},New Alias\n"
+        ",Nameless\n"
+        "Basil,Sweet basil\n"
+    )
+    response = client.post(
+        "/api/v1/ingredients/import",
+        content=catalog,
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    # the first Basil row is superseded by the second one
+    assert response.json() == {
+        "inserted": 2,
+        "updated": 0,
+        "unchanged": 1,
+        "rejected": 2,
+    }
+
+    response = client.get("/api/v1/ingredients", headers=user_token_headers)
+    ingredients = {i["name"]: i.get("alias") for i in response.json()}
+    assert ingredients["Basil"] == "Sweet basil"
+    assert ingredients["Chickpea, dried"] == "Garbanzo"
+    assert ingredients[test_ingredients[0].name] is None
+
+    # imported ingredients are in the autocomplete index on its next use
+    response = client.get(
+        "/api/v1/ingredients/autocomplete?q=garb", headers=user_token_headers
+    )
+    assert [i["name"] for i in response.json()] == ["Chickpea, dried"]
+
+
+def test_import_ingredients_jsonl_update(
+    client, test_ingredients, user_token_headers, superuser_token_headers
+):
+    catalog = "\n".join(
+        [
+            '{"name": "Basil"}',
+            "not json",
+            f'{{"name": "{test_ingredients[0].name}", "alias": "New Alias"}}',
+            f'{{"name": "{test_ingredients[1].name}"}}',
+            '{"alias": "Nameless"}',
+            "",
+        ]
+    )
+    response = client.post(
+        "/api/v1/ingredients/import?format=jsonl&on_conflict=update",
+        content=catalog,
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "inserted": 1,
+        "updated": 1,
+        "unchanged": 1,
+        "rejected": 2,
+    }
+
+    response = client.get("/api/v1/ingredients", headers=user_token_headers)
+    ingredients = {i["name"]: i.get("alias") for i in response.json()}
+    assert ingredients == {
+        "Basil": None,
+        test_ingredients[0].name: "New Alias",
+        test_ingredients[1].name: None,
+    }
+
+
+def test_import_ingredients_cli(
+    client, test_async_engine, user_token_headers, tmp_path, monkeypatch
+):
+    def autocomplete(q):
+        response = client.get(
+            f"/api/v1/ingredients/autocomplete?q={q}",
+            headers=user_token_headers,
+        )
+        return [ingredient["name"] for ingredient in response.json()]
+
+    assert autocomplete("basil") == []
+    generation = ingredient_index.generation
+
+    path = tmp_path / "catalog.csv"
+    path.write_text("name,alias\nBasil,\nChickpea,Garbanzo\n")
+    monkeypatch.setattr(
+        import_ingredients,
+        "AsyncSessionLocal",
+        async_sessionmaker(bind=test_async_engine, expire_on_commit=False),
+    )
+    asyncio.run(import_ingredients.main(str(path), "csv", "skip"))
+
+    # the import doesn't build an index of its own, the API's is rebuilt
+    # when it is next used
+    assert ingredient_index.generation == generation
+    assert autocomplete("garb") == ["Chickpea"]
+    assert ingredient_index.generation != generation
+
+
+def test_import_ingredients_malformed_csv(
+    client, user_token_headers, superuser_token_headers
+):
+    response = client.post(
+        "/api/v1/ingredients/import",
+        content="name,alias\nBasil,,too many\n",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid csv import")
+
+    response = client.get("/api/v1/ingredients", headers=user_token_headers)
+    assert response.json() == []
+
+
 def test_unauthenticated_routes(client):
     response = client.get("/api/v1/ingredients")
     assert response.status_code == 401
@@ -179,6 +657,8 @@ def test_unauthenticated_routes(client):
     assert response.status_code == 401
     response = client.post("/api/v1/ingredients")
     assert response.status_code == 401
+    response = client.post("/api/v1/ingredients/import")
+    assert response.status_code == 401
     response = client.put("/api/v1/ingredients/1")
     assert response.status_code == 401
     response = client.delete("/api/v1/ingredients/1")
@@ -193,6 +673,11 @@ def test_unauthorized_routes(client, user_token_headers):
         headers=user_token_headers,
     )
     assert response.status_code == 403
+    response = client.post(
+        "/api/v1/ingredients/import",
+        headers=user_token_headers,
+    )
+    assert response.status_code == 403
     response = client.put(
         "/api/v1/ingredients/1",
         headers=user_token_headers,
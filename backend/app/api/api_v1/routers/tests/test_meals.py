@@ -1,3 +1,9 @@
+import weakref
+
+import redis.asyncio
+from app import tasks
+from app.core import config
+from app.core.shared_cache import shared_cache
 from app.db import models
 
 
@@ -67,6 +73,428 @@ def test_get_meals_by_name(client, test_user, test_meals, user_token_headers):
     ]
 
 
+def test_get_meals_me_query_count(
+    client,
+    test_db,
+    test_user,
+    test_meals,
+    user_token_headers,
+    db_statements,
+    shared_cache_redis,
+):
+    # the first request also loads the user behind the token
+    client.get("/api/v1/meals/me", headers=user_token_headers)
+    shared_cache_redis.flushdb()
+    db_statements.clear()
+    client.get("/api/v1/meals/me", headers=user_token_headers)
+    statements = len(db_statements)
+
+    for i in range(10):
+        meal = models.Meal(name=f"Extra Meal {i}", user_id=test_user.id)
+        meal.ingredients = [models.Ingredient(name=f"Extra Ingredient {i}")]
+        test_db.add(meal)
+    test_db.commit()
+
+    # written behind crud's back, so drop the cached page by hand
+    shared_cache_redis.flushdb()
+    db_statements.clear()
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert len(response.json()) == 12
+    # no lazy load per meal, the ingredients of all meals come in one query
+    assert len(db_statements) == statements
+
+
+def test_get_meals_me_cached(
+    client,
+    test_meals,
+    test_ingredients,
+    user_token_headers,
+    superuser_token_headers,
+    db_statements,
+):
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    meals = response.json()
+
+    db_statements.clear()
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert response.json() == meals
+    assert db_statements == []
+
+    # the user's own writes show up straight away
+    client.put(
+        f"/api/v1/meals/{test_meals[0].id}",
+        json={"description": "Changed"},
+        headers=user_token_headers,
+    )
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert response.json()[0]["description"] == "Changed"
+
+    # so do ingredient writes, whose names every meal embeds
+    client.put(
+        f"/api/v1/ingredients/{test_ingredients[0].id}",
+        json={"name": "Renamed Ingredient"},
+        headers=superuser_token_headers,
+    )
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert response.json()[1]["ingredients"] == [
+        {"id": test_ingredients[0].id, "name": "Renamed Ingredient"}
+    ]
+
+
+def test_get_meals_me_redis_down(
+    client, test_meals, user_token_headers, monkeypatch
+):
+    monkeypatch.setattr(
+        shared_cache,
+        "_connect",
+        lambda: redis.asyncio.Redis.from_url("redis://localhost:1"),
+    )
+    monkeypatch.setattr(shared_cache, "_clients", weakref.WeakKeyDictionary())
+
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert shared_cache.stats()["errors"] > 0
+
+
+def test_get_meals_me_paginated(
+    client, test_user, test_meals, user_token_headers
+):
+    response = client.get(
+        "/api/v1/meals/me?limit=1", headers=user_token_headers
+    )
+    assert response.status_code == 200
+    assert [m["id"] for m in response.json()] == [test_meals[0].id]
+
+    response = client.get(
+        "/api/v1/meals/me?limit=1&cursor="
+        + response.headers["X-Next-Cursor"],
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert [m["id"] for m in response.json()] == [test_meals[1].id]
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_get_meals_me_compatible(
+    client,
+    test_db,
+    test_user,
+    test_meals,
+    test_ingredients,
+    superuser_token_headers,
+    user_token_headers,
+    shared_cache_redis,
+):
+    def compatible_meals():
+        response = client.get(
+            "/api/v1/meals/me?compatible=true", headers=user_token_headers
+        )
+        assert response.status_code == 200
+        return [meal["name"] for meal in response.json()]
+
+    # without diet requirements every meal is compatible
+    assert compatible_meals() == ["Test Meal", "Test Meal 2"]
+
+    response = client.put(
+        "/api/v1/users_diet_requirements/me",
+        json={"is_vegan": True},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert compatible_meals() == []
+
+    # a meal is vegan once all of its ingredients are
+    response = client.put(
+        f"/api/v1/ingredients/{test_ingredients[0].id}",
+        json={"diets": ["vegetarian", "vegan"]},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert compatible_meals() == ["Test Meal 2"]
+
+    response = client.put(
+        f"/api/v1/meals/{test_meals[0].id}",
+        json={"ingredients": [test_ingredients[0].id]},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert compatible_meals() == ["Test Meal", "Test Meal 2"]
+
+    response = client.get(
+        "/api/v1/meals/me?compatible=true&name=Test%20Meal%202",
+        headers=user_token_headers,
+    )
+    assert [meal["name"] for meal in response.json()] == ["Test Meal 2"]
+
+    # adding an ingredient without the diet breaks it again, however the
+    # meal_ingredient row is written
+    test_db.execute(
+        models.MealIngredient.insert().values(
+            meal_id=test_meals[1].id, ingredient_id=test_ingredients[1].id
+        )
+    )
+    test_db.commit()
+    # the write bypassed the app, so drop the cached pages by hand
+    shared_cache_redis.flushdb()
+    assert compatible_meals() == ["Test Meal"]
+
+
+def test_shopping_list(
+    client,
+    test_db,
+    test_ingredients,
+    test_meals,
+    user_token_headers,
+    db_statements,
+):
+    milk, flour = test_ingredients
+    response = client.post(
+        "/api/v1/meals/bulk",
+        json=[
+            {
+                "name": "Pancakes",
+                "ingredients": [
+                    {"id": milk.id, "quantity": 0.3, "unit": "l"},
+                    {"id": flour.id, "quantity": 120, "unit": "g"},
+                ],
+            },
+            {
+                "name": "Bread",
+                "ingredients": [
+                    {"id": flour.id, "quantity": 0.5, "unit": "kg"}
+                ],
+            },
+        ],
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    pancakes, bread = [meal["id"] for meal in response.json()]
+    response = client.post(
+        "/api/v1/meals",
+        json={
+            "name": "Milkshake",
+            "ingredients": [{"id": milk.id, "quantity": 2, "unit": "cups"}],
+        },
+        headers=user_token_headers,
+    )
+    milkshake = response.json()["id"]
+
+    db_statements.clear()
+    response = client.post(
+        "/api/v1/meals/shopping_list",
+        json={"meals": [bread], "days": [[pancakes, milkshake], [pancakes]]},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": milk.id, "name": milk.name, "quantity": 1080, "unit": "ml"},
+        {"id": flour.id, "name": flour.name, "quantity": 740, "unit": "g"},
+    ]
+    # the meal check and one aggregate query
+    assert len(db_statements) == 2
+
+    # ingredients without an amount are listed without totals
+    response = client.post(
+        "/api/v1/meals/shopping_list",
+        json={"meals": [test_meals[1].id, test_meals[2].id]},
+        headers=user_token_headers,
+    )
+    assert response.json() == [{"id": milk.id, "name": milk.name}]
+
+
+def test_shopping_list_unknown_meals(
+    client, test_db, test_meals, user_token_headers
+):
+    other_user = models.User(email="other@email.com", hashed_password="x")
+    other_user.meals = [models.Meal(name="Other Meal")]
+    test_db.add(other_user)
+    test_db.commit()
+
+    response = client.post(
+        "/api/v1/meals/shopping_list",
+        json={"meals": [test_meals[0].id, other_user.meals[0].id, 1234]},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 400
+    assert response.json() == {
+        "detail": f"Meal not found: {other_user.meals[0].id}, 1234"
+    }
+
+
+def test_edit_meal_ingredient_amounts(
+    client, test_meals, test_ingredients, user_token_headers
+):
+    def amounts():
+        response = client.post(
+            "/api/v1/meals/shopping_list",
+            json={"meals": [test_meals[0].id]},
+            headers=user_token_headers,
+        )
+        return [
+            (item.get("quantity"), item.get("unit")) for item in response.json()
+        ]
+
+    response = client.put(
+        f"/api/v1/meals/{test_meals[0].id}",
+        json={
+            "ingredients": [
+                {"id": test_ingredients[0].id, "quantity": 2},
+                {"id": test_ingredients[1].id, "quantity": 1, "unit": "tsp"},
+            ]
+        },
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert amounts() == [(2, None), (5, "ml")]
+
+    response = client.put(
+        f"/api/v1/meals/{test_meals[0].id}",
+        json={"ingredients": [test_ingredients[0].id]},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert amounts() == [(None, None)]
+
+    response = client.put(
+        f"/api/v1/meals/{test_meals[0].id}",
+        json={
+            "ingredients": [{"id": test_ingredients[0].id, "unit": "parsec"}]
+        },
+        headers=user_token_headers,
+    )
+    assert response.status_code == 422
+
+
+def test_meal_plan(
+    client, test_db, test_user, test_meals, user_token_headers, db_statements
+):
+    response = client.get("/api/v1/meals/plan", headers=user_token_headers)
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Meal plan not generated yet"}
+
+    days = [[test_meals[0].id, test_meals[1].id]] + [[]] * 6
+    test_db.add(models.MealPlan(user_id=test_user.id, days=days, ingredients=2))
+    test_db.commit()
+    db_statements.clear()
+
+    response = client.get("/api/v1/meals/plan", headers=user_token_headers)
+    assert response.status_code == 200
+    plan = response.json()
+    assert plan.pop("generated_at")
+    assert plan == {"user_id": test_user.id, "days": days, "ingredients": 2}
+    # served as stored, with a single lookup
+    assert len([s for s in db_statements if "meal_plan" in s]) == 1
+
+
+def test_meal_suggestions(
+    client,
+    test_ingredients,
+    user_token_headers,
+    superuser_token_headers,
+    sent_tasks,
+    suggestion_worker,
+):
+    ids = [ingredient.id for ingredient in test_ingredients]
+
+    response = client.post(
+        "/api/v1/meals/suggestions",
+        json={"ingredients": ids},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 202
+    key = response.json()["key"]
+    assert response.json() == {"key": key, "status": "pending"}
+    assert sent_tasks == [
+        ("app.tasks.suggest_meals", {"countdown": config.LLM_BATCH_WINDOW})
+    ]
+
+    # another user with the same diets waits for the same completion
+    response = client.post(
+        "/api/v1/meals/suggestions",
+        json={"ingredients": [ids[1], ids[0], ids[1]]},
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 202
+    assert response.json() == {"key": key, "status": "pending"}
+    assert len(sent_tasks) == 1
+
+    response = client.get(
+        f"/api/v1/meals/suggestions/{key}", headers=user_token_headers
+    )
+    assert response.status_code == 200
+    assert response.json() == {"key": key, "status": "pending"}
+
+    tasks.suggest_meals()
+    assert suggestion_worker.stats()["requests"] == 1
+
+    response = client.get(
+        f"/api/v1/meals/suggestions/{key}", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    suggestions = response.json()["suggestions"]
+    assert len(suggestions) == config.SUGGESTIONS_PER_PROMPT
+    assert test_ingredients[0].name in suggestions[0]["description"]
+
+    # served from the table from now on
+    response = client.post(
+        "/api/v1/meals/suggestions",
+        json={"ingredients": ids},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "key": key,
+        "status": "done",
+        "suggestions": suggestions,
+    }
+    assert len(sent_tasks) == 1
+
+
+def test_meal_suggestions_depend_on_diets(
+    client, test_db, test_user, test_ingredients, user_token_headers, sent_tasks
+):
+    def suggestion_key():
+        response = client.post(
+            "/api/v1/meals/suggestions",
+            json={"ingredients": [test_ingredients[0].id]},
+            headers=user_token_headers,
+        )
+        assert response.status_code == 202
+        return response.json()["key"]
+
+    key = suggestion_key()
+    test_user.diet_requirements.is_vegan = True
+    test_db.commit()
+    assert suggestion_key() != key
+
+
+def test_meal_suggestions_invalid(
+    client, test_ingredients, user_token_headers, sent_tasks
+):
+    response = client.post(
+        "/api/v1/meals/suggestions",
+        json={"ingredients": [test_ingredients[0].id, 1234]},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Ingredient not found: 1234"}
+
+    response = client.post(
+        "/api/v1/meals/suggestions",
+        json={"ingredients": []},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 422
+
+    response = client.get(
+        "/api/v1/meals/suggestions/unknown", headers=user_token_headers
+    )
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Suggestions not found"}
+
+
 def test_get_meal(client, test_user, test_meals, superuser_token_headers):
     response = client.get(
         f"/api/v1/meals/{test_meals[0].id}",
@@ -148,6 +576,19 @@ def test_create_meal_duplicate(
     assert response.json() == {"detail": "Meal with this name already exists"}
 
 
+def test_create_meal_name_of_other_user(
+    client, test_user, test_meals, user_token_headers
+):
+    # meal names are only unique per user
+    response = client.post(
+        "/api/v1/meals",
+        json={"name": test_meals[2].name},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["user_id"] == test_user.id
+
+
 def test_create_meal_invalid_ingredient(
     client, test_ingredients, user_token_headers
 ):
@@ -165,7 +606,116 @@ def test_create_meal_invalid_ingredient(
         headers=user_token_headers,
     )
     assert response.status_code == 400
-    assert response.json() == {"detail": "Ingredient not found"}
+    assert response.json() == {"detail": "Ingredient not found: 1234"}
+
+
+def test_create_meal_invalid_ingredients_reported(
+    client, test_ingredients, user_token_headers
+):
+    new_meal = {
+        "name": "New Meal",
+        "ingredients": [1234, test_ingredients[0].id, 99, 1234],
+    }
+
+    response = client.post(
+        "/api/v1/meals",
+        json=new_meal,
+        headers=user_token_headers,
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Ingredient not found: 99, 1234"}
+
+
+def test_bulk_create_meals(
+    client, test_user, test_ingredients, user_token_headers, db_statements
+):
+    new_meals = [
+        {
+            "name": f"Bulk Meal {i}",
+            "description": "Imported",
+            "ingredients": [ingredient.id for ingredient in test_ingredients],
+        }
+        for i in range(20)
+    ]
+    new_meals[0]["ingredients"] = [test_ingredients[1].id]
+
+    # resolve the token's user first, so only meal work is counted below
+    client.get("/api/v1/meals/me", headers=user_token_headers)
+    db_statements.clear()
+
+    response = client.post(
+        "/api/v1/meals/bulk",
+        json=new_meals,
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    meals = response.json()
+    assert [meal["name"] for meal in meals] == [m["name"] for m in new_meals]
+    assert all(meal["user_id"] == test_user.id for meal in meals)
+    assert meals[0]["ingredients"] == [
+        {"id": test_ingredients[1].id, "name": test_ingredients[1].name}
+    ]
+    assert [i["id"] for i in meals[1]["ingredients"]] == [
+        ingredient.id for ingredient in test_ingredients
+    ]
+
+    # ingredients: the lookup doesn't grow with the batch, and the foreign
+    # and unique keys check the user and the names without one
+    selects = [s for s in db_statements if s.startswith("SELECT")]
+    assert len(selects) == 1
+
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert len(response.json()) == 20
+
+
+def test_bulk_create_meals_all_or_nothing(
+    client, test_meals, test_ingredients, user_token_headers
+):
+    new_meals = [
+        {"name": "Fine Meal", "ingredients": [test_ingredients[0].id]},
+        {"name": "Broken Meal", "ingredients": [1234]},
+    ]
+    response = client.post(
+        "/api/v1/meals/bulk",
+        json=new_meals,
+        headers=user_token_headers,
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Ingredient not found: 1234"}
+
+    new_meals = [
+        {"name": "Fine Meal"},
+        {"name": test_meals[0].name},
+    ]
+    response = client.post(
+        "/api/v1/meals/bulk",
+        json=new_meals,
+        headers=user_token_headers,
+    )
+    assert response.status_code == 409
+    assert response.json() == {
+        "detail": f"Meals with these names already exist: {test_meals[0].name}"
+    }
+
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert "Fine Meal" not in [meal["name"] for meal in response.json()]
+
+
+def test_bulk_create_meals_duplicate_names(client, user_token_headers):
+    response = client.post(
+        "/api/v1/meals/bulk",
+        json=[{"name": "Twice"}, {"name": "Once"}, {"name": "Twice"}],
+        headers=user_token_headers,
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Duplicate meal names: Twice"}
+
+
+def test_bulk_create_meals_empty(client, user_token_headers):
+    response = client.post(
+        "/api/v1/meals/bulk", json=[], headers=user_token_headers
+    )
+    assert response.status_code == 422
 
 
 def test_edit_meal(
@@ -199,6 +749,41 @@ def test_edit_meal(
     }
 
 
+def test_edit_meal_query_count(
+    client, test_meals, test_ingredients, user_token_headers, db_statements
+):
+    client.get("/api/v1/meals/me", headers=user_token_headers)
+    db_statements.clear()
+
+    # test_meals[0] has both ingredients already, listed in the other order
+    response = client.put(
+        f"/api/v1/meals/{test_meals[0].id}",
+        json={
+            "name": "New Meal",
+            "ingredients": [test_ingredients[1].id, test_ingredients[0].id],
+        },
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    # the written state is returned without reading it back
+    assert [statement.split()[0] for statement in db_statements] == [
+        "SELECT",
+        "SELECT",
+        "SELECT",
+        "UPDATE",
+        "UPDATE",
+    ]
+
+    # in the order the meal is loaded in afterwards
+    ingredients = response.json()["ingredients"]
+    assert sorted(ingredient["id"] for ingredient in ingredients) == [
+        ingredient.id for ingredient in test_ingredients
+    ]
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    meal = next(m for m in response.json() if m["id"] == test_meals[0].id)
+    assert meal["ingredients"] == ingredients
+
+
 def test_edit_meal_not_found(client, user_token_headers):
     new_meal = {
         "name": "New Meal",
@@ -243,7 +828,7 @@ def test_edit_meal_invalid_ingredient(client, test_meals, user_token_headers):
         headers=user_token_headers,
     )
     assert response.status_code == 400
-    assert response.json() == {"detail": "Ingredient not found"}
+    assert response.json() == {"detail": "Ingredient not found: 1234"}
 
 
 def test_edit_meal_unowned(client, test_meals, user_token_headers):
@@ -264,12 +849,8 @@ def test_edit_meal_unowned(client, test_meals, user_token_headers):
 
 
 def test_delete_meal(client, test_meals, user_token_headers):
-    response = client.delete(
-        f"/api/v1/meals/{test_meals[0].id}",
-        headers=user_token_headers,
-    )
-    assert response.status_code == 200
-    assert response.json() == {
+    # the meal is deleted by the request, so load the expected state first
+    expected = {
         "id": test_meals[0].id,
         "name": test_meals[0].name,
         "user_id": test_meals[0].user_id,
@@ -285,6 +866,12 @@ def test_delete_meal(client, test_meals, user_token_headers):
             },
         ],
     }
+    response = client.delete(
+        f"/api/v1/meals/{test_meals[0].id}",
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == expected
 
 
 def test_delete_meal_not_found(client, test_meals, user_token_headers):
@@ -313,6 +900,14 @@ def test_unauthenticated_routes(client):
     assert response.status_code == 401
     response = client.post("/api/v1/meals")
     assert response.status_code == 401
+    response = client.post("/api/v1/meals/bulk")
+    assert response.status_code == 401
+    response = client.post("/api/v1/meals/suggestions")
+    assert response.status_code == 401
+    response = client.get("/api/v1/meals/plan")
+    assert response.status_code == 401
+    response = client.get("/api/v1/meals/suggestions/key")
+    assert response.status_code == 401
     response = client.put(f"/api/v1/meals/1")
     assert response.status_code == 401
     response = client.delete(f"/api/v1/meals/1")
@@ -0,0 +1,87 @@
+def test_db_pool_metrics(client, superuser_token_headers):
+    response = client.get(
+        "/api/v1/metrics/db_pool", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    metrics = response.json()
+    assert set(metrics) == {
+        "size",
+        "checked_in",
+        "checked_out",
+        "overflow",
+        "checkout_timeouts",
+        "checkout_errors",
+        "wait_time",
+    }
+    assert metrics["wait_time"]["buckets"]["+Inf"] == (
+        metrics["wait_time"]["count"]
+    )
+
+
+def test_unauthenticated_routes(client):
+    response = client.get("/api/v1/metrics/db_pool")
+    assert response.status_code == 401
+
+
+def test_unauthorized_routes(client, user_token_headers):
+    response = client.get(
+        "/api/v1/metrics/db_pool", headers=user_token_headers
+    )
+    assert response.status_code == 403
+
+
+def test_auth_cache_metrics(client, superuser_token_headers):
+    client.get("/api/v1/users/me", headers=superuser_token_headers)
+    client.get("/api/v1/users/me", headers=superuser_token_headers)
+    response = client.get(
+        "/api/v1/metrics/auth_cache", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["size"] == 1
+    assert metrics["misses"] == 1
+    assert metrics["hits"] == 2
+
+
+def test_shared_cache_metrics(
+    client, test_meals, user_token_headers, superuser_token_headers
+):
+    client.get("/api/v1/meals/me", headers=user_token_headers)
+    client.get("/api/v1/meals/me", headers=user_token_headers)
+    response = client.get(
+        "/api/v1/metrics/shared_cache", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    metrics = response.json()
+    # the principals of both tokens, and the first meals page
+    assert metrics["misses"] == 3
+    assert metrics["hits"] == 1
+    assert metrics["hit_ratio"] == 0.25
+    assert metrics["errors"] == 0
+
+
+def test_password_hasher_metrics(client, superuser_token_headers):
+    response = client.get(
+        "/api/v1/metrics/password_hasher", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    metrics = response.json()
+    assert metrics["queued"] == metrics["running"] == 0
+    assert "queue_time" in metrics and "run_time" in metrics
+
+
+def test_email_deliverability_metrics(client, superuser_token_headers):
+    response = client.get(
+        "/api/v1/metrics/email_deliverability",
+        headers=superuser_token_headers,
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "size": 0,
+        "max_size": 10000,
+        "hits": 0,
+        "misses": 0,
+        "hit_ratio": None,
+        "lookups": 0,
+        "failures": 0,
+    }
@@ -1,3 +1,4 @@
+from app.core.cache import principal_cache
 from app.db import models
 
 
@@ -15,6 +16,23 @@ def test_get_users(client, test_superuser, superuser_token_headers):
     ]
 
 
+def test_get_users_paginated(
+    client, test_user, test_superuser, superuser_token_headers
+):
+    response = client.get(
+        "/api/v1/users?limit=1", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert [u["id"] for u in response.json()] == [test_user.id]
+
+    response = client.get(
+        "/api/v1/users?limit=1&cursor=" + response.headers["X-Next-Cursor"],
+        headers=superuser_token_headers,
+    )
+    assert [u["id"] for u in response.json()] == [test_superuser.id]
+    assert "X-Next-Cursor" not in response.headers
+
+
 def test_delete_user(client, test_superuser, test_db, superuser_token_headers):
     response = client.delete(
         f"/api/v1/users/{test_superuser.id}", headers=superuser_token_headers
@@ -131,6 +149,66 @@ def test_authenticated_user_me(client, user_token_headers):
     assert response.status_code == 200
 
 
+def test_user_me_cached(client, test_user, user_token_headers, db_checkouts):
+    client.get("/api/v1/users/me", headers=user_token_headers)
+    db_checkouts["checkout"] = 0
+    response = client.get("/api/v1/users/me", headers=user_token_headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == test_user.email
+    assert db_checkouts["checkout"] == 0
+
+
+def test_user_me_shared_between_workers(
+    client, test_user, user_token_headers, db_checkouts
+):
+    client.get("/api/v1/users/me", headers=user_token_headers)
+    # a worker that hasn't seen the token yet finds the user in Redis
+    principal_cache.clear()
+    db_checkouts["checkout"] = 0
+    response = client.get("/api/v1/users/me", headers=user_token_headers)
+    assert response.status_code == 200
+    assert response.json()["email"] == test_user.email
+    assert db_checkouts["checkout"] == 0
+
+
+def test_edit_user_invalidates_shared_user(
+    client, test_user, user_token_headers
+):
+    client.get("/api/v1/users/me", headers=user_token_headers)
+    client.put(
+        "/api/v1/users/me",
+        json={"name": "Joe Smith"},
+        headers=user_token_headers,
+    )
+    principal_cache.clear()
+    response = client.get("/api/v1/users/me", headers=user_token_headers)
+    assert response.json()["name"] == "Joe Smith"
+
+
+def test_edit_user_invalidates_cached_user(
+    client, test_user, user_token_headers
+):
+    client.get("/api/v1/users/me", headers=user_token_headers)
+    response = client.put(
+        "/api/v1/users/me",
+        json={"name": "Joe Smith"},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    response = client.get("/api/v1/users/me", headers=user_token_headers)
+    assert response.json()["name"] == "Joe Smith"
+
+    # the token's subject no longer exists once the email changes
+    response = client.put(
+        "/api/v1/users/me",
+        json={"email": "newemail@test.com"},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    response = client.get("/api/v1/users/me", headers=user_token_headers)
+    assert response.status_code == 401
+
+
 def test_unauthenticated_routes(client):
     response = client.get("/api/v1/users/me")
     assert response.status_code == 401
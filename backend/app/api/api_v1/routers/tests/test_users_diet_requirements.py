@@ -144,6 +144,21 @@ def test_edit_user_diet_requirements_me(
     assert response.json() == new_diet_requirements
 
 
+def test_get_user_diet_requirements_me_cached(
+    client, test_user, user_token_headers, db_statements
+):
+    url = "/api/v1/users_diet_requirements/me"
+    client.get(url, headers=user_token_headers)
+    db_statements.clear()
+    response = client.get(url, headers=user_token_headers)
+    assert response.json()["is_vegan"] is False
+    assert db_statements == []
+
+    client.put(url, json={"is_vegan": True}, headers=user_token_headers)
+    response = client.get(url, headers=user_token_headers)
+    assert response.json()["is_vegan"] is True
+
+
 def test_unauthenticated_routes(client):
     response = client.get("/api/v1/users_diet_requirements/me")
     assert response.status_code == 401
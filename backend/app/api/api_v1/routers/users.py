@@ -1,11 +1,13 @@
 import typing as t
 
 from app.core.auth import get_current_active_superuser, get_current_active_user
-from app.db.crud import (create_user, delete_user, edit_user, get_all_users,
-                         get_user)
+from app.db.crud import (USER_ROW, create_user, delete_user, edit_user,
+                         get_all_users, get_user)
+from app.db.pagination import NEXT_CURSOR_HEADER
+from app.db.projection import json_response
 from app.db.schemas import User, UserCreate, UserEdit, UserOut
 from app.db.session import get_db
-from fastapi import APIRouter, Depends, Request, Response, encoders
+from fastapi import APIRouter, Depends, Query, Request, encoders
 
 users_router = r = APIRouter()
 
@@ -16,17 +18,21 @@ users_router = r = APIRouter()
     response_model_exclude_none=True,
 )
 async def users_list(
-    response: Response,
     db=Depends(get_db),
     current_user=Depends(get_current_active_superuser),
+    cursor: t.Optional[str] = None,
+    limit: t.Annotated[int, Query(ge=1, le=100)] = 100,
 ):
     """
-    Get all users
+    Get all users, a page at a time
     """
-    users = get_all_users(db)
+    page = await get_all_users(db, cursor, limit, USER_ROW)
+    users = USER_ROW.dicts(page.items)
     # This is necessary for react-admin to work
-    response.headers["Content-Range"] = f"0-9/{len(users)}"
-    return users
+    headers = {"Content-Range": f"0-9/{len(users)}"}
+    if page.next_cursor:
+        headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return json_response(users, headers)
 
 
 @r.get("/users/me", response_model=User, response_model_exclude_none=True)
@@ -51,7 +57,7 @@ async def user_by_id(
     """
     Get any user by id
     """
-    user = get_user(db, user_id)
+    user = await get_user(db, user_id)
     return user
     # return encoders.jsonable_encoder(
     #     user, skip_defaults=True, exclude_none=True,
@@ -68,7 +74,7 @@ async def user_create(
     """
     Create a new user
     """
-    return create_user(db, user)
+    return await create_user(db, user)
 
 
 @r.put("/users/me", response_model=User, response_model_exclude_none=True)
@@ -81,7 +87,7 @@ async def user_edit_me(
     """
     Update current user
     """
-    user = edit_user(db, current_user.id, user_edit)
+    user = await edit_user(db, current_user.id, user_edit)
     return user
 
 
@@ -98,7 +104,7 @@ async def user_edit_by_id(
     """
     Update existing user by id
     """
-    user = edit_user(db, user_id, user_edit)
+    user = await edit_user(db, user_id, user_edit)
     return user
 
 
@@ -114,4 +120,4 @@ async def user_delete(
     """
     Delete existing user
     """
-    return delete_user(db, user_id)
+    return await delete_user(db, user_id)
@@ -1,5 +1,6 @@
-from app.core import security
+from app.core import config, security
 from app.core.auth import get_current_active_superuser, get_current_active_user
+from app.core.shared_cache import shared_cache, user_scope
 from app.db.crud import (edit_user_diet_requirements,
                          get_user_diet_requirements, object_as_dict)
 from app.db.schemas import UserDietRequirements, UserDietRequirementsEdit
@@ -19,11 +20,23 @@ async def user_diet_requirements_me(
     current_user=Depends(get_current_active_user),
 ):
     """
-    Get current user diet requirements
+    Get current user diet requirements, cached for every worker until they
+    change
     """
-    diet_requirements = get_user_diet_requirements(db, current_user.id)
-    diet_requirements = object_as_dict(diet_requirements)
-    return diet_requirements
+
+    async def load():
+        diet_requirements = await get_user_diet_requirements(
+            db, current_user.id
+        )
+        return object_as_dict(diet_requirements)
+
+    return await shared_cache.get_or_load(
+        "diet_requirements_me",
+        "",
+        [user_scope(current_user.id)],
+        config.DIET_REQUIREMENTS_CACHE_TTL,
+        load,
+    )
 
 
 @r.get(
@@ -40,7 +53,7 @@ async def user_diet_requirements_by_id(
     """
     Get any user diet requirements by user id
     """
-    diet_requirements = get_user_diet_requirements(db, user_id)
+    diet_requirements = await get_user_diet_requirements(db, user_id)
     diet_requirements = object_as_dict(diet_requirements)
     return diet_requirements
 
@@ -59,7 +72,7 @@ async def user_diet_requirements_edit_me(
     """
     Update current user diet requirements
     """
-    diet_requirements = edit_user_diet_requirements(
+    diet_requirements = await edit_user_diet_requirements(
         db, current_user.id, diet_requirements_edit
     )
     return diet_requirements
@@ -80,7 +93,7 @@ async def user_diet_requirements_edit_by_id(
     """
     Update any user diet requirements by user id
     """
-    diet_requirements = edit_user_diet_requirements(
+    diet_requirements = await edit_user_diet_requirements(
         db, user_id, diet_requirements_edit
     )
     return diet_requirements
@@ -1,6 +1,10 @@
+import time
+
 import jwt
-from app.core import security
-from app.db import models, schemas, session
+from app.core import config, security
+from app.core.cache import principal_cache
+from app.core.shared_cache import email_scope, shared_cache
+from app.db import schemas, session
 from app.db.crud import create_user, get_user_by_email
 from fastapi import Depends, HTTPException, status
 from jwt import PyJWTError
@@ -8,7 +12,11 @@ from jwt import PyJWTError
 
 async def get_current_user(
     db=Depends(session.get_db), token: str = Depends(security.oauth2_scheme)
-):
+) -> schemas.User:
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -25,14 +33,36 @@ async def get_current_user(
         token_data = schemas.TokenData(email=email, permissions=permissions)
     except PyJWTError:
         raise credentials_exception
-    user = get_user_by_email(db, token_data.email)
-    if user is None:
-        raise credentials_exception
-    return user
+    generation = principal_cache.generation
+
+    async def load():
+        user = await get_user_by_email(db, token_data.email)
+        if user is None:
+            raise credentials_exception
+        return schemas.User.from_orm(user).dict()
+
+    # another worker may have loaded this user already
+    principal = schemas.User(
+        **await shared_cache.get_or_load(
+            "principal",
+            token_data.email,
+            [email_scope(token_data.email)],
+            config.PROFILE_CACHE_TTL,
+            load,
+        )
+    )
+    # never serve the principal past the token's own expiry
+    principal_cache.set(
+        token,
+        principal,
+        ttl=payload["exp"] - time.time() if "exp" in payload else None,
+        generation=generation,
+    )
+    return principal
 
 
 async def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
+    current_user: schemas.User = Depends(get_current_user),
 ):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -40,8 +70,8 @@ async def get_current_active_user(
 
 
 async def get_current_active_superuser(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: schemas.User = Depends(get_current_user),
+) -> schemas.User:
     if not current_user.is_superuser:
         raise HTTPException(
             status_code=403, detail="The user doesn't have enough privileges"
@@ -49,26 +79,32 @@ async def get_current_active_superuser(
     return current_user
 
 
-def authenticate_user(db, email: str, password: str):
-    user = get_user_by_email(db, email)
+async def authenticate_user(db, email: str, password: str):
+    user = await get_user_by_email(db, email)
     if not user:
         return False
-    if not security.verify_password(password, user.hashed_password):
+    if not await security.check_password(password, user.hashed_password):
         return False
+    if security.password_needs_rehash(user.hashed_password):
+        # the work factor changed, upgrade the hash while we know the password
+        user.hashed_password = await security.hash_password(password)
+        await db.commit()
     return user
 
 
-def sign_up_new_user(db, email: str, password: str):
-    user = get_user_by_email(db, email)
-    if user:
-        return False  # User already exists
-    new_user = create_user(
-        db,
-        schemas.UserCreate(
-            email=email,
-            password=password,
-            is_active=True,
-            is_superuser=False,
-        ),
-    )
+async def sign_up_new_user(db, email: str, password: str):
+    try:
+        new_user = await create_user(
+            db,
+            schemas.UserCreate(
+                email=email,
+                password=password,
+                is_active=True,
+                is_superuser=False,
+            ),
+        )
+    except HTTPException as e:
+        if e.status_code == status.HTTP_409_CONFLICT:
+            return False  # User already exists
+        raise
     return new_user
@@ -0,0 +1,146 @@
+import threading
+import time
+import typing as t
+from collections import OrderedDict, defaultdict
+
+from app.core import config
+
+
+class TTLCache:
+    """
+    In-process least-recently-used cache whose entries also expire after a
+    time to live. Keeps hit/miss counters so its effectiveness can be
+    reported.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        timer: t.Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[t.Hashable, t.Tuple[float, t.Any]]" = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._timer():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return default
+
+    def set(
+        self, key: t.Hashable, value: t.Any, ttl: t.Optional[float] = None
+    ) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._timer() + ttl, value)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def pop(self, key: t.Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+    def _remove(self, key: t.Hashable) -> t.Any:
+        return self._entries.pop(key)[1]
+
+
+class PrincipalCache(TTLCache):
+    """
+    Maps access tokens to the user they authenticate, so protected
+    requests don't need a database round trip. Entries are indexed by user
+    id so every token of a user can be dropped when that user changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tokens_by_user: t.DefaultDict[int, t.Set[str]] = defaultdict(
+            set
+        )
+        # bumped by every invalidation, see `generation`
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """
+        Read this before loading a user and pass it back to `set`: if the
+        user was invalidated in the meantime the possibly stale principal
+        won't be cached.
+        """
+        return self._generation
+
+    def set(
+        self,
+        key: str,
+        value: t.Any,
+        ttl: t.Optional[float] = None,
+        generation: t.Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            super().set(key, value, ttl)
+            if key in self._entries:
+                self._tokens_by_user[value.id].add(key)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._generation += 1
+            for token in self._tokens_by_user.pop(user_id, ()):
+                self._entries.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            super().clear()
+            self._tokens_by_user.clear()
+            self._generation += 1
+
+    def _remove(self, key: str) -> t.Any:
+        value = super()._remove(key)
+        tokens = self._tokens_by_user.get(value.id)
+        if tokens is not None:
+            tokens.discard(key)
+            if not tokens:
+                del self._tokens_by_user[value.id]
+        return value
+
+
+principal_cache = PrincipalCache(
+    max_size=config.AUTH_CACHE_MAX_SIZE, ttl=config.AUTH_CACHE_TTL
+)
@@ -1,5 +1,44 @@
+from app.core import config
 from celery import Celery
+from celery.schedules import crontab
+from kombu import Queue
 
-celery_app = Celery("worker", broker="redis://redis:6379/0")
+# Tasks a user waits for, and batch work over all users. Each queue has its
+# own workers, so a nightly batch never holds up interactive tasks.
+INTERACTIVE_QUEUE = "main-queue"
+BATCH_QUEUE = "batch-queue"
+# On Redis 0 is the highest priority, and the default
+BATCH_PRIORITY = 9
 
-celery_app.conf.task_routes = {"app.tasks.*": "main-queue"}
+celery_app = Celery(
+    "worker",
+    broker="redis://redis:6379/0",
+    # keeps task results, such as generated meal plans, for their callers
+    backend="redis://redis:6379/0",
+)
+
+celery_app.conf.task_queues = (Queue(INTERACTIVE_QUEUE), Queue(BATCH_QUEUE))
+celery_app.conf.task_default_queue = INTERACTIVE_QUEUE
+celery_app.conf.task_routes = {
+    "app.tasks.plan_all_users": BATCH_QUEUE,
+    "app.tasks.plan_users": BATCH_QUEUE,
+    "app.tasks.finish_plans": BATCH_QUEUE,
+    "app.tasks.*": INTERACTIVE_QUEUE,
+}
+celery_app.conf.broker_transport_options = {
+    # a worker consuming several queues, as `-Q main-queue,batch-queue`,
+    # empties them in that order, and each by task priority
+    "queue_order_strategy": "priority",
+    "priority_steps": list(range(10)),
+    "sep": ":",
+}
+# a worker reserves one task per process at a time, so long batch tasks
+# don't sit on work other workers could have started
+celery_app.conf.worker_prefetch_multiplier = 1
+
+celery_app.conf.beat_schedule = {
+    "plan-all-users": {
+        "task": "app.tasks.plan_all_users",
+        "schedule": crontab(hour=config.PLAN_BATCH_HOUR, minute=0),
+    },
+}
@@ -4,4 +4,91 @@ PROJECT_NAME = "meal-plan"
 
 SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL")
 
+# The API runs on an asyncio engine, so it needs the asyncpg driver rather
+# than psycopg2. Derive it from DATABASE_URL unless explicitly overridden.
+SQLALCHEMY_ASYNC_DATABASE_URI = os.getenv(
+    "ASYNC_DATABASE_URL",
+    SQLALCHEMY_DATABASE_URI
+    and SQLALCHEMY_DATABASE_URI.replace(
+        "postgresql://", "postgresql+asyncpg://", 1
+    ),
+)
+
+# Connection pool, per engine and per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# seconds to wait for a free connection before giving up
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+# seconds after which a connection is replaced, -1 to never recycle
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+
+# Authenticated principals are cached per process, keyed on access token.
+# The TTL bounds how long another worker may serve a stale user.
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_MAX_SIZE = int(os.getenv("AUTH_CACHE_MAX_SIZE", 10000))
+
+# bcrypt work factor, existing hashes are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# password hashes computed at once per worker process
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", 2))
+
+# Shared read cache for per-user endpoints. A different Redis database
+# than the Celery broker, so it can be flushed on its own.
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://redis:6379/1")
+# seconds to connect to, or wait for an answer from, the cache's Redis
+# before treating it as unavailable. Every authenticated request can wait
+# on it, so keep it short.
+CACHE_REDIS_TIMEOUT = float(os.getenv("CACHE_REDIS_TIMEOUT", 0.3))
+# seconds entries are kept, invalidation by writes doesn't wait for these
+MEALS_CACHE_TTL = float(os.getenv("MEALS_CACHE_TTL", 300))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 300))
+DIET_REQUIREMENTS_CACHE_TTL = float(
+    os.getenv("DIET_REQUIREMENTS_CACHE_TTL", 300)
+)
+
+# Email deliverability is checked with async DNS lookups, cached per domain.
+# The policy decides whether an address whose domain can't be looked up in
+# time is accepted ("open") or rejected ("closed").
+EMAIL_DNS_TIMEOUT = float(os.getenv("EMAIL_DNS_TIMEOUT", 2))
+EMAIL_DNS_FAILURE_POLICY = os.getenv("EMAIL_DNS_FAILURE_POLICY", "open")
+# comma-separated nameserver addresses, the system's resolvers when empty
+EMAIL_DNS_NAMESERVERS = [
+    nameserver.strip()
+    for nameserver in os.getenv("EMAIL_DNS_NAMESERVERS", "").split(",")
+    if nameserver.strip()
+]
+EMAIL_DNS_PORT = int(os.getenv("EMAIL_DNS_PORT", 53))
+EMAIL_DELIVERABILITY_CACHE_TTL = float(
+    os.getenv("EMAIL_DELIVERABILITY_CACHE_TTL", 3600)
+)
+EMAIL_DELIVERABILITY_CACHE_MAX_SIZE = int(
+    os.getenv("EMAIL_DELIVERABILITY_CACHE_MAX_SIZE", 10000)
+)
+
+# Meal suggestions, from an OpenAI-compatible chat completions API. Point
+# LLM_API_URL at `python -m app.mock_llm` to run the pipeline offline.
+LLM_API_URL = os.getenv("LLM_API_URL", "https://api.openai.com/v1")
+LLM_API_KEY = os.getenv("LLM_API_KEY")
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-3.5-turbo")
+# seconds to wait for a completion
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 60))
+# prompts sent in one completion request, and seconds a queued prompt waits
+# for others to share its request
+LLM_BATCH_SIZE = int(os.getenv("LLM_BATCH_SIZE", 8))
+LLM_BATCH_WINDOW = float(os.getenv("LLM_BATCH_WINDOW", 2))
+# completion requests per worker, in Celery's rate limit format
+LLM_RATE_LIMIT = os.getenv("LLM_RATE_LIMIT", "20/m")
+SUGGESTIONS_PER_PROMPT = int(os.getenv("SUGGESTIONS_PER_PROMPT", 5))
+# seconds a prompt stays in flight, and identical requests wait for it,
+# before it can be queued again
+SUGGESTIONS_PENDING_TTL = int(os.getenv("SUGGESTIONS_PENDING_TTL", 600))
+# seconds stored suggestions are served before they are generated again
+SUGGESTIONS_MAX_AGE = int(os.getenv("SUGGESTIONS_MAX_AGE", 30 * 24 * 3600))
+
+# Meal plans of every active user, regenerated nightly at PLAN_BATCH_HOUR
+# (UTC) by the batch workers, PLAN_SHARD_SIZE users per task
+PLAN_BATCH_HOUR = int(os.getenv("PLAN_BATCH_HOUR", 3))
+PLAN_SHARD_SIZE = int(os.getenv("PLAN_SHARD_SIZE", 200))
+
 API_V1_STR = "/api/v1"
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import typing as t
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+from app.core import config
+from app.core.cache import TTLCache
+from email_validator import EmailUndeliverableError
+
+logger = logging.getLogger(__name__)
+
+# what to do with an address whose domain can't be looked up: accept it,
+# or reject it so the user tries again later
+FAILURE_POLICIES = ("open", "closed")
+
+_MISSING = object()
+
+
+class DeliverabilityChecker:
+    """
+    Checks that the domain of an email address accepts email, with DNS
+    lookups that don't block the event loop: its MX records or, when it has
+    none, an A or AAAA record (RFC 5321 section 5).
+
+    Results are cached per domain. Lookups that fail or take longer than
+    `timeout` seconds in total aren't cached, and let the address through
+    or reject it according to `failure_policy`.
+    """
+
+    def __init__(
+        self,
+        make_resolver: t.Callable[[], dns.asyncresolver.Resolver],
+        cache: TTLCache,
+        timeout: float,
+        failure_policy: str = "open",
+    ):
+        if failure_policy not in FAILURE_POLICIES:
+            raise ValueError(f"Unknown failure policy: {failure_policy}")
+        self._make_resolver = make_resolver
+        self._resolver = None
+        self.cache = cache
+        self.timeout = timeout
+        self.failure_policy = failure_policy
+        self.lookups = 0
+        self.failures = 0
+
+    @property
+    def resolver(self) -> dns.asyncresolver.Resolver:
+        # reads the system's resolver configuration, not on import
+        if self._resolver is None:
+            self._resolver = self._make_resolver()
+        return self._resolver
+
+    async def check(self, domain: str) -> None:
+        """Raise EmailUndeliverableError unless `domain` accepts email"""
+        reason = self.cache.get(domain, _MISSING)
+        if reason is _MISSING:
+            self.lookups += 1
+            try:
+                reason = await asyncio.wait_for(
+                    self._lookup(domain), self.timeout
+                )
+            except (asyncio.TimeoutError, dns.exception.DNSException) as e:
+                self.failures += 1
+                logger.warning(
+                    "Could not check deliverability of %s: %r", domain, e
+                )
+                if self.failure_policy == "closed":
+                    raise EmailUndeliverableError(
+                        f"The domain name {domain} could not be checked, "
+                        "please try again later."
+                    )
+                return
+            self.cache.set(domain, reason)
+
+        if reason is not None:
+            raise EmailUndeliverableError(reason)
+
+    async def _lookup(self, domain: str) -> t.Optional[str]:
+        """None when the domain accepts email, otherwise why it doesn't"""
+        try:
+            try:
+                mx = await self.resolver.resolve(domain, "MX")
+            except dns.resolver.NoAnswer:
+                return await self._lookup_address(domain)
+        except dns.resolver.NXDOMAIN:
+            return f"The domain name {domain} does not exist."
+
+        # a null MX record (RFC 7505) says the domain takes no email
+        if not any(str(record.exchange).rstrip(".") for record in mx):
+            return f"The domain name {domain} does not accept email."
+        return None
+
+    async def _lookup_address(self, domain: str) -> t.Optional[str]:
+        for rdtype in ("A", "AAAA"):
+            try:
+                await self.resolver.resolve(domain, rdtype)
+                break
+            except dns.resolver.NoAnswer:
+                continue
+        else:
+            return f"The domain name {domain} does not accept email."
+
+        # without an MX record, an SPF policy rejecting all mail is a sign
+        # the domain isn't used for email
+        try:
+            txt = await self.resolver.resolve(domain, "TXT")
+        except dns.resolver.NoAnswer:
+            return None
+        if any(b"".join(record.strings) == b"v=spf1 -all" for record in txt):
+            return f"The domain name {domain} does not send email."
+        return None
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        return {
+            **self.cache.stats(),
+            "lookups": self.lookups,
+            "failures": self.failures,
+        }
+
+    def clear(self) -> None:
+        self.cache.clear()
+        self.lookups = self.failures = 0
+
+
+def make_resolver() -> dns.asyncresolver.Resolver:
+    if config.EMAIL_DNS_NAMESERVERS:
+        resolver = dns.asyncresolver.Resolver(configure=False)
+        resolver.nameservers = config.EMAIL_DNS_NAMESERVERS
+        resolver.port = config.EMAIL_DNS_PORT
+    else:
+        resolver = dns.asyncresolver.Resolver()
+    resolver.lifetime = config.EMAIL_DNS_TIMEOUT
+    return resolver
+
+
+deliverability_checker = DeliverabilityChecker(
+    make_resolver,
+    TTLCache(
+        max_size=config.EMAIL_DELIVERABILITY_CACHE_MAX_SIZE,
+        ttl=config.EMAIL_DELIVERABILITY_CACHE_TTL,
+    ),
+    timeout=config.EMAIL_DNS_TIMEOUT,
+    failure_policy=config.EMAIL_DNS_FAILURE_POLICY,
+)
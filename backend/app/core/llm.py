@@ -0,0 +1,53 @@
+import typing as t
+
+import requests
+
+
+class Completion(t.NamedTuple):
+    content: str
+    prompt_tokens: int
+    completion_tokens: int
+
+
+class LLMClient:
+    """
+    Client of an OpenAI-compatible chat completions API, asking for JSON
+    answers. Keeps its connections open between requests.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        api_key: t.Optional[str] = None,
+        timeout: float = 60,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.session = requests.Session()
+        if api_key:
+            self.session.headers["Authorization"] = f"Bearer {api_key}"
+
+    def complete(self, messages: t.List[t.Dict[str, str]]) -> Completion:
+        """
+        The completion of a conversation. Raises requests' exceptions for
+        connection errors, timeouts and error responses.
+        """
+        response = self.session.post(
+            f"{self.base_url}/chat/completions",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "response_format": {"type": "json_object"},
+            },
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        body = response.json()
+        usage = body.get("usage") or {}
+        return Completion(
+            content=body["choices"][0]["message"]["content"],
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+        )
@@ -0,0 +1,54 @@
+import bisect
+import threading
+import typing as t
+
+# Upper bounds in seconds, suitable for anything from a cache lookup to a
+# connection that had to wait for the pool.
+DEFAULT_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed durations with fixed bucket bounds.
+    """
+
+    def __init__(self, buckets: t.Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            # one extra slot for observations above the largest bound
+            self._counts = [0] * (len(self.buckets) + 1)
+            self.count = 0
+            self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> t.Dict[str, t.Any]:
+        with self._lock:
+            buckets = {}
+            cumulative = 0
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self.count
+            return {"buckets": buckets, "count": self.count, "sum": self.sum}
@@ -0,0 +1,198 @@
+import typing as t
+from datetime import datetime
+
+import numpy as np
+from app.db import models
+from app.db.crud import diet_filter, visible_meals
+from app.db.diet import requirements_mask
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+DAYS = 7
+MEALS_PER_DAY = 3
+
+
+class Incidence(t.NamedTuple):
+    """
+    Sparse meal × ingredient incidence matrix in coordinate form, with rows
+    sorted so each meal's entries are contiguous.
+    """
+
+    meal_ids: np.ndarray
+    ingredient_ids: np.ndarray
+    rows: np.ndarray
+    columns: np.ndarray
+
+    @classmethod
+    def from_pairs(
+        cls, meal_ids: t.Iterable[int], pairs: np.ndarray
+    ) -> "Incidence":
+        """
+        Build the matrix of the candidate `meal_ids` from (meal_id,
+        ingredient_id) pairs. Pairs of other meals are ignored and an
+        ingredient listed twice in a meal counts once.
+        """
+        meal_ids = np.unique(np.fromiter(meal_ids, dtype=np.int64))
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        pairs = pairs[np.isin(pairs[:, 0], meal_ids)]
+        rows = np.searchsorted(meal_ids, pairs[:, 0])
+        ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+        entries = np.unique(rows * len(ingredient_ids) + columns)
+        return cls(
+            meal_ids=meal_ids,
+            ingredient_ids=ingredient_ids,
+            rows=entries // max(len(ingredient_ids), 1),
+            columns=entries % max(len(ingredient_ids), 1),
+        )
+
+    @property
+    def shape(self) -> t.Tuple[int, int]:
+        return len(self.meal_ids), len(self.ingredient_ids)
+
+
+def pick_meals(incidence: Incidence, count: int) -> np.ndarray:
+    """
+    Greedily pick up to `count` distinct meals, as row indices, so the plan
+    reuses as many ingredients as it can.
+
+    An ingredient already in the plan weighs 1. A new one weighs its
+    popularity, the share of candidates using it, less 1: common
+    ingredients are likely to be reused by later picks. A meal scores the
+    mean weight of its ingredients. Every pick scores all candidates at
+    once with a weighted bincount over the matrix entries, which is the
+    incidence matrix times the weight vector. Ties go to the lowest meal id.
+    """
+    n_meals, n_ingredients = incidence.shape
+    rows, columns = incidence.rows, incidence.columns
+    count = min(count, n_meals)
+
+    popularity = np.bincount(columns, minlength=n_ingredients) / max(
+        n_meals, 1
+    )
+    # each meal's entries are rows[starts[i]:starts[i + 1]]
+    starts = np.searchsorted(rows, np.arange(n_meals + 1))
+    sizes = np.maximum(np.diff(starts), 1)
+    used = np.zeros(n_ingredients, dtype=bool)
+    available = np.ones(n_meals, dtype=bool)
+    picks = np.empty(count, dtype=np.int64)
+
+    for slot in range(count):
+        weights = np.where(used, 1.0, popularity - 1.0)
+        scores = (
+            np.bincount(rows, weights=weights[columns], minlength=n_meals)
+            / sizes
+        )
+        scores[~available] = -np.inf
+        pick = int(np.argmax(scores))
+        picks[slot] = pick
+        available[pick] = False
+        used[columns[starts[pick] : starts[pick + 1]]] = True
+    return picks
+
+
+def load_candidates(db: Session, user_id: int) -> Incidence:
+    """
+    The incidence matrix of the meals a user can plan with that suit their
+    diet requirements. Meals without ingredients are left out: they would
+    score best and, matching every diet, fill the plans first.
+    """
+    diet_requirements = db.scalars(
+        select(models.UserDietRequirements).filter(
+            models.UserDietRequirements.user_id == user_id
+        )
+    ).first()
+    candidates = diet_filter(
+        visible_meals(select(models.Meal.id), user_id),
+        requirements_mask(diet_requirements),
+    ).filter(
+        exists().where(models.MealIngredient.c.meal_id == models.Meal.id)
+    )
+
+    meal_ids = db.scalars(candidates).all()
+    pairs = db.execute(
+        select(
+            models.MealIngredient.c.meal_id,
+            models.MealIngredient.c.ingredient_id,
+        ).filter(models.MealIngredient.c.meal_id.in_(candidates))
+    ).all()
+    return Incidence.from_pairs(meal_ids, pairs)
+
+
+def generate_plan(
+    db: Session,
+    user_id: int,
+    meals_per_day: int = MEALS_PER_DAY,
+    days: int = DAYS,
+) -> t.Dict[str, t.Any]:
+    """
+    A week of meals for a user, `meals_per_day` a day, without repeats.
+    When there are too few candidates the last days come up short.
+    """
+    incidence = load_candidates(db, user_id)
+    picks = pick_meals(incidence, meals_per_day * days)
+    meal_ids = incidence.meal_ids[picks].tolist()
+    ingredients = np.unique(
+        incidence.columns[np.isin(incidence.rows, picks)]
+    )
+    return {
+        "user_id": user_id,
+        "days": [
+            meal_ids[day * meals_per_day : (day + 1) * meals_per_day]
+            for day in range(days)
+        ],
+        "ingredients": len(ingredients),
+    }
+
+
+def active_user_ids(db: Session) -> t.Tuple[datetime, t.List[int]]:
+    """
+    The ids of the users to plan for, and the database's time when they
+    were read, which the plans generated for them come after
+    """
+    started_at = db.scalar(select(func.now()))
+    user_ids = db.scalars(
+        select(models.User.id)
+        .filter(models.User.is_active)
+        .order_by(models.User.id)
+    ).all()
+    return started_at, list(user_ids)
+
+
+def store_plans(db: Session, plans: t.Sequence[t.Dict[str, t.Any]]) -> None:
+    """Replace the stored plans of some users with new ones of generate_plan"""
+    if not plans:
+        return
+    statement = insert(models.MealPlan).values(
+        [
+            {
+                "user_id": plan["user_id"],
+                "days": plan["days"],
+                "ingredients": plan["ingredients"],
+            }
+            for plan in plans
+        ]
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[models.MealPlan.user_id],
+            set_={
+                "days": statement.excluded.days,
+                "ingredients": statement.excluded.ingredients,
+                "generated_at": func.now(),
+            },
+        )
+    )
+    db.commit()
+
+
+def remove_stale_plans(db: Session, before: datetime) -> int:
+    """
+    Remove the plans not regenerated since `before`, those of users who are
+    no longer active. Returns how many were removed.
+    """
+    result = db.execute(
+        delete(models.MealPlan).filter(models.MealPlan.generated_at < before)
+    )
+    db.commit()
+    return result.rowcount
@@ -1,18 +1,85 @@
+import asyncio
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 import jwt
+from app.core import config
+from app.core.metrics import Histogram
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min and max rounds to the configured work factor makes any hash
+# made with a different factor "need update", so it is rehashed on login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=config.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=config.BCRYPT_ROUNDS,
+)
 
 SECRET_KEY = "super_secret"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 
+class PasswordHasher:
+    """
+    Runs password hashing on a dedicated thread pool so it doesn't block
+    the event loop. bcrypt releases the GIL, so the pool size caps how many
+    hashes run at once; further calls queue and their wait is recorded.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hasher"
+        )
+        self._lock = threading.Lock()
+        self.queue_time = Histogram()
+        self.run_time = Histogram()
+        self.queued = 0
+        self.running = 0
+
+    async def run(self, func: t.Callable[..., t.Any], *args) -> t.Any:
+        submitted = time.perf_counter()
+        with self._lock:
+            self.queued += 1
+
+        def call():
+            started = time.perf_counter()
+            self.queue_time.observe(started - submitted)
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                self.run_time.observe(time.perf_counter() - started)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, call)
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        return {
+            "max_workers": self.max_workers,
+            "queued": self.queued,
+            "running": self.running,
+            "queue_time": self.queue_time.snapshot(),
+            "run_time": self.run_time.snapshot(),
+        }
+
+
+password_hasher = PasswordHasher(config.PASSWORD_HASH_CONCURRENCY)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
@@ -21,6 +88,25 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Whether a hash was made with a different work factor than configured.
+    """
+    if not pwd_context.identify(hashed_password):
+        return False
+    return pwd_context.needs_update(hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(pwd_context.hash, password)
+
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    return await password_hasher.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(*, data: dict, expires_delta: timedelta = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import math
+import secrets
+import typing as t
+import weakref
+
+import orjson
+from app.core import config
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """
+    Read cache in Redis, shared by every worker process and node.
+
+    Entries belong to one or more scopes, such as a user. Each scope has a
+    generation counter in Redis and an entry's key includes the
+    generations of its scopes, so invalidating a scope is a single INCR.
+    Entries under the old generation are never read again and expire on
+    their own. A reader that loaded from the database before an
+    invalidation stores under the old generation too, so it can't put
+    stale data back.
+
+    Redis being unavailable degrades to cache misses, never to errors.
+    """
+
+    def __init__(
+        self,
+        connect: t.Callable[[], Redis],
+        prefix: str = "cache",
+    ):
+        self._connect = connect
+        # redis.asyncio connections belong to the event loop that opened
+        # them, keep one client per running loop
+        self._clients: t.MutableMapping[
+            asyncio.AbstractEventLoop, Redis
+        ] = weakref.WeakKeyDictionary()
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @property
+    def redis(self) -> Redis:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = self._connect()
+        return client
+
+    def _generation_key(self, scope: str) -> str:
+        return f"{self.prefix}:generation:{scope}"
+
+    async def get_or_load(
+        self,
+        resource: str,
+        field: str,
+        scopes: t.Sequence[str],
+        ttl: float,
+        load: t.Callable[[], t.Awaitable[t.Any]],
+    ) -> t.Any:
+        """
+        Return the cached value of `resource` for `field` within `scopes`,
+        or await `load()` and cache its JSON-serializable result for `ttl`
+        seconds.
+        """
+        try:
+            generations = await self.redis.mget(
+                [self._generation_key(scope) for scope in scopes]
+            )
+            key = ":".join(
+                [self.prefix, resource]
+                + [
+                    f"{scope}@{int(generation or 0)}"
+                    for scope, generation in zip(scopes, generations)
+                ]
+                + [field]
+            )
+            cached = await self.redis.get(key)
+        except RedisError:
+            logger.warning("Shared cache unavailable", exc_info=True)
+            self.errors += 1
+            return await load()
+
+        if cached is not None:
+            self.hits += 1
+            return orjson.loads(cached)
+
+        self.misses += 1
+        value = await load()
+        try:
+            await self.redis.set(key, orjson.dumps(value), ex=math.ceil(ttl))
+        except RedisError:
+            logger.warning("Shared cache unavailable", exc_info=True)
+            self.errors += 1
+        return value
+
+    async def generation(self, scope: str) -> t.Optional[int]:
+        """
+        The current generation of a scope, which every invalidation in any
+        process moves on, for validators such as ETags. The first read
+        starts a scope at a random generation, so validators from before
+        Redis lost its data aren't reissued. None when Redis is
+        unavailable.
+        """
+        key = self._generation_key(scope)
+        try:
+            generation = await self.redis.get(key)
+            if generation is None:
+                await self.redis.set(key, secrets.randbits(48), nx=True)
+                generation = await self.redis.get(key)
+        except RedisError:
+            logger.warning("Shared cache unavailable", exc_info=True)
+            self.errors += 1
+            return None
+        return int(generation)
+
+    async def invalidate(self, *scopes: str) -> t.Optional[t.List[int]]:
+        """
+        Move scopes to their next generation. Returns the new generations,
+        or None when Redis is unavailable.
+        """
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for scope in scopes:
+                    pipe.incr(self._generation_key(scope))
+                return await pipe.execute()
+        except RedisError:
+            # entries of these scopes may be served until their TTL
+            logger.error(
+                "Could not invalidate shared cache scopes %s",
+                scopes,
+                exc_info=True,
+            )
+            self.errors += 1
+            return None
+
+    def stats(self) -> t.Dict[str, t.Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_ratio": self.hits / lookups if lookups else None,
+        }
+
+    def reset_stats(self) -> None:
+        self.hits = self.misses = self.errors = 0
+
+
+def user_scope(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def email_scope(email: str) -> str:
+    return f"email:{email}"
+
+
+# every meal response embeds ingredient names, any ingredient write
+# invalidates them
+INGREDIENTS_SCOPE = "ingredients"
+
+
+def connect() -> Redis:
+    # a Redis that hangs must fail as fast as one that refuses connections
+    return Redis.from_url(
+        config.CACHE_REDIS_URL,
+        socket_connect_timeout=config.CACHE_REDIS_TIMEOUT,
+        socket_timeout=config.CACHE_REDIS_TIMEOUT,
+    )
+
+
+shared_cache = SharedCache(connect, prefix=config.PROJECT_NAME)
@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import typing as t
+
+import orjson
+from app.core import config
+from app.core.llm import LLMClient
+from app.db import models, schemas
+from app.db.diet import diet_names
+from pydantic import ValidationError
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Prompts waiting for a completion, as JSON SuggestionJobs. The API pushes
+# them and the suggest_meals task takes them a batch at a time.
+QUEUE_KEY = f"{config.PROJECT_NAME}:suggestions:queue"
+
+SYSTEM_PROMPT = (
+    "You suggest home-cooked meals. The user sends a JSON object with a "
+    "count and a list of requests, each with an id, the diets the meals "
+    "must suit and the ingredients to cook with. Answer with a JSON object "
+    'whose "results" list has, for every request, its "id" and "meals": '
+    'count meals, each with a "name" and a one sentence "description". '
+    "Use the given ingredients and suit every listed diet."
+)
+
+
+class SuggestionJob(t.NamedTuple):
+    key: str
+    diet_mask: int
+    ingredient_ids: t.List[int]
+    # names for the prompt, in ingredient id order
+    ingredients: t.List[str]
+
+
+class BatchReport(t.NamedTuple):
+    prompts: int
+    stored: int
+    prompt_tokens: int
+    completion_tokens: int
+
+
+def suggestion_key(diet_mask: int, ingredient_ids: t.Iterable[int]) -> str:
+    """
+    Identifies a suggestion request by everything its completion depends
+    on: the diets, the set of ingredients, the model and the number of
+    suggestions. Requests listing the same ingredients in another order or
+    more than once share a key, whoever makes them.
+    """
+    canonical = orjson.dumps(
+        {
+            "diets": diet_mask,
+            "ingredients": sorted(set(ingredient_ids)),
+            "model": config.LLM_MODEL,
+            "count": config.SUGGESTIONS_PER_PROMPT,
+        }
+    )
+    return hashlib.sha256(canonical).hexdigest()
+
+
+def pending_key(key: str) -> str:
+    return f"{config.PROJECT_NAME}:suggestions:pending:{key}"
+
+
+async def enqueue(redis, job: SuggestionJob) -> bool:
+    """
+    Queue a prompt unless the same one is already in flight, in which case
+    its requester waits for the completion already on the way. Returns
+    whether it was queued.
+    """
+    if not await redis.set(
+        pending_key(job.key), 1, nx=True, ex=config.SUGGESTIONS_PENDING_TTL
+    ):
+        return False
+    await redis.rpush(QUEUE_KEY, orjson.dumps(job._asdict()))
+    return True
+
+
+async def is_pending(redis, key: str) -> bool:
+    return bool(await redis.exists(pending_key(key)))
+
+
+def build_messages(
+    jobs: t.Sequence[SuggestionJob],
+) -> t.List[t.Dict[str, str]]:
+    """One conversation for a batch of prompts, told apart by position"""
+    request = {
+        "count": config.SUGGESTIONS_PER_PROMPT,
+        "requests": [
+            {
+                "id": i,
+                "diets": diet_names(job.diet_mask) or [],
+                "ingredients": job.ingredients,
+            }
+            for i, job in enumerate(jobs)
+        ],
+    }
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": orjson.dumps(request).decode()},
+    ]
+
+
+def parse_results(
+    content: str, jobs: t.Sequence[SuggestionJob]
+) -> t.Dict[str, t.List[t.Dict[str, t.Any]]]:
+    """
+    The suggestions of each prompt of a batch, by key. Prompts the answer
+    has no valid suggestions for are left out.
+    """
+    try:
+        results = orjson.loads(content)["results"]
+    except (orjson.JSONDecodeError, KeyError, TypeError):
+        logger.warning("Unreadable completion: %.200s", content)
+        return {}
+
+    suggestions = {}
+    for result in results:
+        try:
+            job = jobs[result["id"]]
+            meals = [
+                schemas.MealSuggestion(**meal).dict()
+                for meal in result["meals"]
+            ]
+        except (KeyError, IndexError, TypeError, ValidationError):
+            logger.warning("Invalid suggestion result: %.200r", result)
+            continue
+        if meals:
+            suggestions[job.key] = meals
+    return suggestions
+
+
+def take_batch(redis, size: int) -> t.List[SuggestionJob]:
+    items = redis.lpop(QUEUE_KEY, size) or []
+    return [SuggestionJob(**orjson.loads(item)) for item in items]
+
+
+def store_suggestions(
+    db: Session,
+    jobs: t.Sequence[SuggestionJob],
+    suggestions: t.Dict[str, t.List[t.Dict[str, t.Any]]],
+) -> None:
+    rows = [
+        {
+            "key": job.key,
+            "diet_mask": job.diet_mask,
+            "ingredient_ids": job.ingredient_ids,
+            "suggestions": suggestions[job.key],
+        }
+        for job in jobs
+        if job.key in suggestions
+    ]
+    if not rows:
+        return
+    statement = insert(models.MealSuggestion).values(rows)
+    # replaces suggestions that were too old to be served
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[models.MealSuggestion.key],
+            set_={
+                "suggestions": statement.excluded.suggestions,
+                "created_at": func.now(),
+            },
+        )
+    )
+    db.commit()
+
+
+def process_batch(
+    db: Session, redis, client: LLMClient, size: int = config.LLM_BATCH_SIZE
+) -> t.Optional[BatchReport]:
+    """
+    Take up to `size` queued prompts and complete them with a single
+    request, storing the suggestions for every user who asks again. The
+    prompts are no longer in flight afterwards, whether that succeeded or
+    not, so failed ones can be asked for again. Returns None when the
+    queue was empty.
+    """
+    jobs = take_batch(redis, size)
+    if not jobs:
+        return None
+    try:
+        completion = client.complete(build_messages(jobs))
+        suggestions = parse_results(completion.content, jobs)
+        store_suggestions(db, jobs, suggestions)
+    finally:
+        redis.delete(*(pending_key(job.key) for job in jobs))
+
+    report = BatchReport(
+        prompts=len(jobs),
+        stored=len(suggestions),
+        prompt_tokens=completion.prompt_tokens,
+        completion_tokens=completion.completion_tokens,
+    )
+    logger.info("Completed suggestion batch: %s", report)
+    return report
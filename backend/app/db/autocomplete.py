@@ -0,0 +1,146 @@
+import asyncio
+import bisect
+import re
+import typing as t
+
+WORD_START = re.compile(r"(?<!\w)\w")
+
+
+class PrefixIndex:
+    """
+    Process-local autocomplete index over ingredient names and aliases.
+
+    Every name and alias is stored lowercased in a sorted array, once from
+    the start of each word, so "tom" finds both "Tomato" and "Cherry
+    tomatoes". A lookup is a binary search followed by a scan of the
+    matching run, no database round trip involved.
+
+    The index remembers the catalog generation it was built at (see
+    SharedCache.generation), so a process can tell when a write made
+    elsewhere has made it stale.
+    """
+
+    def __init__(self):
+        # sorted (key, ingredient id) pairs
+        self._keys: t.List[t.Tuple[str, int]] = []
+        self._ingredients: t.Dict[int, t.Dict[str, t.Any]] = {}
+        self.generation: t.Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._ingredients)
+
+    @staticmethod
+    def _index_keys(name: str, alias: t.Optional[str]) -> t.Set[str]:
+        keys = set()
+        for text in (name, alias):
+            if text:
+                text = text.lower()
+                keys.update(
+                    text[match.start() :]
+                    for match in WORD_START.finditer(text)
+                )
+        return keys
+
+    @classmethod
+    def _build(
+        cls, ingredients: t.Iterable[t.Tuple[int, str, t.Optional[str]]]
+    ) -> t.Tuple[t.List[t.Tuple[str, int]], t.Dict[int, t.Dict[str, t.Any]]]:
+        keys = []
+        entries = {}
+        for ingredient_id, name, alias in ingredients:
+            entries[ingredient_id] = {
+                "id": ingredient_id,
+                "name": name,
+                "alias": alias,
+            }
+            keys.extend(
+                (key, ingredient_id) for key in cls._index_keys(name, alias)
+            )
+        keys.sort()
+        return keys, entries
+
+    def rebuild(
+        self,
+        ingredients: t.Iterable[t.Tuple[int, str, t.Optional[str]]],
+        generation: t.Optional[int] = None,
+    ) -> None:
+        self._keys, self._ingredients = self._build(ingredients)
+        self.generation = generation
+
+    async def rebuild_in_executor(
+        self,
+        ingredients: t.Iterable[t.Tuple[int, str, t.Optional[str]]],
+        generation: t.Optional[int] = None,
+    ) -> None:
+        """
+        Rebuild with the sort of the whole catalog off the event loop. The
+        new keys and entries replace the old ones at once, on the loop, so
+        a search never sees them half swapped.
+        """
+        keys, entries = await asyncio.get_running_loop().run_in_executor(
+            None, self._build, ingredients
+        )
+        self._keys, self._ingredients = keys, entries
+        self.generation = generation
+
+    def advance(self, generation: t.Optional[int]) -> None:
+        """
+        Record that the index was patched with the write that moved the
+        catalog to `generation`. It is only current if that write was the
+        only one since the index's generation, otherwise it stays stale
+        and is rebuilt.
+        """
+        if (
+            generation is not None
+            and self.generation is not None
+            and generation == self.generation + 1
+        ):
+            self.generation = generation
+
+    def add(self, ingredient_id: int, name: str, alias: t.Optional[str]):
+        self.remove(ingredient_id)
+        self._ingredients[ingredient_id] = {
+            "id": ingredient_id,
+            "name": name,
+            "alias": alias,
+        }
+        for key in self._index_keys(name, alias):
+            bisect.insort(self._keys, (key, ingredient_id))
+
+    def remove(self, ingredient_id: int) -> None:
+        entry = self._ingredients.pop(ingredient_id, None)
+        if entry is None:
+            return
+        for key in self._index_keys(entry["name"], entry["alias"]):
+            i = bisect.bisect_left(self._keys, (key, ingredient_id))
+            if i < len(self._keys) and self._keys[i] == (key, ingredient_id):
+                del self._keys[i]
+
+    def clear(self) -> None:
+        self._keys = []
+        self._ingredients = {}
+        self.generation = None
+
+    def search(self, prefix: str, limit: int = 10) -> t.List[t.Dict]:
+        """
+        Up to `limit` ingredients with a name or alias word starting with
+        `prefix`, in alphabetical order of the matched text.
+        """
+        prefix = prefix.lower().strip()
+        if not prefix:
+            return []
+        results = []
+        seen = set()
+        i = bisect.bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and len(results) < limit:
+            key, ingredient_id = self._keys[i]
+            if not key.startswith(prefix):
+                break
+            if ingredient_id not in seen:
+                seen.add(ingredient_id)
+                results.append(self._ingredients[ingredient_id])
+            i += 1
+        return results
+
+
+ingredient_index = PrefixIndex()
@@ -0,0 +1,162 @@
+import json
+import typing as t
+
+import asyncpg
+from fastapi import HTTPException, status
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+IMPORT_FORMATS = ("csv", "jsonl")
+ON_CONFLICT = ("skip", "update")
+
+STAGING_TABLE = "ingredient_import"
+
+
+class MergeCounts(t.NamedTuple):
+    inserted: int
+    updated: int
+    unchanged: int
+    rejected: int
+
+
+async def jsonl_records(
+    source: t.AsyncIterable[bytes], rejected: t.List[int]
+) -> t.AsyncIterator[t.Tuple[str, t.Optional[str]]]:
+    """
+    Parse JSON lines of {"name": ..., "alias": ...} into (name, alias)
+    rows as the chunks arrive. Lines that aren't such an object are
+    counted in rejected[0] and skipped.
+    """
+    buffer = b""
+    async for chunk in source:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            record = _jsonl_record(line, rejected)
+            if record:
+                yield record
+
+    record = _jsonl_record(buffer, rejected)
+    if record:
+        yield record
+
+
+def _jsonl_record(
+    line: bytes, rejected: t.List[int]
+) -> t.Optional[t.Tuple[str, t.Optional[str]]]:
+    if not line.strip():
+        return None
+    try:
+        row = json.loads(line)
+        name, alias = row["name"], row.get("alias")
+    except (ValueError, TypeError, KeyError, AttributeError):
+        rejected[0] += 1
+        return None
+    if not isinstance(name, str) or not isinstance(alias, (str, type(None))):
+        rejected[0] += 1
+        return None
+    return name, alias
+
+
+async def copy_to_staging(
+    db: AsyncSession, source: t.AsyncIterable[bytes], format: str
+) -> int:
+    """
+    Stream the import into a temporary staging table with COPY, in the
+    session's transaction. CSV goes to the server untouched, with a header
+    row and name,alias columns. Returns the number of JSON lines rejected
+    before they reached the database.
+    """
+    await db.execute(
+        text(
+            f"CREATE TEMPORARY TABLE {STAGING_TABLE} ("
+            "row_number bigserial, name text, alias text"
+            ") ON COMMIT DROP"
+        )
+    )
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    driver_connection = raw_connection.driver_connection
+
+    rejected = [0]
+    try:
+        if format == "csv":
+            await driver_connection.copy_to_table(
+                STAGING_TABLE,
+                source=_non_empty(source),
+                columns=["name", "alias"],
+                format="csv",
+                header=True,
+            )
+        else:
+            await driver_connection.copy_records_to_table(
+                STAGING_TABLE,
+                records=jsonl_records(source, rejected),
+                columns=["name", "alias"],
+            )
+    except asyncpg.PostgresError as e:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid {format} import: {e}",
+        )
+    return rejected[0]
+
+
+async def _non_empty(source: t.AsyncIterable[bytes]) -> t.AsyncIterator[bytes]:
+    async for chunk in source:
+        if chunk:
+            yield chunk
+
+
+async def merge_staging(db: AsyncSession, on_conflict: str) -> MergeCounts:
+    """
+    Insert the staged rows into ingredient in one statement. A name that
+    already exists is left alone, or has its alias replaced when
+    on_conflict is "update". Rows without a name are rejected, and when a
+    name repeats in the import only its last row counts.
+    """
+    if on_conflict == "update":
+        conflict_action = (
+            "DO UPDATE SET alias = excluded.alias "
+            "WHERE ingredient.alias IS DISTINCT FROM excluded.alias"
+        )
+    else:
+        conflict_action = "DO NOTHING"
+
+    result = await db.execute(
+        text(
+            f"""
+            WITH staged AS (
+                SELECT NULLIF(btrim(name), '') AS name,
+                       NULLIF(btrim(alias), '') AS alias,
+                       row_number
+                FROM {STAGING_TABLE}
+            ),
+            latest AS (
+                SELECT DISTINCT ON (name) name, alias
+                FROM staged
+                WHERE name IS NOT NULL
+                ORDER BY name, row_number DESC
+            ),
+            merged AS (
+                INSERT INTO ingredient (name, alias)
+                SELECT name, alias FROM latest
+                ON CONFLICT (name) {conflict_action}
+                -- xmax is only set on rows the upsert updated
+                RETURNING xmax = 0 AS inserted
+            )
+            SELECT
+                (SELECT count(*) FROM staged) AS staged,
+                (SELECT count(*) FROM latest) AS valid,
+                (SELECT count(*) FROM merged WHERE inserted) AS inserted,
+                (SELECT count(*) FROM merged WHERE NOT inserted) AS updated
+            """
+        )
+    )
+    staged, valid, inserted, updated = result.one()
+    return MergeCounts(
+        inserted=inserted,
+        updated=updated,
+        unchanged=valid - inserted - updated,
+        rejected=staged - valid,
+    )
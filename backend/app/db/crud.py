@@ -1,11 +1,30 @@
+import asyncio
+import contextlib
 import typing as t
-
-from app.core.security import get_password_hash
+from datetime import timedelta
+
+import email_validator
+from app.core import config, security
+from app.core.cache import principal_cache
+from app.core.deliverability import deliverability_checker
+from app.core.shared_cache import (INGREDIENTS_SCOPE, email_scope,
+                                   shared_cache, user_scope)
 from email_validator import EmailNotValidError, validate_email
 from fastapi import HTTPException, status
-from sqlalchemy.orm import Session, class_mapper
+from sqlalchemy import (Integer, bindparam, column, func, or_, select,
+                        update, values)
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm import class_mapper
 
 from . import models, schemas
+from .autocomplete import ingredient_index
+from .bulk_import import copy_to_staging, merge_staging
+from .diet import compatible_masks, diet_mask, diet_names
+from .loading import LoadOptions, eager
+from .pagination import Page, paginate
+from .projection import Projection
 
 
 def object_as_dict(obj):
@@ -15,40 +34,220 @@ def object_as_dict(obj):
     }
 
 
-def check_valid_email(email: str) -> str:
+# Rows fetched per round trip by the export streams
+EXPORT_CHUNK_SIZE = 1000
+
+
+# Relationships serialized by the Meal response schema. A single meal is
+# loaded in one statement, lists use one extra IN query for all their meals.
+MEAL_LOAD = eager(models.Meal.ingredients, strategy="joined")
+MEAL_LIST_LOAD = eager(models.Meal.ingredients, strategy="selectin")
+
+
+async def stream_rows(
+    db: AsyncSession, query
+) -> t.AsyncIterator[t.List[t.Dict[str, t.Any]]]:
+    """
+    Stream the rows of a query as dicts, a chunk at a time, through a
+    server-side cursor. Only one chunk is held in memory however many rows
+    the query returns.
+    """
+    result = await db.stream(
+        query.execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    )
+    async for partition in result.mappings().partitions():
+        yield [dict(row) for row in partition]
+
+
+# Columns served by the list endpoints, in their response schemas' shape
+USER_ROW = Projection(
+    models.User.id,
+    models.User.email,
+    models.User.name,
+    models.User.is_active,
+    models.User.is_superuser,
+    models.User.is_verified,
+)
+INGREDIENT_ROW = Projection(
+    models.Ingredient.id,
+    models.Ingredient.name,
+    models.Ingredient.alias,
+    models.Ingredient.diet_mask.label("diets"),
+    transforms={"diets": diet_names},
+)
+MEAL_ROW = Projection(
+    models.Meal.id,
+    models.Meal.name,
+    models.Meal.description,
+    models.Meal.user_id,
+)
+SHOPPING_LIST_ITEM = Projection(
+    models.Ingredient.id,
+    models.Ingredient.name,
+    func.sum(models.MealIngredient.c.quantity).label("quantity"),
+    models.MealIngredient.c.unit,
+)
+
+SET_INGREDIENT_AMOUNT = (
+    update(models.MealIngredient)
+    .where(
+        models.MealIngredient.c.meal_id == bindparam("b_meal_id"),
+        models.MealIngredient.c.ingredient_id == bindparam("b_ingredient_id"),
+    )
+    .values(quantity=bindparam("b_quantity"), unit=bindparam("b_unit"))
+)
+
+
+def name_search(query, column, name: str):
+    """
+    Case-insensitive substring match on a name column. The filter is served
+    by the column's pg_trgm GIN index. Returns the filtered query and the
+    trigram similarity to the search term, to rank results by.
+    """
+    return (
+        query.filter(column.ilike(f"%{name}%")),
+        func.similarity(column, name),
+    )
+
+
+def diet_filter(query, required: int):
+    """
+    Meals whose ingredients all suit the diets of the `required` mask, as a
+    single predicate on the indexed meal.diet_mask.
+    """
+    if not required:
+        return query
+    return query.filter(models.Meal.diet_mask.in_(compatible_masks(required)))
+
+
+def visible_meals(query, user_id: int):
+    """
+    Meals a user can plan with: their own and the public ones, which are
+    those of superusers, as the ingredient catalog is.
+    """
+    return query.filter(
+        or_(
+            models.Meal.user_id == user_id,
+            models.Meal.user_id.in_(
+                select(models.User.id).filter(models.User.is_superuser)
+            ),
+        )
+    )
+
+
+# SQLSTATE of a unique constraint violation
+UNIQUE_VIOLATION = "23505"
+FOREIGN_KEY_VIOLATION = "23503"
+
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, "pgcode", None) == UNIQUE_VIOLATION
+
+
+def is_foreign_key_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, "pgcode", None) == FOREIGN_KEY_VIOLATION
+
+
+@contextlib.asynccontextmanager
+async def unique_or_conflict(
+    db: AsyncSession, detail: str, missing: t.Optional[str] = None
+):
+    """
+    Raise a 409 with `detail` when the writes in the block violate a unique
+    constraint. The constraint is the check: there is no lookup before the
+    write, and concurrent writers can't both get past it. Given `missing`,
+    a foreign key violation raises a 404 with it in the same way. The
+    session is rolled back on any integrity error.
+    """
     try:
-        valid_email = validate_email(email, check_deliverability=True)
+        yield
+    except IntegrityError as e:
+        await db.rollback()
+        if missing is not None and is_foreign_key_violation(e):
+            raise HTTPException(
+                status.HTTP_404_NOT_FOUND, detail=missing
+            ) from e
+        if not is_unique_violation(e):
+            raise
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=detail) from e
+
+
+async def user_changed(user_id: int, *emails: str) -> None:
+    """
+    Drop everything cached about a user after a committed write: their
+    authenticated principals and their shared cache entries.
+    """
+    principal_cache.invalidate_user(user_id)
+    await shared_cache.invalidate(
+        user_scope(user_id), *(email_scope(email) for email in emails)
+    )
+
+
+async def ingredients_changed() -> t.Optional[int]:
+    """
+    Move the catalog to a new generation after a committed write, for every
+    API process: their ETags and cached meals embedding ingredient names.
+    Returns the new generation, or None when Redis is unavailable.
+    """
+    generations = await shared_cache.invalidate(INGREDIENTS_SCOPE)
+    return generations[0] if generations else None
+
+
+async def check_valid_email(email: str) -> str:
+    """
+    Validate an email address and return its normalized form. Its syntax
+    is checked in process, its domain's deliverability with non-blocking
+    DNS lookups, skipped in email_validator's test environment.
+    """
+    try:
+        valid_email = validate_email(email, check_deliverability=False)
+        if not email_validator.TEST_ENVIRONMENT:
+            await deliverability_checker.check(valid_email.ascii_domain)
         return valid_email.normalized
     except EmailNotValidError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-def get_user(db: Session, user_id: int) -> schemas.User:
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int) -> schemas.User:
+    result = await db.execute(
+        select(models.User).filter(models.User.id == user_id)
+    )
+    user = result.scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 
-def get_user_by_email(db: Session, email: str) -> schemas.User:
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str) -> schemas.User:
+    result = await db.execute(
+        select(models.User).filter(models.User.email == email)
+    )
+    return result.scalars().first()
 
 
-def get_all_users(
-    db: Session, skip: int = 0, limit: int = 100
-) -> t.List[schemas.User]:
-    return db.query(models.User).offset(skip).limit(limit).all()
+async def get_all_users(
+    db: AsyncSession,
+    cursor: str = None,
+    limit: int = 100,
+    projection: Projection = None,
+) -> Page:
+    query = projection.select() if projection else select(models.User)
+    return await paginate(db, query, [models.User.id], cursor, limit)
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    if get_user_by_email(db, user.email):
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Email already registered",
-        )
+def export_users(
+    db: AsyncSession,
+) -> t.AsyncIterator[t.List[t.Dict[str, t.Any]]]:
+    return stream_rows(db, USER_ROW.select().order_by(models.User.id))
+
 
-    hashed_password = get_password_hash(user.password)
-    user.email = check_valid_email(user.email)
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    """
+    Create a user and their diet requirements, defaulting to all false, as
+    one unit of work: a single commit inserts both.
+    """
+    user.email = await check_valid_email(user.email)
+    hashed_password = await security.hash_password(user.password)
     db_user = models.User(
         name=user.name,
         email=user.email,
@@ -56,105 +255,74 @@ def create_user(db: Session, user: schemas.UserCreate):
         is_superuser=user.is_superuser,
         is_verified=user.is_verified,
         hashed_password=hashed_password,
+        diet_requirements=models.UserDietRequirements(
+            **schemas.UserDietRequirementsCreate().dict()
+        ),
     )
-    db.add(db_user)
-    db.commit()
-
-    # corresponding user's diet requirements (default to all false)
-    diet_requirements = schemas.UserDietRequirementsCreate()
-    db_diet_requirements = create_user_diet_requirements(
-        db, db_user.id, diet_requirements
-    )
-    db_user.diet_requirements = db_diet_requirements
-
-    db.commit()
-    db.refresh(db_user)
+    async with unique_or_conflict(db, "Email already registered"):
+        db.add(db_user)
+        await db.commit()
     return db_user
 
 
-def delete_user(db: Session, user_id: int):
-    user = get_user(db, user_id)
+async def delete_user(db: AsyncSession, user_id: int):
+    user = await get_user(db, user_id)
     if not user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await user_changed(user_id, user.email)
     return user
 
 
-def edit_user(
-    db: Session, user_id: int, user: schemas.UserEdit
+async def edit_user(
+    db: AsyncSession, user_id: int, user: schemas.UserEdit
 ) -> schemas.User:
-    db_user = get_user(db, user_id)
+    db_user = await get_user(db, user_id)
     if not db_user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
     update_data = user.dict(exclude_unset=True)
 
     if "password" in update_data:
-        update_data["hashed_password"] = get_password_hash(user.password)
+        update_data["hashed_password"] = await security.hash_password(
+            user.password
+        )
         del update_data["password"]
     if "email" in update_data:
-        if get_user_by_email(db, user.email):
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Email already registered",
-            )
-        update_data["email"] = check_valid_email(user.email)
+        update_data["email"] = await check_valid_email(user.email)
 
+    old_email = db_user.email
     for key, value in update_data.items():
         setattr(db_user, key, value)
 
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    async with unique_or_conflict(db, "Email already registered"):
+        db.add(db_user)
+        await db.commit()
+    await user_changed(user_id, old_email, db_user.email)
     return db_user
 
 
-def get_user_diet_requirements(
-    db: Session, user_id: int
+async def get_user_diet_requirements(
+    db: AsyncSession, user_id: int
 ) -> schemas.UserDietRequirements:
-    db_user = get_user(db, user_id)
-    print(db_user)
+    result = await db.execute(
+        select(models.User)
+        .options(*eager(models.User.diet_requirements, strategy="joined"))
+        .filter(models.User.id == user_id)
+    )
+    db_user = result.scalars().first()
     if not db_user:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
 
     return db_user.diet_requirements
 
 
-def create_user_diet_requirements(
-    db: Session,
-    user_id: int,
-    diet_requirements: schemas.UserDietRequirementsCreate,
-) -> schemas.UserDietRequirements:
-    db_user = get_user(db, user_id)
-    if not db_user:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    db_diet_requirements = models.UserDietRequirements(
-        user_id=user_id,
-        is_vegetarian=diet_requirements.is_vegetarian,
-        is_vegan=diet_requirements.is_vegan,
-        is_gluten_free=diet_requirements.is_gluten_free,
-        is_dairy_free=diet_requirements.is_dairy_free,
-        is_nut_free=diet_requirements.is_nut_free,
-        is_shellfish_free=diet_requirements.is_shellfish_free,
-        is_pescatarian=diet_requirements.is_pescatarian,
-    )
-    db.add(db_diet_requirements)
-    db.commit()
-    db.refresh(db_diet_requirements)
-    return db_diet_requirements
-
-
-def edit_user_diet_requirements(
-    db: Session,
+async def edit_user_diet_requirements(
+    db: AsyncSession,
     user_id: int,
     diet_requirements: schemas.UserDietRequirementsEdit,
 ) -> schemas.UserDietRequirements:
-    db_user = get_user(db, user_id)
-    if not db_user:
-        raise HTTPException(status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    db_diet_requirements = db_user.diet_requirements
+    db_diet_requirements = await get_user_diet_requirements(db, user_id)
     if not db_diet_requirements:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND, detail="Diet requirements not found"
@@ -165,241 +333,567 @@ def edit_user_diet_requirements(
         setattr(db_diet_requirements, key, value)
 
     db.add(db_diet_requirements)
-    db.commit()
-    db.refresh(db_diet_requirements)
+    await db.commit()
+    await shared_cache.invalidate(user_scope(user_id))
     return db_diet_requirements
 
 
-def get_ingredient(db: Session, ingredient_id: int) -> schemas.Ingredient:
-    ingredient = (
-        db.query(models.Ingredient)
-        .filter(models.Ingredient.id == ingredient_id)
-        .first()
+async def get_ingredient(
+    db: AsyncSession, ingredient_id: int
+) -> schemas.Ingredient:
+    result = await db.execute(
+        select(models.Ingredient).filter(models.Ingredient.id == ingredient_id)
     )
+    ingredient = result.scalars().first()
     if not ingredient:
         raise HTTPException(status_code=404, detail="Ingredient not found")
     return ingredient
 
 
-def get_ingredient_by_name(db: Session, name: str) -> schemas.Ingredient:
-    return (
-        db.query(models.Ingredient)
-        .filter(models.Ingredient.name == name)
-        .first()
+async def resolve_ingredients(
+    db: AsyncSession, ingredient_ids: t.Iterable[int]
+) -> t.List[models.Ingredient]:
+    """
+    Load the ingredients with the given ids in a single query, in the order
+    the ids were given. Raises a 400 listing every id that does not exist.
+    """
+    ingredient_ids = list(ingredient_ids)
+    if not ingredient_ids:
+        return []
+
+    result = await db.execute(
+        select(models.Ingredient).filter(
+            models.Ingredient.id.in_(set(ingredient_ids))
+        )
     )
+    found = {ingredient.id: ingredient for ingredient in result.scalars()}
 
-
-def get_all_ingredients(
-    db: Session, skip: int = 0, limit: int = 100
-) -> t.List[schemas.Ingredient]:
-    return db.query(models.Ingredient).offset(skip).limit(limit).all()
+    missing = sorted(set(ingredient_ids) - found.keys())
+    if missing:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail="Ingredient not found: "
+            + ", ".join(str(ingredient_id) for ingredient_id in missing),
+        )
+    return [found[ingredient_id] for ingredient_id in ingredient_ids]
+
+
+async def get_all_ingredients(
+    db: AsyncSession,
+    cursor: str = None,
+    limit: int = 100,
+    projection: Projection = None,
+) -> Page:
+    query = projection.select() if projection else select(models.Ingredient)
+    return await paginate(db, query, [models.Ingredient.id], cursor, limit)
+
+
+async def get_ingredients_like_name(
+    db: AsyncSession,
+    name: str,
+    cursor: str = None,
+    limit: int = 100,
+    projection: Projection = None,
+) -> Page:
+    query = projection.select() if projection else select(models.Ingredient)
+    query, rank = name_search(query, models.Ingredient.name, name)
+    return await paginate(
+        db, query, [rank.desc(), models.Ingredient.id], cursor, limit
+    )
 
 
-def get_ingredients_like_name(
-    db: Session, name: str, skip: int = 0, limit: int = 100
-) -> t.List[schemas.Ingredient]:
-    return (
-        db.query(models.Ingredient)
-        .filter(models.Ingredient.name.like(f"%{name}%"))
-        .offset(skip)
-        .limit(limit)
-        .all()
+def export_ingredients(
+    db: AsyncSession,
+) -> t.AsyncIterator[t.List[t.Dict[str, t.Any]]]:
+    return stream_rows(
+        db,
+        select(
+            models.Ingredient.id,
+            models.Ingredient.name,
+            models.Ingredient.alias,
+            models.Ingredient.diet_mask,
+        ).order_by(models.Ingredient.id),
     )
 
 
-def create_ingredient(
-    db: Session, ingredient: schemas.IngredientCreate
-) -> schemas.Ingredient:
-    if get_ingredient_by_name(db, ingredient.name):
-        raise HTTPException(
-            status.HTTP_409_CONFLICT,
-            detail="Ingredient with this name already exists",
+# requests finding the index stale wait for a single rebuild
+ingredient_index_lock = asyncio.Lock()
+
+
+async def autocomplete_ingredients(
+    db: AsyncSession, prefix: str, limit: int = 10
+) -> t.List[schemas.Ingredient]:
+    """
+    Search the in-memory ingredient index, rebuilt first if a write in any
+    process moved the catalog to a new generation since it was built. It
+    is served as is while Redis is unavailable.
+    """
+    generation = await shared_cache.generation(INGREDIENTS_SCOPE)
+    if generation is not None and generation != ingredient_index.generation:
+        await load_ingredient_index(db, generation)
+    return ingredient_index.search(prefix, limit)
+
+
+async def load_ingredient_index(
+    db: AsyncSession, generation: t.Optional[int] = None
+) -> None:
+    """
+    Rebuild the ingredient index at the catalog generation read before
+    loading it. A write landing meanwhile moves the generation on, and the
+    index is rebuilt again on its next use. Requests that waited on another
+    one's rebuild to `generation` use its index.
+    """
+    async with ingredient_index_lock:
+        if generation is None:
+            generation = await shared_cache.generation(INGREDIENTS_SCOPE)
+        elif generation == ingredient_index.generation:
+            return
+        result = await db.execute(
+            select(
+                models.Ingredient.id,
+                models.Ingredient.name,
+                models.Ingredient.alias,
+            )
         )
+        await ingredient_index.rebuild_in_executor(result.all(), generation)
 
+
+async def create_ingredient(
+    db: AsyncSession, ingredient: schemas.IngredientCreate
+) -> schemas.Ingredient:
     db_ingredient = models.Ingredient(
         name=ingredient.name,
         alias=ingredient.alias,
+        diet_mask=diet_mask(ingredient.diets or []),
     )
-    db.add(db_ingredient)
-    db.commit()
-    db.refresh(db_ingredient)
+    async with unique_or_conflict(
+        db, "Ingredient with this name already exists"
+    ):
+        db.add(db_ingredient)
+        await db.commit()
+    ingredient_index.add(
+        db_ingredient.id, db_ingredient.name, db_ingredient.alias
+    )
+    ingredient_index.advance(await ingredients_changed())
     return db_ingredient
 
 
-def delete_ingredient(db: Session, ingredient_id: int) -> schemas.Ingredient:
-    ingredient = get_ingredient(db, ingredient_id)
+async def delete_ingredient(
+    db: AsyncSession, ingredient_id: int
+) -> schemas.Ingredient:
+    ingredient = await get_ingredient(db, ingredient_id)
     if not ingredient:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND, detail="Ingredient not found"
         )
-    db.delete(ingredient)
-    db.commit()
+    await db.delete(ingredient)
+    await db.commit()
+    ingredient_index.remove(ingredient_id)
+    ingredient_index.advance(await ingredients_changed())
     return ingredient
 
 
-def edit_ingredient(
-    db: Session, ingredient_id: int, ingredient: schemas.IngredientEdit
+async def edit_ingredient(
+    db: AsyncSession, ingredient_id: int, ingredient: schemas.IngredientEdit
 ) -> schemas.Ingredient:
-    db_ingredient = get_ingredient(db, ingredient_id)
+    db_ingredient = await get_ingredient(db, ingredient_id)
     if not db_ingredient:
         raise HTTPException(
             status.HTTP_404_NOT_FOUND, detail="Ingredient not found"
         )
     update_data = ingredient.dict(exclude_unset=True)
 
-    if "name" in update_data and get_ingredient_by_name(db, ingredient.name):
-        raise HTTPException(
-            status.HTTP_409_CONFLICT,
-            detail="Ingredient with this name already exists",
-        )
+    if "diets" in update_data:
+        # the meals' masks follow through the ingredient update trigger
+        db_ingredient.diet_mask = diet_mask(update_data.pop("diets") or [])
 
     for key, value in update_data.items():
         setattr(db_ingredient, key, value)
 
-    db.add(db_ingredient)
-    db.commit()
-    db.refresh(db_ingredient)
+    async with unique_or_conflict(
+        db, "Ingredient with this name already exists"
+    ):
+        db.add(db_ingredient)
+        await db.commit()
+    ingredient_index.add(
+        db_ingredient.id, db_ingredient.name, db_ingredient.alias
+    )
+    ingredient_index.advance(await ingredients_changed())
     return db_ingredient
 
 
-def get_meal(db: Session, meal_id: int) -> schemas.Meal:
-    meal = db.query(models.Meal).filter(models.Meal.id == meal_id).first()
+async def import_ingredients(
+    db: AsyncSession,
+    source: t.AsyncIterable[bytes],
+    format: str = "csv",
+    on_conflict: str = "skip",
+) -> schemas.IngredientImportReport:
+    """
+    Bulk load ingredients through a COPY into a staging table, merged into
+    the catalog in one transaction. Rejected counts rows without a name,
+    unreadable JSON lines and rows superseded by a later row of the same
+    name. API processes rebuild their autocomplete index on its next use,
+    wherever the import ran.
+    """
+    rejected = await copy_to_staging(db, source, format)
+    counts = await merge_staging(db, on_conflict)
+    await db.commit()
+    await ingredients_changed()
+    return schemas.IngredientImportReport(
+        **counts._replace(rejected=counts.rejected + rejected)._asdict()
+    )
+
+
+async def get_meal(
+    db: AsyncSession, meal_id: int, options: LoadOptions = MEAL_LOAD
+) -> schemas.Meal:
+    result = await db.execute(
+        select(models.Meal).options(*options).filter(models.Meal.id == meal_id)
+    )
+    meal = result.unique().scalars().first()
     if not meal:
         raise HTTPException(status_code=404, detail="Meal not found")
     return meal
 
 
-def get_meal_by_name(db: Session, name: str) -> schemas.Meal:
-    return db.query(models.Meal).filter(models.Meal.name == name).first()
-
-
-def get_all_meals(
-    db: Session, user_id: int = None, skip: int = 0, limit: int = 100
-) -> t.List[schemas.Meal]:
+async def get_all_meals(
+    db: AsyncSession,
+    user_id: int = None,
+    cursor: str = None,
+    limit: int = 100,
+    options: LoadOptions = MEAL_LIST_LOAD,
+    projection: Projection = None,
+    compatible_with: int = 0,
+) -> Page:
+    if projection:
+        query = projection.select()
+    else:
+        query = select(models.Meal).options(*options)
     if user_id:
-        return (
-            db.query(models.Meal)
-            .join(models.User)
-            .filter(models.User.id == user_id)
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        query = query.filter(models.Meal.user_id == user_id)
+    query = diet_filter(query, compatible_with)
+    return await paginate(db, query, [models.Meal.id], cursor, limit)
+
+
+async def get_meals_like_name(
+    db: AsyncSession,
+    name: str,
+    user_id: int = None,
+    cursor: str = None,
+    limit: int = 100,
+    options: LoadOptions = MEAL_LIST_LOAD,
+    projection: Projection = None,
+    compatible_with: int = 0,
+) -> Page:
+    if projection:
+        query = projection.select()
     else:
-        return db.query(models.Meal).offset(skip).limit(limit).all()
+        query = select(models.Meal).options(*options)
+    if user_id:
+        query = query.filter(models.Meal.user_id == user_id)
+    query = diet_filter(query, compatible_with)
+    query, rank = name_search(query, models.Meal.name, name)
+    return await paginate(
+        db, query, [rank.desc(), models.Meal.id], cursor, limit
+    )
 
 
-def get_meals_like_name(
-    db: Session, name: str, user_id: int = None, skip: int = 0, limit: int = 100
-) -> t.List[schemas.Meal]:
-    if user_id:
-        return (
-            db.query(models.Meal)
-            .join(models.User)
-            .filter(models.User.id == user_id)
-            .filter(models.Meal.name.like(f"%{name}%"))
-            .offset(skip)
-            .limit(limit)
-            .all()
+def export_meals(
+    db: AsyncSession,
+) -> t.AsyncIterator[t.List[t.Dict[str, t.Any]]]:
+    # ingredient ids come from a correlated subquery per row, which keeps
+    # the stream in meal id order without aggregating the whole table first
+    ingredient_ids = (
+        select(models.MealIngredient.c.ingredient_id)
+        .filter(models.MealIngredient.c.meal_id == models.Meal.id)
+        .order_by(models.MealIngredient.c.id)
+        .scalar_subquery()
+    )
+    return stream_rows(
+        db,
+        MEAL_ROW.select(
+            func.array(ingredient_ids, type_=ARRAY(Integer)).label(
+                "ingredients"
+            )
+        ).order_by(models.Meal.id),
+    )
+
+
+async def get_meal_ingredient_rows(
+    db: AsyncSession, meal_ids: t.Collection[int]
+) -> t.Dict[int, t.List[t.Dict[str, t.Any]]]:
+    """
+    The ingredients of a page of projected meals, by meal id, in a single
+    query.
+    """
+    result = await db.execute(
+        INGREDIENT_ROW.select(models.MealIngredient.c.meal_id)
+        .join(models.MealIngredient)
+        .filter(models.MealIngredient.c.meal_id.in_(meal_ids))
+        .order_by(models.MealIngredient.c.id)
+    )
+    ingredients = {meal_id: [] for meal_id in meal_ids}
+    rows = result.all()
+    for row, ingredient in zip(rows, INGREDIENT_ROW.dicts(rows)):
+        ingredients[row.meal_id].append(ingredient)
+    return ingredients
+
+
+def expire_diet_masks(
+    db: AsyncSession, db_meals: t.Iterable[models.Meal]
+) -> None:
+    """
+    Written meals' diet masks were recomputed by the meal_ingredient
+    triggers after the meal rows were written. Expire them rather than
+    reload them, so they are never read stale.
+    """
+    for db_meal in db_meals:
+        db.expire(db_meal, ["diet_mask"])
+
+
+async def set_ingredient_amounts(
+    db: AsyncSession,
+    amounts: t.List[t.Tuple[models.Meal, schemas.MealIngredientAmount]],
+) -> None:
+    """
+    Write the quantity and unit of meal ingredients to their meal_ingredient
+    rows, flushed first, with a single executemany.
+    """
+    if not amounts:
+        return
+    await db.flush()
+    await db.execute(
+        SET_INGREDIENT_AMOUNT,
+        [
+            {
+                "b_meal_id": db_meal.id,
+                "b_ingredient_id": ingredient.id,
+                "b_quantity": ingredient.quantity,
+                "b_unit": ingredient.unit,
+            }
+            for db_meal, ingredient in amounts
+        ],
+    )
+
+
+async def get_shopping_list(
+    db: AsyncSession, meal_ids: t.Sequence[int], user: schemas.User
+) -> t.List[t.Dict[str, t.Any]]:
+    """
+    Total the ingredients of the meals, grouped by ingredient and unit,
+    with a single GROUP BY over meal_ingredient. A meal listed more than
+    once counts every time. Raises a 400 listing every meal that does not
+    exist or that the user can't see.
+    """
+    if not meal_ids:
+        return []
+
+    query = select(models.Meal.id).filter(models.Meal.id.in_(set(meal_ids)))
+    if not user.is_superuser:
+        query = visible_meals(query, user.id)
+    result = await db.execute(query)
+    missing = sorted(set(meal_ids) - set(result.scalars()))
+    if missing:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail="Meal not found: "
+            + ", ".join(str(meal_id) for meal_id in missing),
         )
-    else:
-        return (
-            db.query(models.Meal)
-            .filter(models.Meal.name.like(f"%{name}%"))
-            .offset(skip)
-            .limit(limit)
-            .all()
+
+    # repeated ids join their meal's rows once per listing
+    picked = values(column("meal_id", Integer), name="picked").data(
+        [(meal_id,) for meal_id in meal_ids]
+    )
+    result = await db.execute(
+        SHOPPING_LIST_ITEM.select()
+        .select_from(models.MealIngredient)
+        .join(picked, picked.c.meal_id == models.MealIngredient.c.meal_id)
+        .join(models.Ingredient)
+        .group_by(models.Ingredient.id, models.MealIngredient.c.unit)
+        .order_by(models.Ingredient.name, models.MealIngredient.c.unit)
+    )
+    return SHOPPING_LIST_ITEM.dicts(result.all())
+
+
+async def get_meal_suggestion(
+    db: AsyncSession, key: str
+) -> t.Optional[models.MealSuggestion]:
+    """Stored suggestions for a request, unless they're too old to serve"""
+    result = await db.execute(
+        select(models.MealSuggestion).filter(
+            models.MealSuggestion.key == key,
+            models.MealSuggestion.created_at
+            > func.now() - timedelta(seconds=config.SUGGESTIONS_MAX_AGE),
         )
+    )
+    return result.scalars().first()
 
 
-def create_meal(
-    db: Session, meal: schemas.MealCreate, user_id: int
-) -> schemas.Meal:
-    if get_meal_by_name(db, meal.name):
+async def get_meal_plan(db: AsyncSession, user_id: int) -> schemas.MealPlan:
+    """The user's precomputed meal plan, by primary key"""
+    plan = await db.get(models.MealPlan, user_id)
+    if not plan:
         raise HTTPException(
-            status.HTTP_409_CONFLICT,
-            detail="Meal with this name already exists",
+            status.HTTP_404_NOT_FOUND, detail="Meal plan not generated yet"
         )
+    return plan
 
+
+async def create_meal(
+    db: AsyncSession, meal: schemas.MealCreate, user_id: int
+) -> schemas.Meal:
     db_meal = models.Meal(
         name=meal.name,
         description=meal.description,
         user_id=user_id,
+        ingredients=await resolve_ingredients(
+            db, [ingredient.id for ingredient in meal.ingredients]
+        ),
     )
-    db.add(db_meal)
+    # the owner's foreign key checks they exist
+    async with unique_or_conflict(
+        db, "Meal with this name already exists", missing="User not found"
+    ):
+        db.add(db_meal)
+        await set_ingredient_amounts(
+            db,
+            [
+                (db_meal, ingredient)
+                for ingredient in meal.ingredients
+                if ingredient.has_amount
+            ],
+        )
+        await db.commit()
+    expire_diet_masks(db, [db_meal])
+    await shared_cache.invalidate(user_scope(user_id))
+    return db_meal
+
+
+async def create_meals(
+    db: AsyncSession, meals: t.List[schemas.MealCreate], user_id: int
+) -> t.List[schemas.Meal]:
+    """
+    Create many meals in one transaction. Either every meal is created or,
+    if any of them is invalid, none are.
+    """
+    names = [meal.name for meal in meals]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST,
+            detail="Duplicate meal names: " + ", ".join(duplicates),
+        )
 
-    db_user = get_user(db, user_id)
-    db_user.meals.append(db_meal)
+    # resolve the ingredients of every meal with one query
+    ingredients = {
+        ingredient.id: ingredient
+        for ingredient in await resolve_ingredients(
+            db, {i.id for meal in meals for i in meal.ingredients}
+        )
+    }
 
-    for ingredient_id in meal.ingredients:
-        try:
-            db_ingredient = get_ingredient(db, ingredient_id)
-        except HTTPException:
+    db_meals = [
+        models.Meal(
+            name=meal.name,
+            description=meal.description,
+            user_id=user_id,
+            ingredients=[ingredients[i.id] for i in meal.ingredients],
+        )
+        for meal in meals
+    ]
+    try:
+        db.add_all(db_meals)
+        await set_ingredient_amounts(
+            db,
+            [
+                (db_meal, ingredient)
+                for db_meal, meal in zip(db_meals, meals)
+                for ingredient in meal.ingredients
+                if ingredient.has_amount
+            ],
+        )
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # the owner's foreign key checks they exist
+        if is_foreign_key_violation(e):
             raise HTTPException(
-                status.HTTP_400_BAD_REQUEST, detail="Ingredient not found"
+                status.HTTP_404_NOT_FOUND, detail="User not found"
+            ) from e
+        if not is_unique_violation(e):
+            raise
+        # only a failed batch pays for finding which names were taken
+        result = await db.execute(
+            select(models.Meal.name).filter(
+                models.Meal.user_id == user_id, models.Meal.name.in_(names)
             )
-        db_meal.ingredients.append(db_ingredient)
-
-    db.commit()
-    db.refresh(db_meal)
-    return db_meal
+        )
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            detail="Meals with these names already exist: "
+            + ", ".join(sorted(result.scalars())),
+        ) from e
+    expire_diet_masks(db, db_meals)
+    await shared_cache.invalidate(user_scope(user_id))
+    return db_meals
 
 
-def delete_meal(db: Session, meal_id: int, user_id: int) -> schemas.Meal:
-    meal = get_meal(db, meal_id)
+async def delete_meal(
+    db: AsyncSession, meal_id: int, user_id: int
+) -> schemas.Meal:
+    meal = await get_meal(db, meal_id)
     if not meal:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Meal not found")
 
-    user = get_user(db, user_id)
+    user = await get_user(db, user_id)
     if user_id != meal.user_id and user.is_superuser is False:
         raise HTTPException(
             status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized to delete this meal",
         )
 
-    db.delete(meal)
-    db.commit()
+    await db.delete(meal)
+    await db.commit()
+    await shared_cache.invalidate(user_scope(meal.user_id))
     return meal
 
 
-def edit_meal(
-    db: Session, meal_id: int, meal: schemas.MealEdit, user_id: int
+async def edit_meal(
+    db: AsyncSession, meal_id: int, meal: schemas.MealEdit, user_id: int
 ) -> schemas.Meal:
-    db_meal = get_meal(db, meal_id)
+    db_meal = await get_meal(db, meal_id)
     if not db_meal:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail="Meal not found")
     update_data = meal.dict(exclude_unset=True)
 
-    user = get_user(db, user_id)
+    user = await get_user(db, user_id)
     if user_id != db_meal.user_id and user.is_superuser is False:
         raise HTTPException(
             status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized to edit this meal",
         )
 
-    if "name" in update_data and get_meal_by_name(db, meal.name):
-        raise HTTPException(
-            status.HTTP_409_CONFLICT,
-            detail="Meal with this name already exists",
-        )
-
     if "ingredients" in update_data:
-        db_meal.ingredients = []
-
         # pop ingredients to remove them from update_data
-        for ingredient_id in update_data.pop("ingredients"):
-            try:
-                db_ingredient = get_ingredient(db, ingredient_id)
-            except HTTPException:
-                raise HTTPException(
-                    status.HTTP_400_BAD_REQUEST, detail="Ingredient not found"
-                )
-            db_meal.ingredients.append(db_ingredient)
+        update_data.pop("ingredients")
+        ingredients = await resolve_ingredients(
+            db, [ingredient.id for ingredient in meal.ingredients]
+        )
+        # the order rows are loaded in: kept ingredients keep their rows,
+        # added ones are inserted after them
+        kept = [i for i in db_meal.ingredients if i in ingredients]
+        db_meal.ingredients = kept + [i for i in ingredients if i not in kept]
+        # kept rows may have amounts from before, set every row's
+        await set_ingredient_amounts(
+            db, [(db_meal, ingredient) for ingredient in meal.ingredients]
+        )
 
     for key, value in update_data.items():
         setattr(db_meal, key, value)
 
-    db.add(db_meal)
-    db.commit()
-    db.refresh(db_meal)
+    async with unique_or_conflict(db, "Meal with this name already exists"):
+        db.add(db_meal)
+        await db.commit()
+    expire_diet_masks(db, [db_meal])
+    await shared_cache.invalidate(user_scope(db_meal.user_id))
     return db_meal
@@ -0,0 +1,141 @@
+import enum
+import typing as t
+
+
+class DietFlag(enum.IntFlag):
+    """
+    The diets an ingredient is suitable for, one bit each, named after the
+    UserDietRequirements flags.
+    """
+
+    VEGETARIAN = 1
+    VEGAN = 2
+    GLUTEN_FREE = 4
+    DAIRY_FREE = 8
+    NUT_FREE = 16
+    SHELLFISH_FREE = 32
+    PESCATARIAN = 64
+
+
+DIETS = tuple(flag.name.lower() for flag in DietFlag)
+
+# The mask of a meal without ingredients, which suits every diet
+ALL_DIETS = sum(DietFlag)
+
+
+def diet_mask(diets: t.Iterable[str]) -> int:
+    mask = 0
+    for diet in diets:
+        mask |= DietFlag[diet.upper()]
+    return int(mask)
+
+
+def diet_names(mask: int) -> t.Optional[t.List[str]]:
+    """The diets set in a mask, or None when there are none"""
+    if not mask:
+        return None
+    return [diet for diet in DIETS if mask & DietFlag[diet.upper()]]
+
+
+def requirements_mask(diet_requirements) -> int:
+    """The mask a user's UserDietRequirements asks meals to satisfy"""
+    if diet_requirements is None:
+        return 0
+    return diet_mask(
+        diet for diet in DIETS if getattr(diet_requirements, f"is_{diet}")
+    )
+
+
+def compatible_masks(required: int) -> t.List[int]:
+    """
+    Every meal mask that has all the bits of `required` set.
+
+    `meal.diet_mask & required = required` can't use an index, but it holds
+    for exactly these values, so `diet_mask IN (...)` is the same predicate
+    served by the B-tree index on meal.diet_mask.
+    """
+    return [
+        mask for mask in range(ALL_DIETS + 1) if mask & required == required
+    ]
+
+
+# meal.diet_mask is the bitwise AND of its ingredients' masks. These
+# statement-level triggers keep it in step with every write to
+# meal_ingredient and to ingredient.diet_mask, whichever code path or bulk
+# statement makes it. They're created along with the table they're on.
+DIET_MASK_DDL = {
+    "meal_ingredient": (
+        f"""
+        CREATE OR REPLACE FUNCTION refresh_meal_diet_masks(meal_ids integer[])
+        RETURNS void AS $$
+            UPDATE meal SET diet_mask = coalesce(
+                (
+                    SELECT bit_and(ingredient.diet_mask)
+                    FROM meal_ingredient
+                    JOIN ingredient
+                    ON ingredient.id = meal_ingredient.ingredient_id
+                    WHERE meal_ingredient.meal_id = meal.id
+                ),
+                {ALL_DIETS}
+            )
+            WHERE meal.id = ANY(meal_ids)
+        $$ LANGUAGE sql
+        """,
+        """
+        CREATE OR REPLACE FUNCTION meal_ingredient_changed()
+        RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                PERFORM refresh_meal_diet_masks(
+                    ARRAY(SELECT DISTINCT meal_id FROM new_rows)
+                );
+            END IF;
+            IF TG_OP IN ('DELETE', 'UPDATE') THEN
+                PERFORM refresh_meal_diet_masks(
+                    ARRAY(SELECT DISTINCT meal_id FROM old_rows)
+                );
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER meal_ingredient_inserted AFTER INSERT ON meal_ingredient
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION meal_ingredient_changed()
+        """,
+        """
+        CREATE TRIGGER meal_ingredient_updated AFTER UPDATE ON meal_ingredient
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION meal_ingredient_changed()
+        """,
+        """
+        CREATE TRIGGER meal_ingredient_deleted AFTER DELETE ON meal_ingredient
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION meal_ingredient_changed()
+        """,
+    ),
+    "ingredient": (
+        """
+        CREATE OR REPLACE FUNCTION ingredient_diet_mask_changed()
+        RETURNS trigger AS $$
+        BEGIN
+            PERFORM refresh_meal_diet_masks(ARRAY(
+                SELECT DISTINCT meal_ingredient.meal_id
+                FROM new_rows
+                JOIN old_rows USING (id)
+                JOIN meal_ingredient
+                ON meal_ingredient.ingredient_id = new_rows.id
+                WHERE new_rows.diet_mask <> old_rows.diet_mask
+            ));
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE TRIGGER ingredient_diet_mask_updated AFTER UPDATE ON ingredient
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION ingredient_diet_mask_changed()
+        """,
+    ),
+}
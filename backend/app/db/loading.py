@@ -0,0 +1,37 @@
+import typing as t
+
+from sqlalchemy.orm import (joinedload, noload, raiseload, selectinload,
+                            subqueryload)
+from sqlalchemy.orm.interfaces import ORMOption
+
+# How a relationship is loaded alongside the rows that own it:
+# - "selectin": one extra SELECT ... WHERE id IN (...) for all parents,
+#   the best fit for collections on list endpoints
+# - "joined": LEFT OUTER JOIN in the same statement, the best fit for
+#   single rows and many-to-one / one-to-one relationships
+# - "subquery": one extra SELECT re-running the parent query as a subquery
+# - "raise": never load, accessing the attribute raises
+# - "noload": never load, the attribute stays empty
+LOADER_STRATEGIES: t.Dict[str, t.Callable[..., ORMOption]] = {
+    "selectin": selectinload,
+    "joined": joinedload,
+    "subquery": subqueryload,
+    "raise": raiseload,
+    "noload": noload,
+}
+
+LoadOptions = t.Sequence[ORMOption]
+
+
+def eager(*relationships, strategy: str = "selectin") -> LoadOptions:
+    """
+    Loader options for crud reads, so each call site can choose how the
+    relationships it serializes are loaded. With an eager strategy a list
+    endpoint issues the same number of queries however many rows it
+    returns, instead of one lazy load per row.
+    """
+    try:
+        loader = LOADER_STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError(f"Unknown loader strategy: {strategy}")
+    return tuple(loader(relationship) for relationship in relationships)
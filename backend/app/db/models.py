@@ -1,19 +1,66 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Table
+from sqlalchemy import (DDL, Boolean, Column, DateTime, Float, ForeignKey,
+                        Index, Integer, String, Table, UniqueConstraint,
+                        event, func, text)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 
+from .diet import ALL_DIETS, DIET_MASK_DDL, diet_names
 from .session import Base
 
+
+def has_trigram_ops(ddl, target, bind, **kw) -> bool:
+    """
+    Whether pg_trgm provides the GIN operator class of the name search
+    indexes. create_all leaves them out of databases where it doesn't.
+    """
+    if bind is None:
+        return True
+    return bind.scalar(
+        text(
+            "SELECT EXISTS "
+            "(SELECT FROM pg_opclass WHERE opcname = 'gin_trgm_ops')"
+        )
+    )
+
+
+def trigram_index(name: str, column: str) -> Index:
+    """
+    GIN index serving case-insensitive substring (ILIKE) and similarity (%)
+    matches on a column without scanning the whole table
+    """
+    return Index(
+        name,
+        column,
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"},
+    ).ddl_if(dialect="postgresql", callable_=has_trigram_ops)
+
+
 MealIngredient = Table(
     "meal_ingredient",
     Base.metadata,
     Column("id", Integer, primary_key=True, index=True),
     Column("meal_id", Integer, ForeignKey("meal.id")),
     Column("ingredient_id", Integer, ForeignKey("ingredient.id")),
+    # amount of the ingredient in the meal, in the base unit of app.db.units
+    Column("quantity", Float),
+    Column("unit", String),
+    # a meal's ingredients, and the meals an ingredient is in
+    Index(
+        "ix_meal_ingredient_meal_id_ingredient_id", "meal_id", "ingredient_id"
+    ),
+    Index("ix_meal_ingredient_ingredient_id", "ingredient_id"),
 )
 
 
 class User(Base):
     __tablename__ = "user"
+    __table_args__ = (
+        # the few superusers, owners of the public meals
+        Index(
+            "ix_user_superuser", "id", postgresql_where=text("is_superuser")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
@@ -41,7 +88,7 @@ class UserDietRequirements(Base):
     __tablename__ = "user_diet_requirements"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("user.id"))
+    user_id = Column(Integer, ForeignKey("user.id"), index=True)
     is_vegetarian = Column(Boolean, default=False)
     is_vegan = Column(Boolean, default=False)
     is_gluten_free = Column(Boolean, default=False)
@@ -55,10 +102,13 @@ class UserDietRequirements(Base):
 
 class Ingredient(Base):
     __tablename__ = "ingredient"
+    __table_args__ = (trigram_index("ix_ingredient_name_trgm", "name"),)
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False, unique=True)
     alias = Column(String)
+    # DietFlag bits of the diets this ingredient is suitable for
+    diet_mask = Column(Integer, nullable=False, default=0, server_default="0")
 
     meals = relationship(
         "Meal",
@@ -66,19 +116,82 @@ class Ingredient(Base):
         back_populates="ingredients",
     )
 
+    @property
+    def diets(self):
+        return diet_names(self.diet_mask)
+
 
 class Meal(Base):
     __tablename__ = "meal"
+    __table_args__ = (
+        # meal names are unique per user, this also serves lookups by user
+        UniqueConstraint("user_id", "name", name="uq_meal_user_id_name"),
+        trigram_index("ix_meal_name_trgm", "name"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     description = Column(String)
     user_id = Column(Integer, ForeignKey("user.id"))
+    # AND of the ingredients' diet masks, maintained by DIET_MASK_DDL
+    diet_mask = Column(
+        Integer,
+        nullable=False,
+        default=ALL_DIETS,
+        server_default=str(ALL_DIETS),
+        index=True,
+    )
 
     ingredients = relationship(
         "Ingredient",
         secondary=MealIngredient,
         back_populates="meals",
+        # keep the order ingredients were added in, whichever way it's loaded
+        order_by=MealIngredient.c.id,
     )
 
     user = relationship("User", back_populates="meals")
+
+
+class MealSuggestion(Base):
+    """
+    Generated meal suggestions, shared by every user asking with the same
+    diets and ingredients. See app.core.suggestions.
+    """
+
+    __tablename__ = "meal_suggestion"
+
+    # hash of the normalized request, app.core.suggestions.suggestion_key
+    key = Column(String(64), primary_key=True)
+    diet_mask = Column(Integer, nullable=False)
+    ingredient_ids = Column(ARRAY(Integer), nullable=False)
+    suggestions = Column(JSONB, nullable=False)
+    created_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+class MealPlan(Base):
+    """
+    The latest meal plan of each active user, precomputed by the nightly
+    plan_all_users task and served as stored. See app.core.planner.
+    """
+
+    __tablename__ = "meal_plan"
+
+    user_id = Column(
+        Integer, ForeignKey("user.id", ondelete="CASCADE"), primary_key=True
+    )
+    # meal ids by day, as generated
+    days = Column(JSONB, nullable=False)
+    ingredients = Column(Integer, nullable=False)
+    generated_at = Column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
+
+
+for table, statements in DIET_MASK_DDL.items():
+    for statement in statements:
+        event.listen(
+            Base.metadata.tables[table], "after_create", DDL(statement)
+        )
@@ -0,0 +1,97 @@
+import base64
+import binascii
+import json
+import typing as t
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import ColumnElement, UnaryExpression
+
+
+# response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(t.NamedTuple):
+    items: t.List[t.Any]
+    # opaque token for the page after this one, None on the last page
+    next_cursor: t.Optional[str]
+
+
+def encode_cursor(values: t.Sequence[t.Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, length: int) -> t.List[t.Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        values = None
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    return values
+
+
+def _sort_key(expression) -> t.Tuple[ColumnElement, bool]:
+    if (
+        isinstance(expression, UnaryExpression)
+        and expression.modifier is operators.desc_op
+    ):
+        return expression.element, True
+    return expression, False
+
+
+def _after(
+    keys: t.Sequence[t.Tuple[ColumnElement, bool]], values: t.Sequence
+) -> ColumnElement:
+    """
+    Rows that sort strictly after `values` in the order given by `keys`.
+    """
+    clauses = []
+    for i, (column, descending) in enumerate(keys):
+        beyond = column < values[i] if descending else column > values[i]
+        ties = [keys[j][0] == values[j] for j in range(i)]
+        clauses.append(and_(*ties, beyond))
+    return or_(*clauses)
+
+
+async def paginate(
+    db: AsyncSession,
+    query: Select,
+    order_by: t.Sequence,
+    cursor: t.Optional[str] = None,
+    limit: int = 100,
+) -> Page:
+    """
+    Keyset pagination: rather than skipping the rows of earlier pages, the
+    cursor holds the sort key of the last row returned and the next page
+    starts right after it, so every page costs the same as the first.
+
+    `order_by` must end with a unique column (usually the primary key) so
+    the order is total. A query selecting one entity pages through those
+    objects, one selecting several columns through tuples of them.
+    """
+    width = len(query.column_descriptions)
+    keys = [_sort_key(expression) for expression in order_by]
+    query = query.add_columns(
+        *(column.label(f"_sort_key_{i}") for i, (column, _) in enumerate(keys))
+    ).order_by(*order_by)
+    if cursor:
+        query = query.filter(_after(keys, decode_cursor(cursor, len(keys))))
+
+    result = await db.execute(query.limit(limit + 1))
+    # joined eager loads of collections repeat the parent row per child
+    rows = result.unique().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][width:])
+    if width == 1:
+        return Page([row[0] for row in rows], next_cursor)
+    return Page([tuple(row[:width]) for row in rows], next_cursor)
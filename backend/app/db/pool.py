@@ -0,0 +1,81 @@
+import threading
+import time
+import typing as t
+
+from app.core.metrics import Histogram
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolStats:
+    """
+    Checkout wait times and failures of a connection pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.wait_time = Histogram()
+        self.checkout_timeouts = 0
+        self.checkout_errors = 0
+
+    def record_failure(self, error: Exception) -> None:
+        with self._lock:
+            if isinstance(error, exc.TimeoutError):
+                self.checkout_timeouts += 1
+            else:
+                self.checkout_errors += 1
+
+
+class InstrumentedPoolMixin:
+    """
+    Times every checkout, including the wait for a free connection when
+    the pool and its overflow are exhausted, and counts failed checkouts.
+    """
+
+    stats: PoolStats
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except Exception as e:
+            self.stats.record_failure(e)
+            raise
+        finally:
+            self.stats.wait_time.observe(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # keep the history when the engine is disposed
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(
+    InstrumentedPoolMixin, AsyncAdaptedQueuePool
+):
+    pass
+
+
+def pool_status(pool: InstrumentedPoolMixin) -> t.Dict[str, t.Any]:
+    """
+    Live occupancy of a pool along with its checkout statistics.
+    """
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkout_timeouts": pool.stats.checkout_timeouts,
+        "checkout_errors": pool.stats.checkout_errors,
+        "wait_time": pool.stats.wait_time.snapshot(),
+    }
@@ -0,0 +1,67 @@
+import typing as t
+
+import orjson
+from fastapi import Response
+from sqlalchemy import Select, select
+
+
+class Projection:
+    """
+    The columns a read-only list endpoint returns, fixed once at import.
+
+    Queries select just these columns, so rows come back as plain tuples
+    without building ORM objects, and `dicts` turns them into response
+    items directly, leaving out None the way response_model_exclude_none
+    does. The result skips pydantic validation entirely, which is safe
+    because the values come straight from typed columns. Columns whose
+    stored form isn't their response form, such as a bitmask, are given a
+    function in `transforms`, by field, to convert their values.
+    """
+
+    def __init__(
+        self,
+        *columns,
+        transforms: t.Optional[t.Dict[str, t.Callable[[t.Any], t.Any]]] = None,
+    ):
+        self.columns = columns
+        # Table column keys are str subclasses, which orjson won't encode
+        self.fields = tuple(str(column.key) for column in columns)
+        self.transforms = transforms or {}
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def select(self, *extra_columns) -> Select:
+        return select(*self.columns, *extra_columns)
+
+    def dicts(self, rows: t.Iterable[t.Sequence]) -> t.List[t.Dict]:
+        fields = self.fields
+        if self.transforms:
+            rows = [self._transform(row) for row in rows]
+        return [
+            {
+                field: value
+                for field, value in zip(fields, row)
+                if value is not None
+            }
+            for row in rows
+        ]
+
+    def _transform(self, row: t.Sequence) -> t.List:
+        row = list(row)
+        for i, field in enumerate(self.fields):
+            if field in self.transforms:
+                row[i] = self.transforms[field](row[i])
+        return row
+
+
+def json_response(
+    content: t.Any, headers: t.Optional[t.Dict[str, str]] = None
+) -> Response:
+    """
+    Encode content with orjson into a ready response, bypassing FastAPI's
+    response_model validation and jsonable_encoder pass.
+    """
+    return Response(
+        orjson.dumps(content), media_type="application/json", headers=headers
+    )
@@ -1,6 +1,13 @@
 import typing as t
+from datetime import datetime
+from enum import Enum
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, root_validator, validator
+
+from .diet import DIETS
+from .units import normalize_quantity
+
+Diet = Enum("Diet", {diet: diet for diet in DIETS}, type=str)
 
 
 class UserDietRequirementsBase(BaseModel):
@@ -91,6 +98,7 @@ class TokenData(BaseModel):
 class IngredientBase(BaseModel):
     name: str
     alias: str = None
+    diets: t.List[Diet] = None
 
 
 class IngredientOut(IngredientBase):
@@ -105,6 +113,7 @@ class IngredientCreate(IngredientBase):
 class IngredientEdit(IngredientBase):
     name: t.Optional[str] = None
     alias: t.Optional[str] = None
+    diets: t.Optional[t.List[Diet]] = None
 
     class Config:
         orm_mode = True
@@ -117,6 +126,40 @@ class Ingredient(IngredientBase):
         orm_mode = True
 
 
+class IngredientImportReport(BaseModel):
+    inserted: int
+    updated: int
+    unchanged: int
+    rejected: int
+
+
+class MealIngredientAmount(BaseModel):
+    id: int
+    quantity: t.Optional[float] = Field(None, gt=0)
+    unit: t.Optional[str] = None
+
+    @root_validator(skip_on_failure=True)
+    def normalize_unit(cls, values):
+        values["quantity"], values["unit"] = normalize_quantity(
+            values["quantity"], values["unit"]
+        )
+        return values
+
+    @property
+    def has_amount(self) -> bool:
+        return self.quantity is not None or self.unit is not None
+
+
+def ingredient_amounts(ingredients):
+    """Accept plain ingredient ids alongside amounts"""
+    if not isinstance(ingredients, list):
+        return ingredients
+    return [
+        {"id": ingredient} if isinstance(ingredient, int) else ingredient
+        for ingredient in ingredients
+    ]
+
+
 class MealBase(BaseModel):
     name: str
     description: str = None
@@ -130,7 +173,11 @@ class MealOut(MealBase):
 
 
 class MealCreate(MealBase):
-    ingredients: t.List[int] = []
+    ingredients: t.List[MealIngredientAmount] = []
+
+    _ingredient_amounts = validator("ingredients", pre=True, allow_reuse=True)(
+        ingredient_amounts
+    )
 
     class Config:
         orm_mode = True
@@ -139,7 +186,11 @@ class MealCreate(MealBase):
 class MealEdit(MealBase):
     name: t.Optional[str] = None
     description: t.Optional[str] = None
-    ingredients: t.Optional[t.List[int]] = None
+    ingredients: t.Optional[t.List[MealIngredientAmount]] = None
+
+    _ingredient_amounts = validator("ingredients", pre=True, allow_reuse=True)(
+        ingredient_amounts
+    )
 
     class Config:
         orm_mode = True
@@ -152,3 +203,43 @@ class Meal(MealBase):
 
     class Config:
         orm_mode = True
+
+
+class ShoppingListCreate(BaseModel):
+    meals: t.List[int] = []
+    # a generated meal plan's meal ids, by day
+    days: t.List[t.List[int]] = []
+
+
+class ShoppingListItem(BaseModel):
+    id: int
+    name: str
+    quantity: float = None
+    unit: str = None
+
+
+class MealPlan(BaseModel):
+    user_id: int
+    days: t.List[t.List[int]]
+    # distinct ingredients in the plan
+    ingredients: int
+    generated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+class MealSuggestionsCreate(BaseModel):
+    ingredients: t.List[int] = Field(..., min_items=1, max_items=20)
+
+
+class MealSuggestion(BaseModel):
+    name: str
+    description: str = None
+
+
+class MealSuggestions(BaseModel):
+    key: str
+    # "pending" until the suggestions are generated, then "done"
+    status: str
+    suggestions: t.List[MealSuggestion] = None
@@ -1,19 +1,48 @@
 from app.core import config
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from .pool import InstrumentedAsyncAdaptedQueuePool, InstrumentedQueuePool
+
+pool_options = dict(
+    pool_size=config.DB_POOL_SIZE,
+    max_overflow=config.DB_MAX_OVERFLOW,
+    pool_timeout=config.DB_POOL_TIMEOUT,
+    pool_recycle=config.DB_POOL_RECYCLE,
+    pool_pre_ping=config.DB_POOL_PRE_PING,
+)
+
+# Synchronous engine, used by alembic, celery tasks and scripts
 engine = create_engine(
     config.SQLALCHEMY_DATABASE_URI,
+    poolclass=InstrumentedQueuePool,
+    **pool_options,
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Asynchronous engine, used by the API so queries don't block the event loop
+async_engine = create_async_engine(
+    config.SQLALCHEMY_ASYNC_DATABASE_URI,
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    **pool_options,
+)
+# Objects are not expired on commit: an expired attribute can't be lazily
+# reloaded once the response is being serialized outside the session.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    """
+    One session per request, shared by every dependency that asks for it.
+    FastAPI caches the dependency for the request, and the session only
+    checks out a connection once the first query runs. It is closed, and
+    its connection returned to the pool, even if the handler raises.
+    """
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,77 @@
+import typing as t
+
+# Quantities are stored in one base unit per dimension, so amounts of an
+# ingredient add up in SQL whichever unit they were entered in: grams,
+# millilitres, or a plain count when there is no unit.
+UNITS: t.Dict[str, t.Tuple[t.Optional[str], float]] = {
+    "g": ("g", 1.0),
+    "mg": ("g", 0.001),
+    "kg": ("g", 1000.0),
+    "oz": ("g", 28.349523125),
+    "lb": ("g", 453.59237),
+    "ml": ("ml", 1.0),
+    "cl": ("ml", 10.0),
+    "dl": ("ml", 100.0),
+    "l": ("ml", 1000.0),
+    "tsp": ("ml", 5.0),
+    "tbsp": ("ml", 15.0),
+    "cup": ("ml", 240.0),
+    "fl oz": ("ml", 29.5735295625),
+    "pint": ("ml", 473.176473),
+    "piece": (None, 1.0),
+}
+
+ALIASES = {
+    "gram": "g",
+    "grams": "g",
+    "milligram": "mg",
+    "milligrams": "mg",
+    "kilogram": "kg",
+    "kilograms": "kg",
+    "kilo": "kg",
+    "kilos": "kg",
+    "ounce": "oz",
+    "ounces": "oz",
+    "pound": "lb",
+    "pounds": "lb",
+    "lbs": "lb",
+    "millilitre": "ml",
+    "millilitres": "ml",
+    "milliliter": "ml",
+    "milliliters": "ml",
+    "litre": "l",
+    "litres": "l",
+    "liter": "l",
+    "liters": "l",
+    "teaspoon": "tsp",
+    "teaspoons": "tsp",
+    "tablespoon": "tbsp",
+    "tablespoons": "tbsp",
+    "cups": "cup",
+    "pints": "pint",
+    "pieces": "piece",
+    "pc": "piece",
+    "pcs": "piece",
+}
+
+
+def normalize_quantity(
+    quantity: t.Optional[float], unit: t.Optional[str]
+) -> t.Tuple[t.Optional[float], t.Optional[str]]:
+    """
+    Convert a quantity to its dimension's base unit, returning the new
+    quantity and unit. Unit names are case-insensitive and may be spelled
+    out or plural. Raises ValueError for an unknown unit.
+    """
+    if unit is not None:
+        unit = " ".join(unit.lower().replace(".", "").split())
+    if not unit:
+        return quantity, None
+
+    unit = ALIASES.get(unit, unit)
+    if unit not in UNITS:
+        raise ValueError(f"Unknown unit: {unit}")
+    base_unit, factor = UNITS[unit]
+    if quantity is not None:
+        quantity *= factor
+    return quantity, base_unit
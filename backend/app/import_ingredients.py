@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import typing as t
+
+from app.db.bulk_import import IMPORT_FORMATS, ON_CONFLICT
+from app.db.crud import import_ingredients
+from app.db.session import AsyncSessionLocal
+
+CHUNK_SIZE = 1024 * 1024
+
+
+async def read_chunks(path: str) -> t.AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            yield chunk
+
+
+async def main(path: str, format: str, on_conflict: str) -> None:
+    async with AsyncSessionLocal() as db:
+        report = await import_ingredients(
+            db, read_chunks(path), format, on_conflict
+        )
+    print(
+        f"Inserted {report.inserted}, updated {report.updated}, "
+        f"unchanged {report.unchanged}, rejected {report.rejected}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Bulk import ingredients from a CSV or JSON lines file"
+    )
+    parser.add_argument("path")
+    parser.add_argument(
+        "--format",
+        choices=IMPORT_FORMATS,
+        help="defaults to the file extension",
+    )
+    parser.add_argument("--on-conflict", choices=ON_CONFLICT, default="skip")
+    args = parser.parse_args()
+
+    format = args.format or args.path.rsplit(".", 1)[-1].lower()
+    if format not in IMPORT_FORMATS:
+        parser.error("cannot tell the format from the path, pass --format")
+
+    print(f"Importing ingredients from {args.path}")
+    asyncio.run(main(args.path, format, args.on_conflict))
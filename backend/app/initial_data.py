@@ -1,25 +1,26 @@
 #!/usr/bin/env python3
 
+import asyncio
+
 from app.db.crud import create_user
 from app.db.schemas import UserCreate
-from app.db.session import SessionLocal, get_db
-
+from app.db.session import AsyncSessionLocal
 
-def init() -> None:
-    db = SessionLocal()
 
-    create_user(
-        db,
-        UserCreate(
-            email="admin@admin.com",
-            password="pass",
-            is_active=True,
-            is_superuser=True,
-        ),
-    )
+async def init() -> None:
+    async with AsyncSessionLocal() as db:
+        await create_user(
+            db,
+            UserCreate(
+                email="admin@admin.com",
+                password="pass",
+                is_active=True,
+                is_superuser=True,
+            ),
+        )
 
 
 if __name__ == "__main__":
     print("Creating superuser admin@admin.com")
-    init()
+    asyncio.run(init())
     print("Superuser created")
@@ -1,28 +1,28 @@
 import uvicorn
 from app import tasks
 from app.api.api_v1.routers.auth import auth_router
+from app.api.api_v1.routers.export import export_router
 from app.api.api_v1.routers.ingredients import ingredients_router
 from app.api.api_v1.routers.meals import meals_router
+from app.api.api_v1.routers.metrics import metrics_router
 from app.api.api_v1.routers.users import users_router
 from app.api.api_v1.routers.users_diet_requirements import users_diet_router
 from app.core import config
 from app.core.auth import get_current_active_user
 from app.core.celery_app import celery_app
-from app.db.session import SessionLocal
+from app.db.crud import load_ingredient_index
+from app.db.session import AsyncSessionLocal
 from fastapi import Depends, FastAPI
-from starlette.requests import Request
 
 app = FastAPI(
     title=config.PROJECT_NAME, docs_url="/api/docs", openapi_url="/api"
 )
 
 
-@app.middleware("http")
-async def db_session_middleware(request: Request, call_next):
-    request.state.db = SessionLocal()
-    response = await call_next(request)
-    request.state.db.close()
-    return response
+@app.on_event("startup")
+async def build_ingredient_index():
+    async with AsyncSessionLocal() as db:
+        await load_ingredient_index(db)
 
 
 @app.get("/api/v1")
@@ -63,6 +63,18 @@ app.include_router(
     tags=["meals"],
     dependencies=[Depends(get_current_active_user)],
 )
+app.include_router(
+    metrics_router,
+    prefix="/api/v1",
+    tags=["metrics"],
+    dependencies=[Depends(get_current_active_user)],
+)
+app.include_router(
+    export_router,
+    prefix="/api/v1",
+    tags=["export"],
+    dependencies=[Depends(get_current_active_user)],
+)
 
 
 if __name__ == "__main__":
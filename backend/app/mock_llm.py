@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# A stand-in for an OpenAI-compatible chat completions API, to run the meal
+# suggestion pipeline offline. It answers app.core.suggestions' prompts with
+# made-up meals after a set latency, and counts requests and tokens the way
+# a bill would, served at /stats:
+#
+#   python -m app.mock_llm --port 8100 --latency 0.5
+#   LLM_API_URL=http://localhost:8100/v1 celery --app app.tasks worker ...
+
+import argparse
+import json
+import threading
+import time
+import typing as t
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STYLES = ["stew", "salad", "stir-fry", "soup", "bake", "curry", "pie"]
+
+
+def count_tokens(text: str) -> int:
+    # about 4 characters a token in English text
+    return max(1, len(text) // 4)
+
+
+def suggest(request: t.Dict[str, t.Any], count: int) -> t.List[dict]:
+    ingredients = request.get("ingredients") or ["pantry"]
+    diets = " ".join(request.get("diets") or [])
+    return [
+        {
+            "name": f"{ingredients[i % len(ingredients)].title()} "
+            f"{STYLES[i % len(STYLES)]}",
+            "description": f"A {diets + ' ' if diets else ''}"
+            f"{STYLES[i % len(STYLES)]} of {', '.join(ingredients)}.",
+        }
+        for i in range(count)
+    ]
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: t.Tuple[str, int], latency: float = 0.0):
+        super().__init__(address, MockLLMHandler)
+        self.latency = latency
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def stats(self) -> t.Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    server: MockLLMServer
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            return self.send_json(404, {"error": {"message": "Not found"}})
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length))
+        messages = body["messages"]
+        try:
+            prompt = json.loads(messages[-1]["content"])
+            results = [
+                {
+                    "id": request["id"],
+                    "meals": suggest(request, prompt["count"]),
+                }
+                for request in prompt["requests"]
+            ]
+        except (ValueError, KeyError, TypeError):
+            return self.send_json(
+                400, {"error": {"message": "Unexpected prompt"}}
+            )
+
+        time.sleep(self.server.latency)
+        content = json.dumps({"results": results})
+        usage = {
+            "prompt_tokens": count_tokens(
+                "".join(message["content"] for message in messages)
+            ),
+            "completion_tokens": count_tokens(content),
+        }
+        usage["total_tokens"] = sum(usage.values())
+        self.server.record(usage["prompt_tokens"], usage["completion_tokens"])
+        self.send_json(
+            200,
+            {
+                "object": "chat.completion",
+                "model": body.get("model"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            },
+        )
+
+    def do_GET(self):
+        if self.path != "/stats":
+            return self.send_json(404, {"error": {"message": "Not found"}})
+        self.send_json(200, self.server.stats())
+
+    def send_json(self, status: int, body: t.Any) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve a mock chat completions API for meal suggestions"
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds per completion"
+    )
+    args = parser.parse_args()
+
+    server = MockLLMServer((args.host, args.port), latency=args.latency)
+    print(f"Mock LLM API at {server.url}")
+    server.serve_forever()
@@ -1,6 +1,84 @@
-from app.core.celery_app import celery_app
+import typing as t
+from datetime import datetime
+
+import redis
+from app.core import config, planner, suggestions
+from app.core.celery_app import BATCH_PRIORITY, celery_app
+from app.core.llm import LLMClient
+from app.db.session import SessionLocal
+from celery import chord
+
+llm_client = LLMClient(
+    config.LLM_API_URL,
+    config.LLM_MODEL,
+    api_key=config.LLM_API_KEY,
+    timeout=config.LLM_TIMEOUT,
+)
+# the suggestion queue lives next to the shared cache, where the API
+# coalesces in-flight prompts
+suggestion_redis = redis.Redis.from_url(config.CACHE_REDIS_URL)
 
 
 @celery_app.task(acks_late=True)
 def example_task(word: str) -> str:
     return f"test task returns {word}"
+
+
+@celery_app.task(acks_late=True)
+def generate_meal_plan(
+    user_id: int, meals_per_day: int = planner.MEALS_PER_DAY
+) -> dict:
+    with SessionLocal() as db:
+        return planner.generate_plan(db, user_id, meals_per_day)
+
+
+@celery_app.task(acks_late=True, priority=BATCH_PRIORITY)
+def plan_all_users(shard_size: int = config.PLAN_SHARD_SIZE) -> dict:
+    """
+    Regenerate the stored meal plan of every active user, run nightly by
+    celery beat. The users are split into shards that the batch workers plan
+    in parallel, and once every shard is done the plans of users who are no
+    longer active are removed. A failed shard leaves every old plan in
+    place until the next run.
+    """
+    with SessionLocal() as db:
+        started_at, user_ids = planner.active_user_ids(db)
+    shards = [
+        user_ids[i : i + shard_size]
+        for i in range(0, len(user_ids), shard_size)
+    ]
+    chord(plan_users.s(shard) for shard in shards)(
+        finish_plans.s(started_at.isoformat())
+    )
+    return {"users": len(user_ids), "shards": len(shards)}
+
+
+@celery_app.task(acks_late=True, priority=BATCH_PRIORITY)
+def plan_users(user_ids: t.List[int]) -> int:
+    """Generate and store the meal plans of a shard of users"""
+    with SessionLocal() as db:
+        plans = [planner.generate_plan(db, user_id) for user_id in user_ids]
+        planner.store_plans(db, plans)
+    return len(plans)
+
+
+@celery_app.task(acks_late=True, priority=BATCH_PRIORITY)
+def finish_plans(planned: t.List[int], started_at: str) -> dict:
+    """Once every shard is planned, remove the plans left from before"""
+    with SessionLocal() as db:
+        removed = planner.remove_stale_plans(
+            db, datetime.fromisoformat(started_at)
+        )
+    return {"planned": sum(planned), "removed": removed}
+
+
+@celery_app.task(acks_late=True, rate_limit=config.LLM_RATE_LIMIT)
+def suggest_meals() -> t.Optional[dict]:
+    """
+    Complete a batch of queued meal suggestion prompts with one LLM
+    request. Every queued prompt schedules a run, those finding the queue
+    already drained by an earlier one do nothing.
+    """
+    with SessionLocal() as db:
+        report = suggestions.process_batch(db, suggestion_redis, llm_client)
+    return report and report._asdict()
@@ -0,0 +1,89 @@
+import asyncio
+
+from app.db.autocomplete import PrefixIndex
+
+
+def make_index() -> PrefixIndex:
+    index = PrefixIndex()
+    index.rebuild(
+        [
+            (1, "Tomato", None),
+            (2, "Cherry tomatoes", None),
+            (3, "Aubergine", "Eggplant"),
+            (4, "Tomato paste", None),
+        ]
+    )
+    return index
+
+
+def names(results):
+    return [result["name"] for result in results]
+
+
+def test_search_matches_word_starts():
+    index = make_index()
+    assert names(index.search("TOM")) == [
+        "Tomato",
+        "Tomato paste",
+        "Cherry tomatoes",
+    ]
+    assert names(index.search("paste")) == ["Tomato paste"]
+    assert names(index.search("mato")) == []
+
+
+def test_search_matches_alias():
+    index = make_index()
+    assert index.search("egg") == [
+        {"id": 3, "name": "Aubergine", "alias": "Eggplant"}
+    ]
+
+
+def test_search_limit():
+    index = make_index()
+    assert names(index.search("tom", limit=1)) == ["Tomato"]
+    assert index.search("") == []
+
+
+def test_add_and_remove():
+    index = make_index()
+    index.add(5, "Tomatillo", None)
+    assert "Tomatillo" in names(index.search("tomati"))
+
+    # re-adding replaces the old keys
+    index.add(1, "Plum tomato", None)
+    assert names(index.search("plum")) == ["Plum tomato"]
+    assert "Plum tomato" in names(index.search("tomato"))
+
+    index.remove(2)
+    assert names(index.search("cherry")) == []
+    assert len(index) == 4
+
+
+def test_generation():
+    index = PrefixIndex()
+    assert index.generation is None
+    index.rebuild([(1, "Tomato", None)], generation=7)
+    assert index.generation == 7
+    index.clear()
+    assert index.generation is None
+
+
+def test_advance():
+    index = PrefixIndex()
+    index.advance(3)
+    assert index.generation is None
+    index.rebuild([(1, "Tomato", None)], generation=7)
+    index.advance(8)
+    assert index.generation == 8
+    # another write landed in between, so the index stays stale
+    index.advance(10)
+    assert index.generation == 8
+    index.advance(None)
+    assert index.generation == 8
+
+
+def test_rebuild_in_executor():
+    index = PrefixIndex()
+    asyncio.run(index.rebuild_in_executor([(1, "Tomato", None)], 7))
+    assert names(index.search("tom")) == ["Tomato"]
+    assert index.generation == 7
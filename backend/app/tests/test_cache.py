@@ -0,0 +1,66 @@
+from app.core.cache import PrincipalCache, TTLCache
+from app.db import schemas
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_principal(user_id: int) -> schemas.User:
+    return schemas.User(id=user_id, email=f"user{user_id}@email.com")
+
+
+def test_ttl_cache_expires_entries():
+    timer = FakeTimer()
+    cache = TTLCache(max_size=10, ttl=5, timer=timer)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=1)
+    assert cache.get("a") == 1
+    assert cache.get("b") == 2
+
+    timer.now = 2
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+    timer.now = 5
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["misses"] == 2
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_principal_cache_invalidates_every_token_of_user():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    cache.set("token1", make_principal(1))
+    cache.set("token2", make_principal(1))
+    cache.set("token3", make_principal(2))
+
+    cache.invalidate_user(1)
+    assert cache.get("token1") is None
+    assert cache.get("token2") is None
+    assert cache.get("token3").id == 2
+
+
+def test_principal_cache_skips_stale_set():
+    cache = PrincipalCache(max_size=10, ttl=60)
+    generation = cache.generation
+    # the user changes while their row is being loaded
+    cache.invalidate_user(1)
+    cache.set("token", make_principal(1), generation=generation)
+    assert cache.get("token") is None
+
@@ -0,0 +1,188 @@
+import asyncio
+import socketserver
+import threading
+import time
+import typing as t
+
+import dns.asyncresolver
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+import email_validator
+import pytest
+from app.core.cache import TTLCache
+from app.core.deliverability import DeliverabilityChecker
+from app.db import crud
+from email_validator import EmailUndeliverableError
+from fastapi import HTTPException
+
+TIMEOUT = 0.5
+
+# records served by the stub resolver, by name and type. Names it doesn't
+# know don't exist, and those of SLOW_DOMAINS are never answered.
+ZONE = {
+    ("mail.example.com.", "MX"): ["10 mx1.example.com."],
+    ("nomail.example.com.", "MX"): ["0 ."],
+    ("a-only.example.com.", "A"): ["192.0.2.1"],
+    ("aaaa-only.example.com.", "AAAA"): ["2001:db8::1"],
+    ("nosend.example.com.", "A"): ["192.0.2.2"],
+    ("nosend.example.com.", "TXT"): ['"v=spf1 -all"'],
+    ("empty.example.com.", "TXT"): ['"nothing here"'],
+}
+SLOW_DOMAINS = {"slow.example.com."}
+
+
+class StubResolverHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        query = dns.message.from_wire(data)
+        question = query.question[0]
+        name = question.name.to_text()
+        rdtype = dns.rdatatype.to_text(question.rdtype)
+        self.server.queries.append((name, rdtype))
+        if name in SLOW_DOMAINS:
+            return
+
+        response = dns.message.make_response(query)
+        if (name, rdtype) in ZONE:
+            response.answer.append(
+                dns.rrset.from_text(
+                    name, 300, "IN", rdtype, *ZONE[name, rdtype]
+                )
+            )
+        elif not any(known == name for known, _ in ZONE):
+            response.set_rcode(dns.rcode.NXDOMAIN)
+        sock.sendto(response.to_wire(), self.client_address)
+
+
+@pytest.fixture(scope="module")
+def stub_resolver() -> t.Iterator[socketserver.UDPServer]:
+    """A DNS server on localhost answering from ZONE"""
+    server = socketserver.ThreadingUDPServer(
+        ("127.0.0.1", 0), StubResolverHandler
+    )
+    server.queries = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_checker(
+    stub_resolver, failure_policy: str = "open"
+) -> DeliverabilityChecker:
+    def make_resolver():
+        resolver = dns.asyncresolver.Resolver(configure=False)
+        resolver.nameservers = ["127.0.0.1"]
+        resolver.port = stub_resolver.server_address[1]
+        resolver.lifetime = TIMEOUT
+        return resolver
+
+    stub_resolver.queries.clear()
+    return DeliverabilityChecker(
+        make_resolver,
+        TTLCache(max_size=100, ttl=60),
+        timeout=TIMEOUT,
+        failure_policy=failure_policy,
+    )
+
+
+@pytest.mark.parametrize(
+    "domain",
+    ["mail.example.com", "a-only.example.com", "aaaa-only.example.com"],
+)
+def test_deliverable_domains(stub_resolver, domain):
+    checker = make_checker(stub_resolver)
+    asyncio.run(checker.check(domain))
+
+
+@pytest.mark.parametrize(
+    "domain, reason",
+    [
+        ("missing.example.com", "does not exist"),
+        ("nomail.example.com", "does not accept email"),
+        ("empty.example.com", "does not accept email"),
+        ("nosend.example.com", "does not send email"),
+    ],
+)
+def test_undeliverable_domains(stub_resolver, domain, reason):
+    checker = make_checker(stub_resolver)
+    with pytest.raises(EmailUndeliverableError, match=reason):
+        asyncio.run(checker.check(domain))
+
+
+def test_results_are_cached_per_domain(stub_resolver):
+    checker = make_checker(stub_resolver)
+
+    async def check_twice():
+        for domain in ["mail.example.com", "missing.example.com"] * 2:
+            try:
+                await checker.check(domain)
+            except EmailUndeliverableError:
+                pass
+
+    asyncio.run(check_twice())
+    assert stub_resolver.queries == [
+        ("mail.example.com.", "MX"),
+        ("missing.example.com.", "MX"),
+    ]
+    assert checker.stats()["lookups"] == 2
+    assert checker.stats()["hits"] == 2
+
+
+def test_timeout_doesnt_block_the_event_loop(stub_resolver):
+    checker = make_checker(stub_resolver)
+
+    async def check_while_ticking():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        started = time.monotonic()
+        await checker.check("slow.example.com")
+        elapsed = time.monotonic() - started
+        ticker.cancel()
+        return elapsed, ticks
+
+    elapsed, ticks = asyncio.run(check_while_ticking())
+    assert TIMEOUT <= elapsed < TIMEOUT + 0.25
+    assert ticks >= TIMEOUT / 0.01 / 2
+    assert checker.stats()["failures"] == 1
+
+
+def test_failure_policies(stub_resolver):
+    # open: the address is accepted, and the domain is looked up again
+    checker = make_checker(stub_resolver, failure_policy="open")
+    asyncio.run(checker.check("slow.example.com"))
+    asyncio.run(checker.check("slow.example.com"))
+    assert checker.stats()["lookups"] == 2
+
+    checker = make_checker(stub_resolver, failure_policy="closed")
+    with pytest.raises(EmailUndeliverableError, match="try again later"):
+        asyncio.run(checker.check("slow.example.com"))
+
+    with pytest.raises(ValueError):
+        make_checker(stub_resolver, failure_policy="ajar")
+
+
+def test_check_valid_email(stub_resolver, monkeypatch):
+    monkeypatch.setattr(email_validator, "TEST_ENVIRONMENT", False)
+    monkeypatch.setattr(
+        crud, "deliverability_checker", make_checker(stub_resolver)
+    )
+
+    assert (
+        asyncio.run(crud.check_valid_email("Someone@Mail.Example.com"))
+        == "Someone@mail.example.com"
+    )
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(crud.check_valid_email("someone@missing.example.com"))
+    assert e.value.status_code == 400
+    assert "does not exist" in e.value.detail
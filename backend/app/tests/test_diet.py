@@ -0,0 +1,32 @@
+from app.db import models
+from app.db.diet import (ALL_DIETS, DietFlag, compatible_masks, diet_mask,
+                         diet_names, requirements_mask)
+
+
+def test_diet_mask_round_trip():
+    mask = diet_mask(["vegan", "nut_free"])
+    assert mask == DietFlag.VEGAN | DietFlag.NUT_FREE
+    assert diet_names(mask) == ["vegan", "nut_free"]
+    assert diet_names(0) is None
+    assert diet_names(ALL_DIETS) == [flag.name.lower() for flag in DietFlag]
+
+
+def test_requirements_mask():
+    requirements = models.UserDietRequirements(
+        is_vegetarian=True, is_gluten_free=True, is_vegan=False
+    )
+    assert requirements_mask(requirements) == (
+        DietFlag.VEGETARIAN | DietFlag.GLUTEN_FREE
+    )
+    assert requirements_mask(None) == 0
+
+
+def test_compatible_masks():
+    required = DietFlag.VEGAN | DietFlag.NUT_FREE
+    masks = compatible_masks(required)
+    assert masks == [
+        mask for mask in range(ALL_DIETS + 1) if mask & required == required
+    ]
+    assert len(masks) == 2 ** (len(DietFlag) - 2)
+    assert ALL_DIETS in masks
+    assert compatible_masks(0) == list(range(ALL_DIETS + 1))
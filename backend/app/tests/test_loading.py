@@ -0,0 +1,17 @@
+import pytest
+from app.db import models
+from app.db.loading import eager
+from sqlalchemy.orm import strategy_options
+
+
+def test_eager_builds_one_option_per_relationship():
+    options = eager(
+        models.Meal.ingredients, models.Meal.user, strategy="joined"
+    )
+    assert len(options) == 2
+    assert all(isinstance(o, strategy_options.Load) for o in options)
+
+
+def test_eager_unknown_strategy():
+    with pytest.raises(ValueError):
+        eager(models.Meal.ingredients, strategy="eventually")
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+from app.db import models
+from app.db.crud import INGREDIENT_ROW
+from app.db.pagination import decode_cursor, encode_cursor, paginate
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor([0.36363637, 42])
+    assert decode_cursor(cursor, 2) == [0.36363637, 42]
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor([1, 2])])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as e:
+        decode_cursor(cursor, 1)
+    assert e.value.status_code == 400
+
+
+def test_paginate_entities_and_projections(
+    test_async_engine, test_ingredients
+):
+    async def pages(query):
+        async with AsyncSession(test_async_engine) as db:
+            first = await paginate(db, query, [models.Ingredient.id], limit=1)
+            second = await paginate(
+                db, query, [models.Ingredient.id], first.next_cursor, limit=1
+            )
+        return first.items + second.items
+
+    ingredients = asyncio.run(pages(select(models.Ingredient)))
+    assert all(isinstance(i, models.Ingredient) for i in ingredients)
+    assert [i.name for i in ingredients] == [
+        ingredient.name for ingredient in test_ingredients
+    ]
+
+    rows = asyncio.run(pages(INGREDIENT_ROW.select()))
+    assert rows == [(i.id, i.name, None, 0) for i in test_ingredients]
@@ -0,0 +1,186 @@
+from app import tasks
+from app.core import planner
+from app.core.celery_app import (BATCH_PRIORITY, BATCH_QUEUE,
+                                 INTERACTIVE_QUEUE, celery_app)
+from app.db import models
+from app.db.diet import diet_mask
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+
+def incidence(meals):
+    return planner.Incidence.from_pairs(
+        meals.keys(),
+        [
+            (meal, ingredient)
+            for meal, ingredients in meals.items()
+            for ingredient in ingredients
+        ],
+    )
+
+
+def test_incidence_from_pairs():
+    matrix = planner.Incidence.from_pairs(
+        [30, 10, 20], [(10, 7), (10, 7), (30, 5), (10, 5), (40, 5)]
+    )
+    assert matrix.shape == (3, 2)
+    assert matrix.meal_ids.tolist() == [10, 20, 30]
+    assert matrix.ingredient_ids.tolist() == [5, 7]
+    assert list(zip(matrix.rows, matrix.columns)) == [(0, 0), (0, 1), (2, 0)]
+
+
+def test_pick_meals_reuses_ingredients():
+    matrix = incidence(
+        {
+            1: [100, 101],
+            2: [200, 201, 202],
+            3: [100, 101, 102],
+            4: [100, 102],
+            5: [300],
+        }
+    )
+    picks = planner.pick_meals(matrix, 3)
+    # starts from common ingredients, then adds the meals that need the
+    # fewest new ones
+    assert matrix.meal_ids[picks].tolist() == [1, 3, 4]
+
+
+def test_pick_meals_without_repeats():
+    matrix = incidence({1: [100], 2: [100]})
+    assert sorted(planner.pick_meals(matrix, 5).tolist()) == [0, 1]
+    assert planner.pick_meals(incidence({}), 5).tolist() == []
+
+
+def test_generate_plan(test_db, test_user, test_superuser, test_ingredients):
+    vegan = diet_mask(["vegetarian", "vegan"])
+    test_ingredients[0].diet_mask = vegan
+    other_user = models.User(email="other@email.com", hashed_password="x")
+    test_db.add(other_user)
+    test_db.flush()
+    for name, user, ingredients in (
+        ("Own", test_user, test_ingredients[:1]),
+        ("Own with non vegan", test_user, test_ingredients),
+        ("Public", test_superuser, test_ingredients[:1]),
+        ("Private", other_user, test_ingredients[:1]),
+    ):
+        test_db.add(
+            models.Meal(name=name, user_id=user.id, ingredients=ingredients)
+        )
+    test_user.diet_requirements.is_vegan = True
+    test_db.commit()
+    meals = {meal.name: meal.id for meal in test_db.query(models.Meal)}
+
+    plan = planner.generate_plan(test_db, test_user.id, meals_per_day=1)
+    assert plan == {
+        "user_id": test_user.id,
+        "days": [[meals["Own"]], [meals["Public"]], [], [], [], [], []],
+        "ingredients": 1,
+    }
+
+
+def test_generate_plan_skips_meals_without_ingredients(
+    test_db, test_user, test_ingredients
+):
+    test_db.add_all(
+        [
+            models.Meal(name="Empty", user_id=test_user.id),
+            models.Meal(
+                name="First",
+                user_id=test_user.id,
+                ingredients=test_ingredients[:1],
+            ),
+            models.Meal(
+                name="Second",
+                user_id=test_user.id,
+                ingredients=test_ingredients[1:],
+            ),
+        ]
+    )
+    test_db.commit()
+    meals = {meal.name: meal.id for meal in test_db.query(models.Meal)}
+
+    plan = planner.generate_plan(test_db, test_user.id, meals_per_day=2)
+    assert sorted(plan["days"][0]) == sorted(
+        [meals["First"], meals["Second"]]
+    )
+    assert plan["ingredients"] == 2
+
+
+def test_generate_meal_plan_task(
+    test_db, test_user, test_ingredients, monkeypatch
+):
+    monkeypatch.setattr(
+        tasks, "SessionLocal", sessionmaker(bind=test_db.get_bind())
+    )
+    test_db.add(
+        models.Meal(
+            name="Meal", user_id=test_user.id, ingredients=test_ingredients
+        )
+    )
+    test_db.commit()
+    meal_id = test_db.query(models.Meal.id).scalar()
+
+    plan = tasks.generate_meal_plan(test_user.id, meals_per_day=2)
+    assert plan["days"] == [[meal_id], [], [], [], [], [], []]
+
+
+def test_plan_all_users(
+    test_db, test_user, test_superuser, test_ingredients, monkeypatch
+):
+    monkeypatch.setattr(
+        tasks, "SessionLocal", sessionmaker(bind=test_db.get_bind())
+    )
+    # the chord runs its shards and callback in process
+    monkeypatch.setattr(celery_app.conf, "task_always_eager", True)
+    inactive = models.User(
+        email="inactive@email.com", hashed_password="x", is_active=False
+    )
+    others = [
+        models.User(email=f"other{i}@email.com", hashed_password="x")
+        for i in range(3)
+    ]
+    test_db.add_all([inactive, *others])
+    test_db.add(
+        models.Meal(
+            name="Public",
+            user_id=test_superuser.id,
+            ingredients=test_ingredients[:1],
+        )
+    )
+    test_db.flush()
+    test_db.add(
+        models.MealPlan(user_id=inactive.id, days=[[1]] * 7, ingredients=1)
+    )
+    test_db.commit()
+    meal_id = test_db.scalar(select(models.Meal.id))
+
+    assert tasks.plan_all_users(shard_size=2) == {"users": 5, "shards": 3}
+
+    test_db.expire_all()
+    plans = {plan.user_id: plan for plan in test_db.query(models.MealPlan)}
+    assert plans.keys() == {
+        test_user.id,
+        test_superuser.id,
+        *(user.id for user in others),
+    }
+    assert plans[test_user.id].days == [[meal_id], [], [], [], [], [], []]
+    assert plans[test_user.id].ingredients == 1
+
+    # a second run replaces the plans
+    generated_at = plans[test_user.id].generated_at
+    tasks.plan_all_users()
+    test_db.expire_all()
+    plans = {plan.user_id: plan for plan in test_db.query(models.MealPlan)}
+    assert len(plans) == 5
+    assert plans[test_user.id].generated_at > generated_at
+
+
+def test_batch_tasks_are_routed_apart():
+    def queue(name):
+        return celery_app.amqp.router.route({}, name)["queue"].name
+
+    for name in ["plan_all_users", "plan_users", "finish_plans"]:
+        assert queue(f"app.tasks.{name}") == BATCH_QUEUE
+        assert getattr(tasks, name).priority == BATCH_PRIORITY
+    for name in ["generate_meal_plan", "suggest_meals", "example_task"]:
+        assert queue(f"app.tasks.{name}") == INTERACTIVE_QUEUE
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+from app.db.pool import InstrumentedQueuePool, pool_status
+from sqlalchemy import exc
+
+
+def make_pool(**kwargs) -> InstrumentedQueuePool:
+    return InstrumentedQueuePool(
+        lambda: sqlite3.connect(":memory:"), **kwargs
+    )
+
+
+def test_pool_status_tracks_checkouts():
+    pool = make_pool(pool_size=1, max_overflow=1)
+    first = pool.connect()
+    second = pool.connect()
+
+    status = pool_status(pool)
+    assert status["checked_out"] == 2
+    assert status["overflow"] == 1
+    assert status["wait_time"]["count"] == 2
+
+    first.close()
+    second.close()
+    status = pool_status(pool)
+    assert status["checked_out"] == 0
+    assert status["checked_in"] == 1
+
+
+def test_pool_status_counts_timeouts():
+    pool = make_pool(pool_size=1, max_overflow=0, timeout=0.01)
+    connection = pool.connect()
+
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+
+    status = pool_status(pool)
+    assert status["checkout_timeouts"] == 1
+    assert status["checkout_errors"] == 0
+    # the failed checkout waited for the whole timeout
+    assert status["wait_time"]["count"] == 2
+    assert status["wait_time"]["sum"] >= 0.01
+    connection.close()
+
+
+def test_pool_stats_survive_recreate():
+    pool = make_pool(pool_size=1)
+    pool.connect().close()
+    new_pool = pool.recreate()
+    assert new_pool.stats is pool.stats
+    assert pool_status(new_pool)["wait_time"]["count"] == 1
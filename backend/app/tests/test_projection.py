@@ -0,0 +1,27 @@
+import orjson
+from app.db import models
+from app.db.projection import Projection, json_response
+
+
+def test_projection_dicts_leave_out_none():
+    projection = Projection(
+        models.Ingredient.id, models.Ingredient.name, models.Ingredient.alias
+    )
+    assert projection.fields == ("id", "name", "alias")
+    assert projection.dicts([(1, "Basil", None), (2, "Chickpea", "Gram")]) == [
+        {"id": 1, "name": "Basil"},
+        {"id": 2, "name": "Chickpea", "alias": "Gram"},
+    ]
+
+
+def test_projection_of_table_columns_encodes():
+    projection = Projection(models.MealIngredient.c.meal_id)
+    rows = projection.dicts([(1,)])
+    assert orjson.loads(json_response(rows).body) == [{"meal_id": 1}]
+
+
+def test_json_response():
+    response = json_response([{"id": 1}], {"X-Next-Cursor": "abc"})
+    assert response.media_type == "application/json"
+    assert response.headers["x-next-cursor"] == "abc"
+    assert orjson.loads(response.body) == [{"id": 1}]
@@ -0,0 +1,260 @@
+import asyncio
+import contextlib
+import json
+import typing as t
+
+import pytest
+from app.core import planner
+from app.db import crud, schemas
+from app.db.diet import DietFlag
+from app.db.models import has_trigram_ops
+from app.db.session import Base
+from conftest import get_async_test_db_url, get_test_db_url
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+USERS = 10_000
+INGREDIENTS = 20_000
+MEALS = 50_000
+INGREDIENTS_PER_MEAL = 8
+
+# Every seeded table is big enough that a sequential scan of it on a hot
+# path is a missing index, not the planner's best choice for a tiny table
+LARGE_TABLES = {
+    "user",
+    "user_diet_requirements",
+    "ingredient",
+    "meal",
+    "meal_ingredient",
+}
+
+SEED = f"""
+INSERT INTO "user" (email, name, hashed_password, is_active, is_superuser,
+                    is_verified)
+SELECT 'user' || i || '@example.com', 'User ' || i, 'x', true, i % 100 = 0,
+       true
+FROM generate_series(1, {USERS}) AS i;
+
+INSERT INTO user_diet_requirements (user_id, is_vegetarian, is_vegan,
+                                    is_gluten_free, is_dairy_free,
+                                    is_nut_free, is_shellfish_free,
+                                    is_pescatarian)
+SELECT id, id % 3 = 0, id % 7 = 0, id % 5 = 0, id % 11 = 0, id % 13 = 0,
+       false, false
+FROM "user";
+
+INSERT INTO ingredient (name, alias, diet_mask)
+SELECT 'ingredient ' || i, CASE WHEN i % 3 = 0 THEN 'alias ' || i END,
+       (i * 37) % 128
+FROM generate_series(1, {INGREDIENTS}) AS i;
+
+INSERT INTO meal (name, description, user_id)
+SELECT 'meal ' || i, 'description ' || i, 1 + i % {USERS}
+FROM generate_series(1, {MEALS}) AS i;
+
+-- the masks are backfilled below in one statement, rather than by the
+-- triggers for every meal
+ALTER TABLE meal_ingredient DISABLE TRIGGER USER;
+INSERT INTO meal_ingredient (meal_id, ingredient_id, quantity, unit)
+SELECT meal, 1 + (meal * 7919 + k * 104729) % {INGREDIENTS}, k * 10, 'g'
+FROM generate_series(1, {MEALS}) AS meal,
+     generate_series(1, {INGREDIENTS_PER_MEAL}) AS k;
+ALTER TABLE meal_ingredient ENABLE TRIGGER USER;
+
+UPDATE meal SET diet_mask = masks.diet_mask
+FROM (
+    SELECT meal_ingredient.meal_id, bit_and(ingredient.diet_mask) AS diet_mask
+    FROM meal_ingredient
+    JOIN ingredient ON ingredient.id = meal_ingredient.ingredient_id
+    GROUP BY meal_ingredient.meal_id
+) AS masks
+WHERE meal.id = masks.meal_id;
+
+ANALYZE;
+"""
+
+# served by the trigram indexes, which need pg_trgm's GIN operator class
+NAME_SEARCHES = {"get_ingredients_like_name", "get_meals_like_name"}
+
+USER_ID = 500
+# meal i belongs to user 1 + i % USERS
+USER_MEAL_IDS = list(range(USER_ID - 1, MEALS + 1, USERS))
+MEAL_ID = USER_MEAL_IDS[2]
+INGREDIENT_ID = 12_500
+
+EXPLAIN = "EXPLAIN (ANALYZE, FORMAT JSON) "
+# writes are explained too, INSERTs don't scan
+QUERIES = ("SELECT", "UPDATE", "DELETE")
+
+# The queries crud sends on the API's hot paths. Exports and the
+# autocomplete index rebuild read whole tables by design.
+CRUD_QUERIES = {
+    "get_user": lambda db: crud.get_user(db, USER_ID),
+    "get_user_by_email": lambda db: crud.get_user_by_email(
+        db, f"user{USER_ID}@example.com"
+    ),
+    "get_all_users": lambda db: crud.get_all_users(
+        db, projection=crud.USER_ROW
+    ),
+    "get_user_diet_requirements": lambda db: crud.get_user_diet_requirements(
+        db, USER_ID
+    ),
+    "get_ingredient": lambda db: crud.get_ingredient(db, INGREDIENT_ID),
+    "resolve_ingredients": lambda db: crud.resolve_ingredients(
+        db, [1, INGREDIENT_ID, INGREDIENTS]
+    ),
+    "get_all_ingredients": lambda db: crud.get_all_ingredients(
+        db, projection=crud.INGREDIENT_ROW
+    ),
+    "get_ingredients_like_name": lambda db: crud.get_ingredients_like_name(
+        db, f"ingredient {INGREDIENT_ID}", projection=crud.INGREDIENT_ROW
+    ),
+    "edit_ingredient": lambda db: crud.edit_ingredient(
+        db, INGREDIENT_ID, schemas.IngredientEdit(diets=["vegan"])
+    ),
+    "delete_ingredient": lambda db: crud.delete_ingredient(db, INGREDIENT_ID),
+    "get_meal": lambda db: crud.get_meal(db, MEAL_ID),
+    "get_all_meals": lambda db: crud.get_all_meals(
+        db, user_id=USER_ID, projection=crud.MEAL_ROW
+    ),
+    "get_all_meals_compatible": lambda db: crud.get_all_meals(
+        db,
+        user_id=USER_ID,
+        projection=crud.MEAL_ROW,
+        compatible_with=DietFlag.VEGAN | DietFlag.GLUTEN_FREE,
+    ),
+    "get_meals_like_name": lambda db: crud.get_meals_like_name(
+        db, f"meal {MEAL_ID}", user_id=USER_ID, projection=crud.MEAL_ROW
+    ),
+    "get_meal_ingredient_rows": lambda db: crud.get_meal_ingredient_rows(
+        db, USER_MEAL_IDS
+    ),
+    "get_shopping_list": lambda db: crud.get_shopping_list(
+        db,
+        USER_MEAL_IDS,
+        schemas.User(id=USER_ID, email=f"user{USER_ID}@example.com"),
+    ),
+    "create_meal": lambda db: crud.create_meal(
+        db,
+        schemas.MealCreate(
+            name="new meal", ingredients=[{"id": 1, "quantity": 2}, 2]
+        ),
+        USER_ID,
+    ),
+    "edit_meal": lambda db: crud.edit_meal(
+        db,
+        MEAL_ID,
+        schemas.MealEdit(name="renamed meal", ingredients=[1, 2]),
+        USER_ID,
+    ),
+    "delete_meal": lambda db: crud.delete_meal(db, MEAL_ID, USER_ID),
+}
+
+
+@pytest.fixture(scope="module")
+def seeded_db() -> bool:
+    """
+    The test database filled with a realistic number of rows, for this
+    module only. Yields whether the name search indexes were created.
+    """
+    engine = create_engine(get_test_db_url())
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        trigram_indexes = has_trigram_ops(None, None, connection)
+        connection.execute(text(SEED))
+
+    yield trigram_indexes
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@contextlib.contextmanager
+def recorded_statements(engine) -> t.Iterator[t.List[t.Tuple[str, t.Any]]]:
+    """The queries sent through the engine, with their parameters"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith(QUERIES):
+            # an executemany is explained with its first set of parameters
+            if isinstance(parameters, list):
+                parameters = parameters[0]
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def seq_scans(plan: t.Dict) -> t.Iterator[str]:
+    if plan["Node Type"] == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+def check_plan(statement: str, explained) -> None:
+    if isinstance(explained, str):
+        explained = json.loads(explained)
+    tables = set(seq_scans(explained[0]["Plan"])) & LARGE_TABLES
+    assert not tables, (
+        f"Sequential scan of {', '.join(sorted(tables))} in:\n"
+        f"{statement}\n{json.dumps(explained, indent=2)}"
+    )
+
+
+async def explain_crud(scenario) -> int:
+    """
+    Run a crud scenario in a transaction that is rolled back afterwards, so
+    its writes don't change the data of the next one, then EXPLAIN ANALYZE
+    each of its queries with the same parameters. Returns the number of
+    queries checked.
+    """
+    engine = create_async_engine(get_async_test_db_url(), poolclass=NullPool)
+    try:
+        async with engine.connect() as connection:
+            await connection.begin()
+            with recorded_statements(engine.sync_engine) as statements:
+                # crud's commits only release a savepoint
+                async with AsyncSession(
+                    bind=connection,
+                    expire_on_commit=False,
+                    join_transaction_mode="create_savepoint",
+                ) as db:
+                    await scenario(db)
+
+            for statement, parameters in statements:
+                result = await connection.exec_driver_sql(
+                    EXPLAIN + statement, parameters
+                )
+                check_plan(statement, result.scalar())
+            await connection.rollback()
+    finally:
+        await engine.dispose()
+    return len(statements)
+
+
+@pytest.mark.parametrize("name", CRUD_QUERIES)
+def test_crud_query_plans(seeded_db, name):
+    if name in NAME_SEARCHES and not seeded_db:
+        pytest.skip("pg_trgm has no GIN operator class in this database")
+    assert asyncio.run(explain_crud(CRUD_QUERIES[name]))
+
+
+def test_planner_query_plans(seeded_db):
+    engine = create_engine(get_test_db_url())
+    with engine.connect() as connection:
+        with recorded_statements(engine) as statements:
+            with Session(bind=connection) as db:
+                planner.load_candidates(db, USER_ID)
+
+        assert statements
+        for statement, parameters in statements:
+            result = connection.exec_driver_sql(EXPLAIN + statement, parameters)
+            check_plan(statement, result.scalar())
+        connection.rollback()
+    engine.dispose()
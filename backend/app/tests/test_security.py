@@ -0,0 +1,49 @@
+import asyncio
+
+from app.core import security
+from app.db import models
+from passlib.hash import bcrypt
+
+
+def test_password_hasher_records_queue_time():
+    hasher = security.PasswordHasher(max_workers=1)
+
+    async def hash_many():
+        return await asyncio.gather(
+            *(hasher.run(bcrypt.using(rounds=4).hash, "pass") for _ in range(3))
+        )
+
+    hashes = asyncio.run(hash_many())
+    assert all(bcrypt.verify("pass", h) for h in hashes)
+    stats = hasher.stats()
+    assert stats["queued"] == stats["running"] == 0
+    assert stats["queue_time"]["count"] == 3
+    assert stats["run_time"]["count"] == 3
+    # with one worker the later calls had to wait for the earlier ones
+    assert stats["queue_time"]["sum"] > 0
+
+
+def test_password_needs_rehash():
+    assert not security.password_needs_rehash(
+        security.get_password_hash("pass")
+    )
+    assert security.password_needs_rehash(bcrypt.using(rounds=4).hash("pass"))
+    # unknown hashes are left alone
+    assert not security.password_needs_rehash("supersecrethash")
+
+
+def test_rehash_on_login(client, test_db):
+    old_hash = bcrypt.using(rounds=4).hash("pass")
+    user = models.User(email="rehash@email.com", hashed_password=old_hash)
+    test_db.add(user)
+    test_db.commit()
+
+    response = client.post(
+        "/api/token", data={"username": user.email, "password": "pass"}
+    )
+    assert response.status_code == 200
+
+    test_db.refresh(user)
+    assert user.hashed_password != old_hash
+    assert not security.password_needs_rehash(user.hashed_password)
+    assert security.verify_password("pass", user.hashed_password)
@@ -0,0 +1,27 @@
+def test_no_session_without_db(client, db_checkouts):
+    response = client.get("/api/v1")
+    assert response.status_code == 200
+    assert db_checkouts["checkout"] == 0
+
+
+def test_one_checkout_per_request(
+    client, test_meals, user_token_headers, db_checkouts
+):
+    db_checkouts["checkout"] = db_checkouts["checkin"] = 0
+    response = client.get("/api/v1/meals/me", headers=user_token_headers)
+    assert response.status_code == 200
+    # the auth dependency and the handler share the same connection
+    assert db_checkouts["checkout"] == 1
+    assert db_checkouts["checkin"] == 1
+
+
+def test_connection_released_on_error(
+    client, superuser_token_headers, db_checkouts
+):
+    db_checkouts["checkout"] = db_checkouts["checkin"] = 0
+    response = client.get(
+        "/api/v1/meals/4321", headers=superuser_token_headers
+    )
+    assert response.status_code == 404
+    assert db_checkouts["checkout"] == 1
+    assert db_checkouts["checkin"] == 1
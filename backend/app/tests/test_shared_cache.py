@@ -0,0 +1,108 @@
+import asyncio
+import socket
+import time
+
+import fakeredis
+import fakeredis.aioredis
+from app.core import config
+from app.core.shared_cache import SharedCache, connect
+
+
+def make_cache() -> SharedCache:
+    server = fakeredis.FakeServer()
+    return SharedCache(lambda: fakeredis.aioredis.FakeRedis(server=server))
+
+
+def test_get_or_load_caches_until_invalidated():
+    cache = make_cache()
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {"value": len(loads)}
+
+    async def get(scope="user:1"):
+        return await cache.get_or_load("thing", "", [scope], 60, load)
+
+    async def scenario():
+        assert await get() == {"value": 1}
+        assert await get() == {"value": 1}
+        # other scopes keep their entries
+        await get("user:2")
+        await cache.invalidate("user:1")
+        assert await get() == {"value": 3}
+        assert await get("user:2") == {"value": 2}
+
+    asyncio.run(scenario())
+    assert cache.stats() == {
+        "hits": 2,
+        "misses": 3,
+        "errors": 0,
+        "hit_ratio": 0.4,
+    }
+
+
+def test_invalidation_during_load_is_not_undone():
+    cache = make_cache()
+
+    async def scenario():
+        async def stale_load():
+            # a write commits and invalidates while this load runs
+            await cache.invalidate("user:1")
+            return "stale"
+
+        async def fresh_load():
+            return "fresh"
+
+        assert (
+            await cache.get_or_load("thing", "", ["user:1"], 60, stale_load)
+            == "stale"
+        )
+        assert (
+            await cache.get_or_load("thing", "", ["user:1"], 60, fresh_load)
+            == "fresh"
+        )
+
+    asyncio.run(scenario())
+
+
+def test_unresponsive_redis_degrades_to_loads(monkeypatch):
+    # connections are accepted into the backlog, but never answered
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    host, port = server.getsockname()
+    monkeypatch.setattr(config, "CACHE_REDIS_URL", f"redis://{host}:{port}/0")
+    monkeypatch.setattr(config, "CACHE_REDIS_TIMEOUT", 0.2)
+    cache = SharedCache(connect)
+
+    async def load():
+        return "loaded"
+
+    async def get():
+        started = time.monotonic()
+        value = await cache.get_or_load("thing", "", ["user:1"], 60, load)
+        return value, time.monotonic() - started
+
+    try:
+        value, elapsed = asyncio.run(get())
+    finally:
+        server.close()
+    assert value == "loaded"
+    assert elapsed < 1
+    assert cache.stats()["errors"] == 1
+
+
+def test_generation():
+    cache = make_cache()
+
+    async def scenario():
+        first = await cache.generation("ingredients")
+        assert await cache.generation("ingredients") == first
+        await cache.invalidate("ingredients")
+        assert await cache.generation("ingredients") == first + 1
+        # a scope starts at a random generation, not one issued before
+        # Redis lost its data
+        assert await cache.generation("other") != first
+
+    asyncio.run(scenario())
@@ -0,0 +1,135 @@
+import asyncio
+import time
+
+import pytest
+import requests
+from app import tasks
+from app.core import config, suggestions
+from app.core.llm import LLMClient
+from app.core.shared_cache import shared_cache
+from app.db import models
+from app.db.diet import DietFlag
+from sqlalchemy import select
+
+LATENCY = 0.3
+
+
+def make_job(*ingredient_ids: int, diet_mask: int = 0):
+    return suggestions.SuggestionJob(
+        key=suggestions.suggestion_key(diet_mask, ingredient_ids),
+        diet_mask=diet_mask,
+        ingredient_ids=sorted(set(ingredient_ids)),
+        ingredients=[f"ingredient {id}" for id in sorted(set(ingredient_ids))],
+    )
+
+
+def enqueue(*jobs) -> list:
+    async def enqueue_all():
+        return [
+            await suggestions.enqueue(shared_cache.redis, job) for job in jobs
+        ]
+
+    return asyncio.run(enqueue_all())
+
+
+def test_suggestion_key():
+    key = suggestions.suggestion_key(0, [3, 1, 2])
+    assert key == suggestions.suggestion_key(0, [1, 2, 3, 2])
+    assert key != suggestions.suggestion_key(0, [1, 2])
+    assert key != suggestions.suggestion_key(DietFlag.VEGAN, [1, 2, 3])
+
+
+def test_parse_results_skips_invalid():
+    jobs = [make_job(1), make_job(2), make_job(3)]
+    content = (
+        '{"results": ['
+        '{"id": 0, "meals": [{"name": "Soup", "description": "Hot."}]},'
+        '{"id": 1, "meals": [{"description": "No name."}]},'
+        '{"id": 7, "meals": [{"name": "Stew"}]},'
+        '{"id": 2, "meals": []}'
+        "]}"
+    )
+    assert suggestions.parse_results(content, jobs) == {
+        jobs[0].key: [{"name": "Soup", "description": "Hot."}]
+    }
+    assert suggestions.parse_results("not json", jobs) == {}
+
+
+def test_same_prompts_are_coalesced(shared_cache_redis):
+    job = make_job(1, 2)
+    assert enqueue(job, job, make_job(2, 1)) == [True, False, False]
+    assert shared_cache_redis.llen(suggestions.QUEUE_KEY) == 1
+
+    async def is_pending():
+        return await suggestions.is_pending(shared_cache.redis, job.key)
+
+    assert asyncio.run(is_pending())
+
+
+def test_prompts_are_batched_and_stored(test_db, shared_cache_redis, mock_llm):
+    jobs = [make_job(i, i + 1) for i in range(10)]
+    enqueue(*jobs)
+    client = LLMClient(mock_llm.url, config.LLM_MODEL)
+
+    reports = []
+    while report := suggestions.process_batch(
+        test_db, shared_cache_redis, client, size=4
+    ):
+        reports.append(report)
+
+    assert [report.prompts for report in reports] == [4, 4, 2]
+    assert [report.stored for report in reports] == [4, 4, 2]
+    assert mock_llm.stats()["requests"] == 3
+    assert mock_llm.stats()["prompt_tokens"] == sum(
+        report.prompt_tokens for report in reports
+    )
+    # no longer in flight, so a later request is queued again if need be
+    assert not any(
+        shared_cache_redis.exists(suggestions.pending_key(job.key))
+        for job in jobs
+    )
+
+    stored = test_db.scalars(select(models.MealSuggestion)).all()
+    assert {row.key for row in stored} == {job.key for job in jobs}
+    row = next(row for row in stored if row.key == jobs[3].key)
+    assert row.ingredient_ids == [3, 4]
+    assert len(row.suggestions) == config.SUGGESTIONS_PER_PROMPT
+    assert "ingredient 3" in row.suggestions[0]["description"]
+
+
+def test_batch_costs_one_round_trip(test_db, shared_cache_redis, mock_llm):
+    mock_llm.latency = LATENCY
+    enqueue(*(make_job(i) for i in range(4)))
+    client = LLMClient(mock_llm.url, config.LLM_MODEL)
+
+    started = time.monotonic()
+    report = suggestions.process_batch(test_db, shared_cache_redis, client)
+    elapsed = time.monotonic() - started
+
+    assert report.stored == 4
+    assert LATENCY <= elapsed < 2 * LATENCY
+
+
+def test_failed_batch_can_be_requested_again(test_db, shared_cache_redis):
+    job = make_job(1)
+    enqueue(job)
+    # nothing listens on the port of a closed server
+    client = LLMClient("http://127.0.0.1:9/v1", config.LLM_MODEL, timeout=1)
+
+    with pytest.raises(requests.RequestException):
+        suggestions.process_batch(test_db, shared_cache_redis, client)
+
+    assert not test_db.scalars(select(models.MealSuggestion)).all()
+    assert enqueue(job) == [True]
+
+
+def test_suggest_meals_task(test_db, suggestion_worker):
+    enqueue(make_job(1), make_job(2))
+
+    report = tasks.suggest_meals()
+    assert report["prompts"] == 2
+    assert report["stored"] == 2
+    assert report["completion_tokens"] > 0
+    # the run scheduled by the second prompt finds the queue empty
+    assert tasks.suggest_meals() is None
+    assert suggestion_worker.stats()["requests"] == 1
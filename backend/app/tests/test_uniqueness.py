@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from app.db import crud, models, schemas
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def create_concurrently(engine, create, writers: int = 8):
+    """
+    Run `create` in `writers` sessions at once, each on its own connection.
+    Returns the status code of each: 200 when it succeeded.
+    """
+
+    async def write():
+        async with AsyncSession(engine, expire_on_commit=False) as db:
+            try:
+                await create(db)
+            except HTTPException as e:
+                return e.status_code
+            return 200
+
+    async def run():
+        return await asyncio.gather(*(write() for _ in range(writers)))
+
+    return asyncio.run(run())
+
+
+def test_concurrent_ingredient_creates(test_async_engine, test_db):
+    statuses = create_concurrently(
+        test_async_engine,
+        lambda db: crud.create_ingredient(
+            db, schemas.IngredientCreate(name="Saffron")
+        ),
+    )
+    assert sorted(statuses) == [200] + [409] * 7
+    assert (
+        test_db.scalar(
+            select(func.count()).filter(models.Ingredient.name == "Saffron")
+        )
+        == 1
+    )
+
+
+def test_concurrent_meal_creates(test_async_engine, test_db, test_user):
+    statuses = create_concurrently(
+        test_async_engine,
+        lambda db: crud.create_meal(
+            db, schemas.MealCreate(name="Paella"), test_user.id
+        ),
+    )
+    assert sorted(statuses) == [200] + [409] * 7
+    assert (
+        test_db.scalar(
+            select(func.count()).filter(
+                models.Meal.user_id == test_user.id,
+                models.Meal.name == "Paella",
+            )
+        )
+        == 1
+    )
+
+
+def test_other_integrity_errors_are_not_conflicts(test_async_engine, test_db):
+    async def create_orphan():
+        async with AsyncSession(test_async_engine) as db:
+            db.add(models.Meal(name="Orphan", user_id=1234))
+            async with crud.unique_or_conflict(db, "Meal already exists"):
+                await db.commit()
+
+    # a foreign key violation is not a conflict, it propagates
+    with pytest.raises(IntegrityError) as e:
+        asyncio.run(create_orphan())
+    assert not crud.is_unique_violation(e.value)
+
+
+
+def test_meals_of_missing_user_not_found(test_async_engine, test_db):
+    async def create(create):
+        async with AsyncSession(test_async_engine) as db:
+            await create(db)
+
+    # the meal's foreign key finds the user missing, without a lookup
+    for create_meals in (
+        lambda db: crud.create_meal(db, schemas.MealCreate(name="A"), 1234),
+        lambda db: crud.create_meals(db, [schemas.MealCreate(name="A")], 1234),
+    ):
+        with pytest.raises(HTTPException) as e:
+            asyncio.run(create(create_meals))
+        assert e.value.status_code == 404
+        assert e.value.detail == "User not found"
+    assert test_db.scalar(select(func.count(models.Meal.id))) == 0
@@ -0,0 +1,25 @@
+import pytest
+from app.db.units import normalize_quantity
+
+
+@pytest.mark.parametrize(
+    "quantity, unit, normalized",
+    [
+        (2, "kg", (2000, "g")),
+        (250, "Grams", (250, "g")),
+        (1.5, " l ", (1500, "ml")),
+        (2, "Tbsp.", (30, "ml")),
+        (1, "fl  oz", (pytest.approx(29.5735295625), "ml")),
+        (3, "pieces", (3, None)),
+        (3, None, (3, None)),
+        (None, "cup", (None, "ml")),
+        (4, "", (4, None)),
+    ],
+)
+def test_normalize_quantity(quantity, unit, normalized):
+    assert normalize_quantity(quantity, unit) == normalized
+
+
+def test_normalize_unknown_unit():
+    with pytest.raises(ValueError, match="Unknown unit: parsec"):
+        normalize_quantity(1, "parsec")
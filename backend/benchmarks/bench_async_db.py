@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Concurrent-request throughput of an async route handler whose query runs on
+the blocking sync session (before) versus the AsyncSession (after).
+
+Every request runs a query that takes ``--delay`` seconds on the database
+server, so the numbers show how many requests one worker keeps in flight.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_async_db.py
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from app.db.session import AsyncSessionLocal, SessionLocal
+from fastapi import FastAPI
+from sqlalchemy import text
+
+bench_app = FastAPI()
+
+
+@bench_app.get("/sync")
+async def sync_query(delay: float):
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT pg_sleep(:delay)"), {"delay": delay})
+    finally:
+        db.close()
+    return {}
+
+
+@bench_app.get("/async")
+async def async_query(delay: float):
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("SELECT pg_sleep(:delay)"), {"delay": delay})
+    return {}
+
+
+async def run(path: str, requests: int, concurrency: int, delay: float):
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(
+        app=bench_app, base_url="http://bench"
+    ) as client:
+
+        async def one():
+            async with semaphore:
+                response = await client.get(path, params={"delay": delay})
+                response.raise_for_status()
+
+        # warm up the connection pool before timing
+        await asyncio.gather(*(one() for _ in range(concurrency)))
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(requests)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    print(
+        f"{args.requests} requests, {args.concurrency} in flight, "
+        f"{args.delay * 1000:.0f}ms per query"
+    )
+    for label, path in (("sync session", "/sync"), ("async session", "/async")):
+        elapsed = asyncio.run(
+            run(path, args.requests, args.concurrency, args.delay)
+        )
+        print(
+            f"{label:>14}: {elapsed:6.2f}s  "
+            f"{args.requests / elapsed:8.1f} req/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
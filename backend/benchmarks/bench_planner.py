@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Time to pick a week of meals from 1k, 10k and 100k candidate meals: scoring
+every candidate in Python loops (before) versus NumPy over the sparse
+meal × ingredient incidence matrix (after). Both make the same picks.
+
+The candidates are synthetic, with ingredient popularity skewed the way
+real recipes are, so no database is needed.
+
+    python benchmarks/bench_planner.py
+"""
+import argparse
+import time
+
+import numpy as np
+from app.core import planner
+
+
+def synthetic_incidence(
+    meals: int, ingredients: int, seed: int = 0
+) -> planner.Incidence:
+    rng = np.random.default_rng(seed)
+    # a few staples are in many meals, most ingredients in a handful
+    popularity = 1 / np.arange(1, ingredients + 1)
+    popularity /= popularity.sum()
+    sizes = rng.integers(3, 13, size=meals)
+    pairs = np.column_stack(
+        [
+            np.repeat(np.arange(meals), sizes),
+            rng.choice(ingredients, size=sizes.sum(), p=popularity),
+        ]
+    )
+    return planner.Incidence.from_pairs(range(meals), pairs)
+
+
+def pick_meals_loops(incidence: planner.Incidence, count: int):
+    n_meals, n_ingredients = incidence.shape
+    meals = [[] for _ in range(n_meals)]
+    for row, column in zip(incidence.rows.tolist(), incidence.columns.tolist()):
+        meals[row].append(column)
+    uses = [0] * n_ingredients
+    for ingredients in meals:
+        for ingredient in ingredients:
+            uses[ingredient] += 1
+    popularity = [use / max(n_meals, 1) for use in uses]
+
+    used = set()
+    picked = set()
+    picks = []
+    for _ in range(min(count, n_meals)):
+        best, best_score = None, None
+        for meal, ingredients in enumerate(meals):
+            if meal in picked:
+                continue
+            score = sum(
+                1.0 if ingredient in used else popularity[ingredient] - 1.0
+                for ingredient in ingredients
+            ) / max(len(ingredients), 1)
+            if best_score is None or score > best_score:
+                best, best_score = meal, score
+        picks.append(best)
+        picked.add(best)
+        used.update(meals[best])
+    return picks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--meals", type=int, nargs="+", default=[1_000, 10_000, 100_000]
+    )
+    parser.add_argument("--ingredients", type=int, default=2_000)
+    parser.add_argument(
+        "--slots", type=int, default=planner.MEALS_PER_DAY * planner.DAYS
+    )
+    args = parser.parse_args()
+
+    print(f"{args.slots} meals picked from {args.ingredients} ingredients")
+    for meals in args.meals:
+        incidence = synthetic_incidence(meals, args.ingredients)
+        times = []
+        picks = []
+        for pick in (pick_meals_loops, planner.pick_meals):
+            start = time.perf_counter()
+            picks.append(list(pick(incidence, args.slots)))
+            times.append(time.perf_counter() - start)
+        assert picks[0] == picks[1], f"{meals} meals: picks differ"
+        print(
+            f"{meals:>7} meals: before {times[0] * 1e3:9.1f}ms  "
+            f"after {times[1] * 1e3:7.1f}ms  "
+            f"{times[0] / times[1]:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Per-row cost of producing the JSON body of the /ingredients, /users and
+/meals/me list endpoints: ORM objects validated through the pydantic
+response_model (before) versus column projections encoded by orjson
+(after). Both include the database query.
+
+The rows are inserted in a transaction that is rolled back at the end.
+
+    DATABASE_URL=postgresql://... python benchmarks/bench_serialization.py
+"""
+import argparse
+import asyncio
+import json
+import time
+import typing as t
+
+from app.db import crud, models, schemas
+from app.db.projection import json_response
+from app.db.session import AsyncSessionLocal
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from sqlalchemy import text
+
+
+async def orm_body(items, response_model, **kwargs) -> bytes:
+    field = create_response_field(name="bench", type_=response_model)
+    content = await serialize_response(
+        field=field, response_content=items, exclude_none=True, **kwargs
+    )
+    return JSONResponse(content).body
+
+
+async def ingredients_before(db, limit):
+    page = await crud.get_all_ingredients(db, limit=limit)
+    items = [crud.object_as_dict(ingredient) for ingredient in page.items]
+    return await orm_body(items, t.List[schemas.Ingredient])
+
+
+async def ingredients_after(db, limit):
+    page = await crud.get_all_ingredients(
+        db, limit=limit, projection=crud.INGREDIENT_ROW
+    )
+    return json_response(crud.INGREDIENT_ROW.dicts(page.items)).body
+
+
+async def users_before(db, limit):
+    page = await crud.get_all_users(db, limit=limit)
+    return await orm_body(page.items, t.List[schemas.User])
+
+
+async def users_after(db, limit):
+    page = await crud.get_all_users(db, limit=limit, projection=crud.USER_ROW)
+    return json_response(crud.USER_ROW.dicts(page.items)).body
+
+
+async def meals_before(db, limit, user_id):
+    page = await crud.get_all_meals(db, user_id=user_id, limit=limit)
+    return await orm_body(page.items, t.List[schemas.Meal])
+
+
+async def meals_after(db, limit, user_id):
+    page = await crud.get_all_meals(
+        db, user_id=user_id, limit=limit, projection=crud.MEAL_ROW
+    )
+    meals = crud.MEAL_ROW.dicts(page.items)
+    ingredients = await crud.get_meal_ingredient_rows(
+        db, [meal["id"] for meal in meals]
+    )
+    for meal in meals:
+        meal["ingredients"] = ingredients[meal["id"]]
+    return json_response(meals).body
+
+
+async def seed(db, rows: int) -> int:
+    ingredients = [
+        models.Ingredient(name=f"bench ingredient {i}", alias=f"alias {i}")
+        for i in range(rows)
+    ]
+    users = [
+        models.User(email=f"bench{i}@example.com", hashed_password="x")
+        for i in range(rows)
+    ]
+    db.add_all(ingredients + users)
+    await db.flush()
+    db.add_all(
+        models.Meal(
+            name=f"bench meal {i}",
+            description="bench",
+            user_id=users[0].id,
+            ingredients=ingredients[i : i + 5],
+        )
+        for i in range(rows)
+    )
+    await db.flush()
+    db.expunge_all()
+    # plan the benchmark queries with statistics for the new rows
+    await db.execute(text("ANALYZE"))
+    return users[0].id
+
+
+async def timed(func, db, repeats, *args) -> float:
+    await func(db, *args)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        # drop loaded objects, as a fresh request session would
+        db.expunge_all()
+        await func(db, *args)
+    return time.perf_counter() - start
+
+
+async def run(rows: int, repeats: int):
+    async with AsyncSessionLocal() as db:
+        user_id = await seed(db, rows)
+        cases = (
+            ("/ingredients", ingredients_before, ingredients_after, ()),
+            ("/users", users_before, users_after, ()),
+            ("/meals/me", meals_before, meals_after, (user_id,)),
+        )
+        for label, before, after, args in cases:
+            assert json.loads(await before(db, rows, *args)) == json.loads(
+                await after(db, rows, *args)
+            ), f"{label} response changed"
+            times = [
+                await timed(func, db, repeats, rows, *args)
+                for func in (before, after)
+            ]
+            per_row = [elapsed / (rows * repeats) * 1e6 for elapsed in times]
+            print(
+                f"{label:>12}: before {per_row[0]:6.2f}us/row  "
+                f"after {per_row[1]:6.2f}us/row  "
+                f"{times[0] / times[1]:5.1f}x"
+            )
+        await db.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.rows} rows per response, {args.repeats} responses")
+    asyncio.run(run(args.rows, args.repeats))
+
+
+if __name__ == "__main__":
+    main()
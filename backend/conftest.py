@@ -1,14 +1,31 @@
+import os
+import threading
 import typing as t
+import weakref
 
 import email_validator
+import fakeredis
+import fakeredis.aioredis
 import pytest
+import redis
+import redis.asyncio
+from app import tasks
 from app.core import config, security
+from app.core.cache import principal_cache
+from app.core.celery_app import celery_app
+from app.core.deliverability import deliverability_checker
+from app.core.llm import LLMClient
+from app.core.shared_cache import shared_cache
+from app.db.autocomplete import ingredient_index
 from app.db import models
 from app.db.session import Base, get_db
 from app.main import app
+from app.mock_llm import MockLLMServer
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, event
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlalchemy_utils import create_database, database_exists, drop_database
 
 email_validator.TEST_ENVIRONMENT = True
@@ -18,6 +35,10 @@ def get_test_db_url() -> str:
     return f"{config.SQLALCHEMY_DATABASE_URI}_test"
 
 
+def get_async_test_db_url() -> str:
+    return f"{config.SQLALCHEMY_ASYNC_DATABASE_URI}_test"
+
+
 @pytest.fixture
 def test_db():
     """
@@ -60,6 +81,9 @@ def create_test_db():
     ), "Test database already exists. Aborting tests."
     create_database(test_db_url)
     test_engine = create_engine(test_db_url)
+    with test_engine.begin() as connection:
+        # name search ranks by trigram similarity
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
     Base.metadata.create_all(test_engine)
 
     # Run the tests
@@ -69,20 +93,174 @@ def create_test_db():
     drop_database(test_db_url)
 
 
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    """
+    State kept in memory by the app must not leak into the next test, where
+    the same ids are reused.
+    """
+    principal_cache.clear()
+    ingredient_index.clear()
+    deliverability_checker.clear()
+    yield
+    principal_cache.clear()
+    ingredient_index.clear()
+    deliverability_checker.clear()
+
+
+@pytest.fixture(autouse=True)
+def shared_cache_redis(monkeypatch) -> redis.Redis:
+    """
+    Point the shared cache at an empty fakeredis server, or at the Redis
+    given by TEST_REDIS_URL, flushed before each test. Yields a sync client
+    to the same data.
+    """
+    url = os.getenv("TEST_REDIS_URL")
+    if url:
+        client = redis.Redis.from_url(url)
+        client.flushdb()
+
+        def connect():
+            return redis.asyncio.Redis.from_url(url)
+
+    else:
+        server = fakeredis.FakeServer()
+        client = fakeredis.FakeRedis(server=server)
+
+        def connect():
+            return fakeredis.aioredis.FakeRedis(server=server)
+
+    monkeypatch.setattr(shared_cache, "_connect", connect)
+    monkeypatch.setattr(shared_cache, "_clients", weakref.WeakKeyDictionary())
+    shared_cache.reset_stats()
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def test_async_engine():
+    """
+    Async engine on the test database, used by the API under test.
+    """
+    # The TestClient runs every request on a fresh event loop, so async
+    # connections must not be pooled between requests.
+    test_async_engine = create_async_engine(
+        get_async_test_db_url(), poolclass=NullPool
+    )
+
+    yield test_async_engine
+
+    test_async_engine.sync_engine.dispose()
+
+
 @pytest.fixture
-def client(test_db):
+def client(test_db, test_async_engine):
     """
     Get a TestClient instance that reads/write to the test database.
     """
+    AsyncSessionLocal = async_sessionmaker(
+        bind=test_async_engine, autoflush=False, expire_on_commit=False
+    )
 
-    def get_test_db():
-        yield test_db
+    async def get_test_db():
+        async with AsyncSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = get_test_db
 
     yield TestClient(app)
 
 
+@pytest.fixture
+def db_checkouts(test_async_engine) -> t.Dict[str, int]:
+    """
+    Count connections checked out of and returned to the API's pool.
+    """
+    counts = {"checkout": 0, "checkin": 0}
+
+    def on_checkout(*args):
+        counts["checkout"] += 1
+
+    def on_checkin(*args):
+        counts["checkin"] += 1
+
+    pool = test_async_engine.sync_engine.pool
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+
+    yield counts
+
+    event.remove(pool, "checkout", on_checkout)
+    event.remove(pool, "checkin", on_checkin)
+
+
+@pytest.fixture
+def db_statements(test_async_engine) -> t.List[str]:
+    """
+    Record the SQL statements the API sends to the database.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = test_async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+    yield statements
+
+    event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.fixture
+def mock_llm() -> t.Iterator[MockLLMServer]:
+    """
+    The mock chat completions API of app.mock_llm, answering at once on a
+    free port.
+    """
+    server = MockLLMServer(("127.0.0.1", 0))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sent_tasks(monkeypatch) -> t.List[t.Tuple[str, dict]]:
+    """
+    Record the Celery tasks the API sends, by name with their options,
+    instead of sending them to the broker.
+    """
+    sent = []
+
+    def send_task(name, *args, **kwargs):
+        sent.append((name, kwargs))
+
+    monkeypatch.setattr(celery_app, "send_task", send_task)
+    return sent
+
+
+@pytest.fixture
+def suggestion_worker(
+    test_db, shared_cache_redis, mock_llm, monkeypatch
+) -> MockLLMServer:
+    """
+    Point the suggest_meals task at the test database, the shared cache's
+    Redis and the mock LLM API, to run it in the test.
+    """
+    monkeypatch.setattr(
+        tasks, "SessionLocal", sessionmaker(bind=test_db.get_bind())
+    )
+    monkeypatch.setattr(tasks, "suggestion_redis", shared_cache_redis)
+    monkeypatch.setattr(
+        tasks, "llm_client", LLMClient(mock_llm.url, config.LLM_MODEL)
+    )
+    return mock_llm
+
+
 @pytest.fixture
 def test_password() -> str:
     return "securepassword"